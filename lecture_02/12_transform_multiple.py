@@ -1,10 +1,27 @@
 import time
+import numpy as np
 import compas
 from compas.datastructures import Mesh
 from compas.geometry import Rotation
 from compas.geometry import transform_points
 from compas.geometry import transform_points_numpy
 
+from transform_arrays import stack_transformations
+from transform_arrays import transform_points_array
+
+REPEAT = 5  # the fastest of REPEAT runs is reported
+
+
+def benchmark(name, function, *args, **kwargs):
+    times = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        result = function(*args, **kwargs)
+        times.append(time.perf_counter() - t0)
+    print("{:<45} {:.5f} seconds.".format(name, min(times)))
+    return result
+
+
 # load mesh
 mesh = Mesh.from_ply(compas.get('bunny.ply'))
 v, f = mesh.to_vertices_and_faces()
@@ -13,12 +30,42 @@ print("The mesh has {} vertices.".format(len(v)))
 # create Transformation
 T = Rotation.from_axis_and_angle([-0.248, -0.786, -0.566], 2.78, point=[1.0, 0.0, 0.0])
 
-# transform points with transform_points
-t0 = time.time()
-transform_points(v, T)
-print("transfrom_points takes {:.4f} seconds.".format(time.time() - t0))
+# transform points with transform_points (lists)
+reference = benchmark("transform_points (list)", transform_points, v, T)
+
+# transform points with transform_points_numpy (new array)
+benchmark("transform_points_numpy (list input)", transform_points_numpy, v, T)
+points = np.array(v, dtype=float)
+benchmark("transform_points_numpy (array input)", transform_points_numpy, points, T)
+
+# transform points into a new array, into a preallocated buffer, and in place
+benchmark("transform_points_array (new array)", transform_points_array, points, T)
+buffer = np.empty_like(points)
+benchmark("transform_points_array (into buffer)", transform_points_array, points, T, out=buffer)
+in_place = points.copy()
+benchmark("transform_points_array (in place)", transform_points_array, in_place, T, out=in_place)
+
+# all variants give the same points (the in place points were transformed REPEAT times)
+print("Same result:", np.allclose(buffer, reference))
+
+# several transformations: one at a time, or all stacked into a (K, 4, 4) array
+K = 8
+transformations = [Rotation.from_axis_and_angle([0, 0, 1], angle, point=[1.0, 0.0, 0.0])
+                   for angle in np.linspace(0, np.pi, K)]
+stacked = stack_transformations(transformations)
+buffers = np.empty((K,) + points.shape)
+
+
+def one_at_a_time():
+    for k, Tk in enumerate(transformations):
+        transform_points_array(points, Tk, out=buffers[k])
+    return buffers
+
 
-# transform points with transform_points_numpy
-t0 = time.time()
-transform_points_numpy(v, T)
-print("transfrom_points_numpy takes {:.4f} seconds.".format(time.time() - t0))
+print("\n{} transformations of the same points:".format(K))
+benchmark("transform_points_numpy, one at a time", lambda: [transform_points_numpy(points, Tk)
+                                                            for Tk in transformations])
+benchmark("transform_points_array, one at a time", one_at_a_time)
+result = benchmark("transform_points_array, stacked (K, 4, 4)", transform_points_array, points, stacked,
+                   out=np.empty((K,) + points.shape))
+print("Same result:", np.allclose(result, one_at_a_time()))
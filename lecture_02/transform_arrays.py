@@ -0,0 +1,92 @@
+"""Transformation of point arrays, into preallocated outputs.
+
+``transform_points`` and ``transform_points_numpy`` return new lists/arrays,
+and ``transform_points_numpy`` also allocates the homogeneous coordinates of
+all points. The functions here write the result into ``out``: a buffer of the
+caller, or the input array itself to transform in place::
+
+    transform_points_array(points, T, out=points)  # in place
+    transform_points_array(points, T, out=buffer)  # into a buffer, reused for every call
+
+A stack of K transformations, a (K, 4, 4) array, transforms a (K, N, 3) batch
+of point sets (set k with transformation k), or one (N, 3) point set K times::
+
+    M = stack_transformations([T1, T2, T3])
+    transform_points_array(points, M)  # (3, N, 3)
+"""
+import numpy as np
+
+__all__ = ['stack_transformations',
+           'transform_points_array',
+           'transform_vectors_array']
+
+# Number of points transformed at once when transforming in place
+CHUNK_SIZE = 2 ** 14
+
+
+def stack_transformations(transformations):
+    """(K, 4, 4) array of a list of :class:`compas.geometry.Transformation` or 4x4 matrices."""
+    return np.array([_matrix(T) for T in transformations], dtype=float)
+
+
+def _matrix(T):
+    return np.asarray(getattr(T, 'matrix', T), dtype=float)
+
+
+def _transform(points, M, out, translate):
+    points = np.asarray(points, dtype=float)
+    M = _matrix(M)
+    A = np.swapaxes(M[..., :3, :3], -1, -2)  # row vectors: p' = p A + t
+    t = M[..., None, :3, 3]
+    shape = np.broadcast_shapes(points.shape[:-2], M.shape[:-2]) + points.shape[-2:]
+
+    projective = translate and not (M[..., 3, :] == [0.0, 0.0, 0.0, 1.0]).all()
+    if projective:
+        w = np.matmul(points, M[..., 3, :3, None])[..., 0] + M[..., 3, None, 3]
+
+    if out is None:
+        out = np.empty(shape)
+    elif out.shape != shape:
+        raise ValueError('out has shape %s, the result has shape %s' % (out.shape, shape))
+
+    if np.shares_memory(out, points) and shape == points.shape:
+        # in place: chunks of points through a small scratch buffer, instead of a copy of all points
+        scratch = np.empty(shape[:-2] + (min(CHUNK_SIZE, shape[-2]), 3))
+        for start in range(0, shape[-2], CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE, shape[-2])
+            chunk = scratch[..., :stop - start, :]
+            np.matmul(points[..., start:stop, :], A, out=chunk)
+            out[..., start:stop, :] = chunk
+    else:
+        np.matmul(points, A, out=out)
+
+    if translate:
+        out += t
+    if projective:
+        out /= w[..., None]
+    return out
+
+
+def transform_points_array(points, T, out=None):
+    """Transforms points with one or several transformations.
+
+    Parameters
+    ----------
+    points: (N, 3) or (K, N, 3) array
+    T: :class:`compas.geometry.Transformation`, (4, 4) or (K, 4, 4) array
+        One transformation, or one per point set (see :func:`stack_transformations`).
+    out: array, optional
+        Array of the shape of the result, e.g. ``points`` to transform them in place.
+        A new array if not given.
+
+    Returns
+    ----------
+    (N, 3) or (K, N, 3) array
+        ``out``, with the transformed points.
+    """
+    return _transform(points, T, out, translate=True)
+
+
+def transform_vectors_array(vectors, T, out=None):
+    """Transforms vectors (without the translation), see :func:`transform_points_array`."""
+    return _transform(vectors, T, out, translate=False)
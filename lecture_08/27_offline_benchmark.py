@@ -0,0 +1,67 @@
+import compas_rrc as rrc
+from compas.geometry import Frame
+from compas.geometry import Point
+from compas.geometry import Vector
+
+from rrc_offline import OfflineAbbClient
+
+
+def pick_and_place_instructions(speed):
+    pick_frame = Frame(Point(300.0, 520.0, 32.3), Vector(0, -1, 0), Vector(-1, 0, 0))
+    place_frame = Frame(Point(0, 415, 33.0), Vector(0, -1, 0), Vector(-1, 0, 0))
+    approach_pick_frame = Frame(Point(300.0, 520.0, 90), Vector(0, -1, 0), Vector(-1, 0, 0))
+    approach_place_frame = Frame(Point(0, 415, 90), Vector(0, -1, 0), Vector(-1, 0, 0))
+
+    return [
+        rrc.MoveToFrame(approach_pick_frame, speed, rrc.Zone.Z10),
+        rrc.MoveToFrame(pick_frame, speed, rrc.Zone.FINE),
+        rrc.SetDigital('doVacuumOn', 1),
+        rrc.MoveToFrame(approach_pick_frame, speed, rrc.Zone.Z10),
+        rrc.MoveToFrame(approach_place_frame, speed, rrc.Zone.Z10),
+        rrc.MoveToFrame(place_frame, speed, rrc.Zone.FINE),
+        rrc.SetDigital('doVacuumOn', 0),
+        rrc.MoveToFrame(approach_place_frame, speed, rrc.Zone.Z10),
+    ]
+
+
+def run(strategy, bricks, batch_size, latency):
+    # Create offline ABB Client (no ROS, no virtual controller)
+    abb = OfflineAbbClient(time_scale=0., latency=latency)
+
+    for _ in range(bricks):
+        instructions = pick_and_place_instructions(speed=250)
+
+        if strategy == 'wait every instruction':
+            for instruction in instructions:
+                abb.send_and_wait(instruction)
+
+        elif strategy == 'batched':
+            for i in range(0, len(instructions), batch_size):
+                batch = instructions[i:i + batch_size]
+                for instruction in batch[:-1]:
+                    abb.send(instruction)
+                abb.send_and_wait(batch[-1])
+
+        elif strategy == 'streaming':
+            for instruction in instructions:
+                abb.send(instruction)
+
+    # Wait until the controller has processed everything
+    abb.send_and_wait(rrc.Noop())
+    cycle_time = abb.controller.clock
+
+    abb.close()
+    return cycle_time
+
+
+if __name__ == '__main__':
+
+    bricks = 20
+    latency = 0.02  # Unit [s], one-way client to controller
+
+    for strategy in ('wait every instruction', 'batched', 'streaming'):
+        cycle_time = run(strategy, bricks, batch_size=4, latency=latency)
+        print('{:>24}: {:7.2f} s ({:.2f} s per brick)'.format(strategy, cycle_time, cycle_time / bricks))
+
+    # End of Code
+    print('Finished')
@@ -0,0 +1,54 @@
+import compas_rrc as rrc
+from compas.geometry import Frame
+from compas.geometry import Point
+from compas.geometry import Vector
+
+from rrc_profiling import ProfilingClient
+
+if __name__ == '__main__':
+
+    # Create Ros Client
+    ros = rrc.RosClient()
+    ros.run()
+
+    # Create ABB Client
+    abb = rrc.AbbClient(ros, '/rob1')
+    print('Connected.')
+
+    # Wrap the client to time every instruction on the controller
+    # (to try it without a controller, use `OfflineAbbClient()` from rrc_offline.py)
+    profiler = ProfilingClient(abb)
+    profiler.start()
+
+    # Set tool and work object
+    profiler.send(rrc.SetTool('t_RRC_Vacuum_Gripper'))
+    profiler.send(rrc.SetWorkObject('ob_RRC_Brick_Pallet'))
+
+    # Define pick positions
+    pre_pick_position = Frame(Point(68.5, 48.5, 50), Vector(0, -1, 0), Vector(-1, 0, 0))
+    pick_position = Frame(Point(68.5, 48.5, 36), Vector(0, -1, 0), Vector(-1, 0, 0))
+
+    # Define speeds
+    speed = 100
+
+    # Pick sequence
+    profiler.send(rrc.PulseDigital('doNewBrick', 0.2))
+    profiler.send(rrc.MoveToFrame(pre_pick_position, speed, rrc.Zone.Z10))
+    profiler.send(rrc.MoveToFrame(pick_position, speed, rrc.Zone.FINE))
+    profiler.send(rrc.SetDigital('doVacuumOn', 1))
+    profiler.send(rrc.WaitTime(0.5))
+    profiler.send(rrc.MoveToFrame(pre_pick_position, speed, rrc.Zone.Z10))
+
+    # Print per-instruction timing
+    for record in profiler.profile(timeout=60):
+        print('{instruction:<16} round-trip={round_trip:.3f}s controller={controller_start:.3f}s..{controller_done:.3f}s'.format(**record))
+
+    # Print where the cycle time goes
+    profiler.print_summary()
+
+    # End of Code
+    print('Finished')
+
+    # Close client
+    ros.close()
+    ros.terminate()
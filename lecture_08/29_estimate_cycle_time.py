@@ -0,0 +1,54 @@
+import compas_rrc as rrc
+from compas.geometry import Frame
+from compas.geometry import Point
+from compas.geometry import Vector
+
+from rrc_estimator import estimate_program
+from rrc_estimator import print_estimate
+
+
+def brick_instructions(index, speed, approach_zone):
+    # Place bricks next to each other along X
+    x = 150 + index * 35
+
+    pre_pick_position = Frame(Point(68.5, 48.5, 50), Vector(0, -1, 0), Vector(-1, 0, 0))
+    pick_position = Frame(Point(68.5, 48.5, 36), Vector(0, -1, 0), Vector(-1, 0, 0))
+    pre_place_position = Frame(Point(x, 50, 50), Vector(0, -1, 0), Vector(-1, 0, 0))
+    place_position = Frame(Point(x, 50, 12), Vector(0, -1, 0), Vector(-1, 0, 0))
+
+    return [
+        rrc.PulseDigital('doNewBrick', 0.2),
+        rrc.MoveToFrame(pre_pick_position, speed, approach_zone),
+        rrc.MoveToFrame(pick_position, speed, rrc.Zone.FINE),
+        rrc.SetDigital('doVacuumOn', 1),
+        rrc.WaitTime(0.2),
+        rrc.MoveToFrame(pre_pick_position, speed, approach_zone),
+        rrc.MoveToFrame(pre_place_position, speed, approach_zone),
+        rrc.MoveToFrame(place_position, speed, rrc.Zone.FINE),
+        rrc.SetDigital('doVacuumOn', 0),
+        rrc.WaitTime(0.2),
+        rrc.MoveToFrame(pre_place_position, speed, approach_zone),
+    ]
+
+
+if __name__ == '__main__':
+
+    bricks = 5
+
+    # Compare sequencing strategies without connecting to the robot
+    strategies = {
+        'Stop at every frame, 100 mm/s': dict(speed=100, approach_zone=rrc.Zone.FINE),
+        'Fly-by approach, 100 mm/s': dict(speed=100, approach_zone=rrc.Zone.Z10),
+        'Fly-by approach, 500 mm/s': dict(speed=500, approach_zone=rrc.Zone.Z10),
+    }
+
+    for name, params in strategies.items():
+        program = {i: brick_instructions(i, **params) for i in range(bricks)}
+        estimate = estimate_program(program)
+
+        print(name)
+        print_estimate(estimate)
+        print()
+
+    # End of Code
+    print('Finished')
@@ -0,0 +1,107 @@
+"""Offline cycle time estimation for RRC programs.
+
+Runs a list of RRC instructions through the simulated controller of
+``rrc_offline`` on a virtual clock (no threads, no waiting) and reports how
+long the robot would take, in total and per element. Move speeds, zones,
+``SetMaxSpeed`` overrides, wait times and I/O instructions are all taken into
+account, so sequencing strategies can be compared before going to the cell.
+Fly-by moves pass their target at the corner speed of their zone radius, and
+the robot stops at the target of the last move of a program.
+"""
+from __future__ import print_function
+
+from rrc_offline import OfflineController
+
+__all__ = ['estimate_instructions', 'estimate_program', 'print_estimate']
+
+
+def estimate_instructions(instructions, controller=None, stop=True):
+    """Estimate the execution time of every instruction.
+
+    Parameters
+    ----------
+    instructions : :obj:`list`
+        RRC instructions, e.g. ``rrc.MoveToFrame``, ``rrc.WaitTime``, ``rrc.SetDigital``.
+    controller : :class:`OfflineController`
+        Simulated controller, its state (position, speed override, clock) is
+        updated in place. Optional, a new controller is created if not specified.
+    stop : :obj:`bool`
+        If ``True``, the instructions are a whole program: the robot stops at the
+        target of the last move, even if it is a fly-by move.
+
+    Returns
+    -------
+    :obj:`list` of :obj:`dict`
+        One item per instruction with ``instruction``, ``start``, ``end`` and ``duration``.
+        ``end`` is the time at which the robot has completed the instruction,
+        which for fly-by moves is later than the time the program pointer moves on.
+    """
+    controller = controller or OfflineController()
+    estimates = []
+    completed = _completion(controller)
+
+    for instruction in instructions:
+        controller.execute(instruction.msg, arrival=controller.clock)
+        end = _completion(controller)
+        estimates.append(dict(instruction=instruction.instruction.replace('r_RRC_', ''),
+                              start=completed,
+                              end=end,
+                              duration=end - completed))
+        completed = end
+
+    if stop and estimates:
+        controller.stop()
+        end = _completion(controller)
+        estimates[-1]['end'] = end
+        estimates[-1]['duration'] = end - estimates[-1]['start']
+
+    return estimates
+
+
+def estimate_program(program, motion_model=None, controller=None):
+    """Estimate total and per-element time of a program.
+
+    Parameters
+    ----------
+    program : :obj:`dict` or :obj:`list`
+        Instructions grouped by element, either as a dictionary mapping element
+        keys to lists of instructions, or as a list of lists.
+    motion_model : :class:`MotionModel`
+        Kinematic limits of the robot. Ignored if ``controller`` is given.
+    controller : :class:`OfflineController`
+        Simulated controller to start from. Optional.
+
+    Returns
+    -------
+    :obj:`dict`
+        ``total`` time in seconds and ``elements``, a list of dictionaries with
+        ``key``, ``duration``, ``motion`` (time spent in moves) and ``instructions``.
+    """
+    controller = controller or OfflineController(motion_model)
+    items = program.items() if hasattr(program, 'items') else enumerate(program)
+    start = _completion(controller)
+    elements = []
+
+    items = list(items)
+    for i, (key, instructions) in enumerate(items):
+        # Only the last element ends the program
+        estimates = estimate_instructions(instructions, controller, stop=i == len(items) - 1)
+        duration = sum(e['duration'] for e in estimates)
+        motion = sum(e['duration'] for e in estimates if e['instruction'].startswith('MoveTo'))
+        elements.append(dict(key=key, duration=duration, motion=motion, instructions=estimates))
+
+    return dict(total=_completion(controller) - start, elements=elements)
+
+
+def print_estimate(estimate):
+    """Print the result of :func:`estimate_program`."""
+    print('{:>10} {:>12} {:>12} {:>12}'.format('Element', 'Time [s]', 'Motion [s]', 'Other [s]'))
+    for element in estimate['elements']:
+        other = element['duration'] - element['motion']
+        print('{:>10} {:>12.2f} {:>12.2f} {:>12.2f}'.format(str(element['key']), element['duration'], element['motion'], other))
+    print('Total cycle time: {:.2f} s'.format(estimate['total']))
+
+
+def _completion(controller):
+    # Time at which both the program pointer and the robot motion are done
+    return max(controller.clock, controller.motion_end)
@@ -0,0 +1,577 @@
+"""In-process stand-in for an RRC controller.
+
+``OfflineAbbClient`` accepts the same instruction objects as ``rrc.AbbClient``
+(``send``, ``send_and_wait``, futures), but instead of publishing them to ROS
+it executes them on a simulated controller running in a background thread.
+Execution time is derived from motion distance, reorientation, speed, zone and
+acceleration, so streaming strategies and instruction batching can be compared
+on any machine without Docker, ROS or RobotStudio.
+"""
+from __future__ import print_function
+
+import math
+import threading
+import time
+
+from compas_rrc.client import SequenceCounter
+from compas_rrc.client import default_feedback_parser
+from compas_rrc.common import FutureResult
+
+from compas.geometry import Frame
+from compas.geometry import distance_point_point
+
+__all__ = ['MotionModel', 'OfflineController', 'OfflineAbbClient']
+
+INSTRUCTION_PREFIX = 'r_RRC_'
+RAPID_NONE = 8999999488.  # 9E+9 as received from RAPID
+FINE = -1
+
+# Instructions that only read the controller state, and can be polled by subscriptions
+QUERY_INSTRUCTIONS = ('GetFrame', 'GetRobtarget', 'GetJoints', 'ReadWatch', 'ReadDigital', 'ReadAnalog', 'ReadGroup')
+
+
+def orientation_angle(a, b):
+    """Angle in degrees of the rotation from the orientation of frame ``a`` to that of frame ``b``."""
+    dot = abs(sum(x * y for x, y in zip(a.quaternion, b.quaternion)))
+    return math.degrees(2 * math.acos(min(dot, 1.)))
+
+
+class MotionModel(object):
+    """Kinematic limits used to turn instructions into execution time.
+
+    Default axis limits are those of the ABB IRB 910SC used in the lecture.
+
+    Parameters
+    ----------
+    max_tcp_speed : :obj:`float`
+        Maximum TCP speed of the robot in mm/s.
+    tcp_acceleration : :obj:`float`
+        TCP acceleration (and deceleration) in mm/s².
+    joint_speeds : :obj:`list` of :obj:`float`
+        Maximum speed per axis, in °/s for revolute and mm/s for prismatic axes.
+    joint_accelerations : :obj:`list` of :obj:`float`
+        Maximum acceleration per axis, in °/s² or mm/s².
+    max_orientation_speed : :obj:`float`
+        Maximum reorientation speed of the tool in °/s (``v_ori`` of the RAPID speed data).
+    orientation_acceleration : :obj:`float`
+        Reorientation acceleration (and deceleration) of the tool in °/s².
+    instruction_time : :obj:`float`
+        Time in seconds the controller spends on any instruction (program pointer overhead).
+    """
+
+    def __init__(self, max_tcp_speed=2500., tcp_acceleration=5000.,
+                 joint_speeds=None, joint_accelerations=None, instruction_time=0.004,
+                 max_orientation_speed=500., orientation_acceleration=2000.):
+        self.max_tcp_speed = max_tcp_speed
+        self.tcp_acceleration = tcp_acceleration
+        self.max_orientation_speed = max_orientation_speed
+        self.orientation_acceleration = orientation_acceleration
+        self.joint_speeds = joint_speeds or [420., 720., 1100., 2500., 0., 0.]
+        self.joint_accelerations = joint_accelerations or [2000., 4000., 8000., 10000., 0., 0.]
+        self.instruction_time = instruction_time
+
+    def segment_time(self, distance, speed, acceleration, v_in=0., v_out=0.):
+        """Time to cover ``distance`` with a trapezoidal velocity profile.
+
+        The segment starts at ``v_in``, cruises at ``speed`` and ends at ``v_out``.
+        If the segment is too short to reach cruise speed, a triangular
+        profile is used instead.
+        """
+        if distance <= 0 or speed <= 0:
+            return 0.
+        if acceleration <= 0:
+            return distance / speed
+
+        v_in = min(v_in, speed)
+        v_out = min(v_out, speed)
+        d_acc = (speed ** 2 - v_in ** 2) / (2 * acceleration)
+        d_dec = (speed ** 2 - v_out ** 2) / (2 * acceleration)
+
+        if d_acc + d_dec <= distance:
+            t_acc = (speed - v_in) / acceleration
+            t_dec = (speed - v_out) / acceleration
+            return t_acc + t_dec + (distance - d_acc - d_dec) / speed
+
+        # Peak velocity of the triangular profile
+        v_peak = math.sqrt(max(acceleration * distance + (v_in ** 2 + v_out ** 2) / 2., 0.))
+        v_peak = max(v_peak, v_in, v_out)
+        return (v_peak - v_in) / acceleration + (v_peak - v_out) / acceleration
+
+    def cartesian_time(self, distance, speed, v_in=0., v_out=0., angle=0., acceleration=100.):
+        """Time of a linear/joint move to a frame, given TCP distance in mm and speed in mm/s.
+
+        The reorientation of the tool by ``angle`` degrees runs at the same time as the
+        TCP motion, the slower of the two determines the duration. ``acceleration`` is
+        the percentage of the acceleration limits set with ``SetAcceleration``.
+        """
+        speed = min(speed, self.max_tcp_speed)
+        ratio = acceleration / 100.
+        duration = self.segment_time(distance, speed, self.tcp_acceleration * ratio, v_in, v_out)
+        reorientation = self.segment_time(angle, self.max_orientation_speed, self.orientation_acceleration * ratio)
+        return max(duration, reorientation)
+
+    def corner_speed(self, zone, distance, speed, acceleration=100.):
+        """Speed at which a fly-by move passes its target, given the zone radius in mm.
+
+        The corner path is taken as an arc with the zone radius, reduced to half the
+        distance of the move as the controller does, and the speed on it is limited by
+        the TCP acceleration: ``v = sqrt(a * r)``. The angle to the next move is not known
+        when the move is planned, so every corner is taken as a sharp one.
+        """
+        if zone == FINE or zone <= 0:
+            return 0.
+        radius = min(zone, distance / 2.)
+        return min(speed, math.sqrt(self.tcp_acceleration * acceleration / 100. * radius))
+
+    def joint_time(self, start, end, speed, acceleration=100.):
+        """Time of an axis-interpolated move.
+
+        All axes start and stop together, so the slowest axis determines the duration.
+        The programmed TCP ``speed`` is applied as a fraction of ``max_tcp_speed``
+        to every axis limit, ``acceleration`` as a percentage of the acceleration limits.
+        """
+        ratio = min(speed / self.max_tcp_speed, 1.)
+        duration = 0.
+        for i, (a, b) in enumerate(zip(start, end)):
+            if i >= len(self.joint_speeds) or not self.joint_speeds[i]:
+                continue
+            axis_speed = self.joint_speeds[i] * ratio
+            axis_acceleration = self.joint_accelerations[i] * acceleration / 100.
+            duration = max(duration, self.segment_time(abs(b - a), axis_speed, axis_acceleration))
+        return duration
+
+
+class OfflineController(object):
+    """Simulated RRC controller executing instruction messages on a virtual clock.
+
+    The controller mimics how RAPID runs a motion program: the program pointer
+    executes instructions one after the other, while the motion planner runs
+    behind it. A move with :attr:`rrc.Zone.FINE` blocks the program pointer until
+    the robot stops, a fly-by move lets it continue as soon as the motion starts.
+    A fly-by move passes its target at the corner speed of its zone (see
+    :meth:`MotionModel.corner_speed`), unless the robot gets there before the next
+    move is known (after ``WaitTime`` or ``GetFrame``), then it stops.
+    ``SetAcceleration`` scales the acceleration limits, its ramp is not modelled.
+
+    The controller tracks the TCP frame of moves to frames and the axis values of
+    moves to joints. Converting one into the other needs the kinematics of the
+    robot, which can be given as ``forward_kinematics`` and ``inverse_kinematics``.
+    Without them, the frame after a move to joints (and the axis values after a
+    move to a frame) is unknown: the next move of the other kind is timed from
+    the last known frame (or axis values) and from standstill, as after a
+    :attr:`rrc.Zone.FINE` move, and is counted in :attr:`unknown_starts`.
+    ``GetFrame``/``GetRobtarget`` (and ``GetJoints``) then return the last known values.
+
+    Parameters
+    ----------
+    motion_model : :class:`MotionModel`
+        Kinematic limits of the simulated robot.
+    joints : :obj:`list` of :obj:`float`
+        Initial axis values.
+    external_axes : :obj:`list` of :obj:`float`
+        Initial external axis values, one per external axis of the simulated cell.
+    frame : :class:`compas.geometry.Frame`
+        Initial TCP frame.
+    forward_kinematics : callable, optional
+        Function of the axis values (in degrees or mm) returning the TCP :class:`compas.geometry.Frame`.
+    inverse_kinematics : callable, optional
+        Function of a TCP frame and the current axis values returning the axis values for the frame.
+    """
+
+    def __init__(self, motion_model=None, joints=None, external_axes=None, frame=None,
+                 forward_kinematics=None, inverse_kinematics=None):
+        self.motion_model = motion_model or MotionModel()
+        self.joints = list(joints or [0.] * 6)
+        self.external_axes = list(external_axes or [])
+        self.frame = frame or Frame.worldXY()
+        self.forward_kinematics = forward_kinematics
+        self.inverse_kinematics = inverse_kinematics
+        # False once the pose changed by a move of the other kind, without kinematics to follow it
+        self.frame_known = True
+        self.joints_known = True
+        self.unknown_starts = 0
+        self.signals = {}
+        self.speed_override = 100.
+        self.max_tcp = self.motion_model.max_tcp_speed
+        self.acceleration = 100.
+
+        # Virtual clock: program pointer time and time at which motion stops
+        self.clock = 0.
+        self.motion_end = 0.
+        self.exit_speed = 0.
+
+        self.watch_start = None
+        self.watch_value = 0.
+
+        self.handlers = {
+            'MoveTo': self._move_to_frame,
+            'MoveToJoints': self._move_to_joints,
+            'WaitTime': self._wait_time,
+            'SetMaxSpeed': self._set_max_speed,
+            'SetAcceleration': self._set_acceleration,
+            'GetFrame': self._get_robtarget,
+            'GetRobtarget': self._get_robtarget,
+            'GetJoints': self._get_joints,
+            'StartWatch': self._start_watch,
+            'StopWatch': self._stop_watch,
+            'ReadWatch': self._read_watch,
+            'SetDigital': self._set_signal,
+            'SetAnalog': self._set_signal,
+            'SetGroup': self._set_signal,
+            'PulseDigital': self._pulse_digital,
+            'ReadDigital': self._read_signal,
+            'ReadAnalog': self._read_signal,
+            'ReadGroup': self._read_signal,
+        }
+
+    def execute(self, msg, arrival=0.):
+        """Execute one instruction message and return its feedback message.
+
+        Parameters
+        ----------
+        msg : :obj:`dict`
+            Instruction message as published by ``AbbClient.send``.
+        arrival : :obj:`float`
+            Virtual time at which the message reached the controller.
+
+        Returns
+        -------
+        :obj:`dict`
+            Feedback message, including ``start`` and ``end`` virtual timestamps.
+        """
+        self.clock = max(self.clock, arrival)
+        start = self.clock
+
+        name = msg['instruction']
+        if name.startswith(INSTRUCTION_PREFIX):
+            name = name[len(INSTRUCTION_PREFIX):]
+
+        handler = self.handlers.get(name)
+        float_values = handler(msg) if handler else []
+        self.clock += self.motion_model.instruction_time
+
+        return dict(instruction=msg['instruction'],
+                    sequence_id=0,
+                    feedback_id=msg.get('sequence_id'),
+                    feedback='Done',
+                    exec_level=msg.get('exec_level', 0),
+                    feedback_level=msg.get('feedback_level', 0),
+                    string_values=[],
+                    float_values=float_values,
+                    start=start,
+                    end=self.clock)
+
+    def poll(self, msg):
+        """Feedback message of a query instruction for the current state, without advancing the clock."""
+        name = msg['instruction']
+        if name.startswith(INSTRUCTION_PREFIX):
+            name = name[len(INSTRUCTION_PREFIX):]
+        if name not in QUERY_INSTRUCTIONS:
+            raise ValueError('Only query instructions can be polled, got {}'.format(msg['instruction']))
+
+        state = self.clock, self.motion_end, self.exit_speed
+        feedback = self.execute(msg, arrival=self.clock)
+        self.clock, self.motion_end, self.exit_speed = state
+        return feedback
+
+    def _speed(self, speed):
+        return min(speed * self.speed_override / 100., self.max_tcp)
+
+    def stop(self):
+        """Lets the robot stop at the target of the last move, instead of passing it at the corner speed."""
+        if self.exit_speed > 0:
+            # Decelerating over the end of the move takes v / 2a longer than passing at speed v
+            acceleration = self.motion_model.tcp_acceleration * self.acceleration / 100.
+            self.motion_end += self.exit_speed / (2 * acceleration)
+            self.exit_speed = 0.
+
+    def _queue_motion(self, duration, zone, exit_speed):
+        # Motion can only start once the previous one is done and the program pointer got here
+        start = max(self.clock, self.motion_end)
+        self.motion_end = start + duration
+        self.exit_speed = exit_speed
+
+        if zone == FINE:
+            self.clock = self.motion_end
+        else:
+            self.clock = start
+
+    def _move_to_frame(self, msg):
+        values = msg['float_values']
+        target = Frame.from_quaternion(values[3:7], point=values[0:3])
+        speed, zone = self._speed(values[-2]), values[-1]
+
+        # From the last known frame, and from standstill if the robot moved to joints since
+        v_in = self.exit_speed
+        if not self.frame_known:
+            v_in = 0.
+            self.unknown_starts += 1
+
+        distance = distance_point_point(self.frame.point, target.point)
+        angle = orientation_angle(self.frame, target)
+        v_out = self.motion_model.corner_speed(zone, distance, speed, self.acceleration)
+        duration = self.motion_model.cartesian_time(distance, speed, v_in, v_out, angle, self.acceleration)
+
+        self.frame = target
+        self.frame_known = True
+        if self.inverse_kinematics:
+            self.joints = list(self.inverse_kinematics(target, self.joints))
+        else:
+            self.joints_known = False
+        self._queue_motion(duration, zone, v_out)
+        return []
+
+    def _move_to_joints(self, msg):
+        values = msg['float_values']
+        joints = values[0:6]
+        speed, zone = self._speed(values[-2]), values[-1]
+
+        # Axis moves always start from standstill, from the last known axis values
+        if not self.joints_known:
+            self.unknown_starts += 1
+        duration = self.motion_model.joint_time(self.joints, joints, speed, self.acceleration)
+
+        self.joints = list(joints)
+        self.joints_known = True
+        if self.forward_kinematics:
+            self.frame = self.forward_kinematics(self.joints)
+        else:
+            self.frame_known = False
+        self.external_axes = values[6:6 + len(self.external_axes)]
+        self._queue_motion(duration, zone, 0.)
+        return []
+
+    def _wait_time(self, msg):
+        self.clock += msg['float_values'][0]
+        if self.clock >= self.motion_end:
+            self.stop()
+        return []
+
+    def _set_max_speed(self, msg):
+        self.speed_override, self.max_tcp = msg['float_values'][0:2]
+        return []
+
+    def _set_acceleration(self, msg):
+        self.acceleration = msg['float_values'][0]
+        return []
+
+    def _get_robtarget(self, msg):
+        # The position is only known once the robot stopped
+        self.stop()
+        self.clock = max(self.clock, self.motion_end)
+        external_axes = self.external_axes + [RAPID_NONE] * (6 - len(self.external_axes))
+        return list(self.frame.point) + list(self.frame.quaternion) + external_axes
+
+    def _get_joints(self, msg):
+        self.stop()
+        self.clock = max(self.clock, self.motion_end)
+        external_axes = self.external_axes + [RAPID_NONE] * (6 - len(self.external_axes))
+        return list(self.joints) + external_axes
+
+    def _start_watch(self, msg):
+        self.watch_start = self.clock
+        return []
+
+    def _stop_watch(self, msg):
+        if self.watch_start is not None:
+            self.watch_value += self.clock - self.watch_start
+        self.watch_start = None
+        return []
+
+    def _read_watch(self, msg):
+        value = self.watch_value
+        if self.watch_start is not None:
+            value += self.clock - self.watch_start
+        return [value]
+
+    def _set_signal(self, msg):
+        self.signals[msg['string_values'][0]] = msg['float_values'][0]
+        return []
+
+    def _pulse_digital(self, msg):
+        # PulseDO does not block the program pointer
+        self.signals[msg['string_values'][0]] = 0
+        return []
+
+    def _read_signal(self, msg):
+        return [self.signals.get(msg['string_values'][0], 0)]
+
+
+class OfflineAbbClient(object):
+    """Drop-in replacement of ``rrc.AbbClient`` backed by an :class:`OfflineController`.
+
+    Instructions are queued and executed by the controller in a background thread.
+    With ``time_scale=1.0`` feedback arrives after the simulated execution time has
+    elapsed on the wall clock, ``time_scale=0.1`` runs ten times faster than real-time
+    and ``time_scale=0`` returns feedback as fast as possible, which is useful to
+    compute virtual cycle times. The virtual time of the client then only moves
+    when it waits for a result (``send_and_wait`` or ``future.result()``), so the
+    cycle time does not depend on how fast the client runs.
+
+    Examples
+    --------
+    .. code-block:: python
+
+        abb = OfflineAbbClient(time_scale=0.)
+        abb.send(rrc.MoveToFrame(frame, 100, rrc.Zone.FINE))
+        done = abb.send_and_wait(rrc.Noop())
+        print('Cycle time [s] = ', abb.controller.clock)
+        abb.close()
+
+    Parameters
+    ----------
+    controller : :class:`OfflineController`
+        Simulated controller. Optional, a new one is created if not specified.
+    time_scale : :obj:`float`
+        Ratio of wall-clock time per simulated second.
+    latency : :obj:`float`
+        One-way network latency in seconds, added between client and controller.
+    """
+
+    def __init__(self, controller=None, time_scale=1.0, latency=0.002):
+        self.controller = controller or OfflineController()
+        self.time_scale = time_scale
+        self.latency = latency
+        self.counter = SequenceCounter()
+        self.futures = {}
+        self.history = []
+        self._client_clock = 0.
+
+        self._queue = []
+        self._condition = threading.Condition()
+        self._running = True
+        self._epoch = time.time()
+        self._thread = threading.Thread(target=self._run, name='offline-rrc')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def now(self):
+        """Current virtual time of the client in seconds."""
+        if not self.time_scale:
+            return self._client_clock
+        return (time.time() - self._epoch) / self.time_scale
+
+    def send(self, instruction):
+        """Sends an instruction to the simulated controller without waiting.
+
+        Returns a :class:`FutureResult` if the instruction requests feedback, otherwise ``None``.
+        """
+        instruction.sequence_id = self.counter.increment()
+        key = 'msg:{}'.format(instruction.sequence_id)
+        result = None
+
+        if instruction.feedback_level > 0:
+            result = _OfflineFutureResult(self)
+            parser = instruction.parse_feedback if hasattr(instruction, 'parse_feedback') else None
+            self.futures[key] = dict(result=result, parser=parser)
+
+        with self._condition:
+            self._queue.append((instruction.msg, self.now))
+            self._condition.notify()
+
+        return result
+
+    def _wait_until(self, virtual_time):
+        self._client_clock = max(self._client_clock, virtual_time)
+
+    def send_and_wait(self, instruction, timeout=None):
+        """Send instruction and wait for feedback, see ``AbbClient.send_and_wait``."""
+        if instruction.feedback_level == 0:
+            instruction.feedback_level = 1
+
+        future = self.send(instruction)
+        return future.result(timeout)
+
+    def send_and_subscribe(self, instruction, callback):
+        """Sends a query instruction and calls ``callback`` with its feedback after every executed instruction.
+
+        Unlike on the real controller, feedback is not sent at a fixed rate, but the query
+        (e.g. ``GetJoints`` or ``ReadWatch``) is evaluated again after every instruction the
+        controller executes, until the client is closed. Motion instructions report their
+        target as soon as the program pointer executed them.
+        """
+        name = instruction.msg['instruction']
+        if name[len(INSTRUCTION_PREFIX):] not in QUERY_INSTRUCTIONS:
+            raise ValueError('Only query instructions can be subscribed to, got {}'.format(name))
+        if instruction.feedback_level == 0:
+            instruction.feedback_level = 1
+
+        instruction.sequence_id = self.counter.increment()
+        key = 'msg:{}'.format(instruction.sequence_id)
+        parser = instruction.parse_feedback if hasattr(instruction, 'parse_feedback') else None
+        self.futures[key] = dict(callback=callback, parser=parser, msg=instruction.msg)
+
+        with self._condition:
+            self._queue.append((instruction.msg, self.now))
+            self._condition.notify()
+
+    def close(self):
+        """Stop the controller thread, and all subscriptions."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                msg, sent = self._queue.pop(0)
+
+            feedback = self.controller.execute(msg, arrival=sent + self.latency)
+            self._sleep_until(feedback['end'] + self.latency)
+
+            self.history.append(dict(sequence_id=msg['sequence_id'],
+                                     instruction=msg['instruction'],
+                                     sent=sent,
+                                     start=feedback['start'],
+                                     end=feedback['end']))
+            self._resolve(feedback)
+            self._notify_subscribers(feedback)
+
+    def _sleep_until(self, virtual_time):
+        if not self.time_scale:
+            return
+        delay = self._epoch + virtual_time * self.time_scale - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _resolve(self, feedback):
+        key = 'msg:{}'.format(feedback['feedback_id'])
+        future = self.futures.get(key)
+        if not future or 'result' not in future:
+            return
+        del self.futures[key]
+
+        parser = future['parser']
+        result = parser(feedback) if parser else default_feedback_parser(feedback)
+        future['result'].time = feedback['end'] + self.latency
+        future['result']._set_result(result)
+
+    def _notify_subscribers(self, executed):
+        for subscription in list(self.futures.values()):
+            if 'callback' not in subscription or executed['feedback_id'] < subscription['msg']['sequence_id']:
+                continue
+            # The first feedback is the one of the subscribed instruction itself
+            msg = subscription['msg']
+            feedback = executed if msg['sequence_id'] == executed['feedback_id'] else self.controller.poll(msg)
+            parser = subscription['parser']
+            subscription['callback'](parser(feedback) if parser else default_feedback_parser(feedback))
+
+
+class _OfflineFutureResult(FutureResult):
+    # Future that moves the virtual clock of the client to the feedback time when the client waits for it
+
+    def __init__(self, client):
+        FutureResult.__init__(self)
+        self.client = client
+        self.time = 0.
+
+    def result(self, timeout=None):
+        value = FutureResult.result(self, timeout)
+        self.client._wait_until(self.time)
+        return value
@@ -0,0 +1,214 @@
+"""Opt-in timing instrumentation for RRC instruction streams.
+
+``ProfilingClient`` wraps an ``rrc.AbbClient`` (or an ``OfflineAbbClient``) and
+records, for every instruction sent through it:
+
+* ``sent``: client time at which the instruction was published,
+* ``received``: client time at which its feedback arrived,
+* ``round_trip``: ``received - sent``,
+* ``controller_start`` / ``controller_done``: controller watch time at which
+  the program pointer reached and left the instruction.
+
+Controller times are obtained by interleaving a ``ReadWatch`` after every
+instruction, i.e. the same ``StartWatch``/``ReadWatch`` pattern as in
+``17_watch.py`` but applied automatically. Keep in mind that for fly-by moves
+the program pointer leaves the instruction before the robot reaches the target.
+
+Feedback times are taken by a background thread that waits on the futures of
+the instructions with ``future.result()``, in the order they were sent (the
+controller replies in that order), so the client is never modified.
+"""
+from __future__ import print_function
+
+import threading
+import time
+
+import compas_rrc as rrc
+
+__all__ = ['ProfilingClient']
+
+
+class ProfilingClient(object):
+    """Wrap an ABB client to produce a per-instruction latency and execution profile.
+
+    Parameters
+    ----------
+    client : ``rrc.AbbClient``
+        Client used to communicate with the controller.
+    use_watch : :obj:`bool`
+        If ``True``, read the controller watch after each instruction to get
+        controller-side timestamps. Otherwise, only client-side feedback times are recorded.
+    clock : callable
+        Function returning the current client time in seconds. Defaults to :func:`time.time`.
+
+    Examples
+    --------
+    .. code-block:: python
+
+        profiler = ProfilingClient(abb)
+        profiler.start()
+        profiler.send(rrc.MoveToFrame(frame, 100, rrc.Zone.FINE))
+        profiler.send(rrc.SetDigital('do_1', 1))
+        records = profiler.profile()
+        profiler.print_summary()
+
+    """
+
+    def __init__(self, client, use_watch=True, clock=None):
+        self.client = client
+        self.use_watch = use_watch
+        self.clock = clock or time.time
+        self.records = []
+        self._watch_offset = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Reset and start the controller watch. Call once before streaming instructions."""
+        self.records = []
+        if self.use_watch:
+            self.client.send(rrc.StopWatch())
+            self.client.send(rrc.StartWatch())
+            self._watch_offset = self.client.send(rrc.ReadWatch())
+
+    def send(self, instruction):
+        """Send an instruction and record its timing, see ``AbbClient.send``.
+
+        Instructions sent without feedback are upgraded to :attr:`rrc.FeedbackLevel.DONE`
+        so their round-trip can be measured, unless the controller watch is used,
+        in which case the ``ReadWatch`` reply is used as completion signal.
+        """
+        if not self.use_watch and instruction.feedback_level == rrc.FeedbackLevel.NONE:
+            instruction.feedback_level = rrc.FeedbackLevel.DONE
+
+        record = dict(instruction=_instruction_name(instruction), sent=self.clock(), received=None)
+        future = self.client.send(instruction)
+        record['sequence_id'] = instruction.sequence_id
+
+        if self.use_watch:
+            record['watch'] = self.client.send(rrc.ReadWatch())
+            record['future'] = record['watch']
+        else:
+            record['future'] = future
+        self._timestamp(record['future'], record)
+
+        with self._lock:
+            self.records.append(record)
+
+        return future
+
+    def send_and_wait(self, instruction, timeout=None):
+        """Send an instruction, record its timing and wait for its feedback."""
+        if instruction.feedback_level == rrc.FeedbackLevel.NONE:
+            instruction.feedback_level = rrc.FeedbackLevel.DONE
+
+        future = self.send(instruction)
+        return future.result(timeout)
+
+    def profile(self, timeout=None):
+        """Wait for all pending feedback and return the timing records.
+
+        Returns
+        -------
+        :obj:`list` of :obj:`dict`
+            One record per instruction, in the order they were sent.
+        """
+        watch_offset = 0.
+        if self.use_watch and self._watch_offset:
+            watch_offset = self._watch_offset.result(timeout)
+
+        previous_done = watch_offset
+        profile = []
+
+        for record in self.records:
+            feedback = record['future'].result(timeout) if record['future'] else None
+            record['stamped'].wait(timeout)
+            controller_done = feedback if 'watch' in record else None
+
+            item = dict(sequence_id=record['sequence_id'],
+                        instruction=record['instruction'],
+                        sent=record['sent'],
+                        received=record['received'],
+                        round_trip=record['received'] - record['sent'],
+                        controller_start=None,
+                        controller_done=None,
+                        controller_time=None)
+
+            if controller_done is not None:
+                item['controller_start'] = previous_done
+                item['controller_done'] = controller_done
+                item['controller_time'] = controller_done - previous_done
+                previous_done = controller_done
+
+            profile.append(item)
+
+        return profile
+
+    def summary(self, timeout=None):
+        """Aggregate the profile per instruction type.
+
+        Returns
+        -------
+        :obj:`dict`
+            Instruction name mapped to ``count``, ``round_trip`` (mean) and
+            ``controller_time`` (total and mean).
+        """
+        summary = {}
+        for item in self.profile(timeout):
+            stats = summary.setdefault(item['instruction'], dict(count=0, round_trip=0., controller_total=0.))
+            stats['count'] += 1
+            stats['round_trip'] += item['round_trip']
+            stats['controller_total'] += item['controller_time'] or 0.
+
+        for stats in summary.values():
+            stats['round_trip'] /= stats['count']
+            stats['controller_mean'] = stats['controller_total'] / stats['count']
+
+        return summary
+
+    def print_summary(self, timeout=None):
+        """Print the per-instruction summary, slowest instructions first."""
+        summary = self.summary(timeout)
+        row = '{:<20} {:>6} {:>14.3f} {:>14.3f} {:>14.3f}'
+        print('{:<20} {:>6} {:>14} {:>14} {:>14}'.format('Instruction', 'Count', 'Round-trip [s]', 'Ctrl mean [s]', 'Ctrl total [s]'))
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]['controller_total']):
+            print(row.format(name, stats['count'], stats['round_trip'], stats['controller_mean'], stats['controller_total']))
+
+    def _timestamp(self, future, record):
+        # Record the client time at which the feedback arrives, see _receive
+        record['stamped'] = threading.Event()
+        if future is None:
+            record['received'] = record['sent']
+            record['stamped'].set()
+            return
+
+        with self._condition:
+            self._pending.append((future, record))
+            self._condition.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._receive, name='rrc-profiling')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _receive(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                future, record = self._pending.pop(0)
+
+            try:
+                future.result()
+            except Exception:
+                pass  # an error is feedback too, it is raised again by profile()
+            record['received'] = self.clock()
+            record['stamped'].set()
+
+
+def _instruction_name(instruction):
+    name = instruction.instruction.replace('r_RRC_', '')
+    if name == 'MoveTo' and instruction.string_values:
+        name += instruction.string_values[0]
+    return name
@@ -0,0 +1,62 @@
+import os
+
+import compas_rrc as rrc
+
+import compas
+from trajectory_execution import execute_trajectory
+
+HERE = os.path.dirname(__file__)
+
+if __name__ == '__main__':
+
+    # Load assembly with the trajectories planned in lecture 07
+    assembly = compas.json_load(os.path.join(HERE, '..', 'lecture_07', 'assembly.json'))
+    if 'pick_trajectory' not in assembly.attributes:
+        raise Exception('The assembly has no pick trajectory, plan it first with lecture_07/08_plan_pick_trajectory.py')
+
+    # Create Ros Client
+    ros = rrc.RosClient()
+    ros.run()
+
+    # Create ABB Client
+    abb = rrc.AbbClient(ros, '/rob1')
+    print('Connected.')
+
+    # Reset signals
+    abb.send(rrc.SetDigital('doUnitC106Out2', 0))
+
+    # Set tool
+    abb.send(rrc.SetTool('t_RRC_Vacuum_Gripper'))
+
+    # Set work object
+    abb.send(rrc.SetWorkObject('wobj0'))
+
+    # Define speed
+    speed = 250
+
+    for key in sorted(assembly.nodes()):
+        element = assembly.element(key)
+        if not element.trajectory:
+            print('Skipping element {} without trajectory'.format(key))
+            continue
+
+        # Pick: stream the pick trajectory and wait until the robot reaches the brick
+        execute_trajectory(abb, assembly.pick_trajectory, speed)
+        abb.send_and_wait(rrc.SetDigital('doUnitC106Out2', 1))
+
+        # Place: stream the decimated placement trajectory, fly-by zones chosen from path curvature
+        execute_trajectory(abb, element.trajectory, speed)
+        abb.send_and_wait(rrc.SetDigital('doUnitC106Out2', 0))
+
+        # Retreat: replay the placement trajectory backwards, away from the placed bricks,
+        # back to the end of the pick trajectory over the pick station
+        execute_trajectory(abb, list(reversed(element.trajectory)), speed)
+
+        print('Placed element {}'.format(key))
+
+    # End of Code
+    print('Finished')
+
+    # Close client
+    ros.close()
+    ros.terminate()
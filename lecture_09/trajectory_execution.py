@@ -0,0 +1,200 @@
+"""Execute planned joint trajectories with COMPAS RRC.
+
+MoveIt trajectories are densely sampled (one point every few millimeters),
+sending every point as a fine point makes the controller stop at each of them.
+This module decimates the trajectory in joint space and assigns fly-by zones
+depending on how sharply the path turns at each kept point, so that the robot
+runs through the planned, collision-free motion without stopping.
+"""
+from __future__ import print_function
+
+import math
+
+import compas_rrc as rrc
+from compas.robots import Joint
+
+__all__ = ['DEFAULT_ZONES', 'to_rrc_joints', 'decimate', 'select_zones', 'trajectory_to_instructions', 'execute_trajectory']
+
+# (maximum turning angle in degrees, zone), sorted from smooth to sharp turns
+DEFAULT_ZONES = [
+    (5., rrc.Zone.Z50),
+    (15., rrc.Zone.Z20),
+    (30., rrc.Zone.Z10),
+    (60., rrc.Zone.Z5),
+    (90., rrc.Zone.Z1),
+]
+
+
+def to_rrc_joints(point):
+    """Convert a trajectory point from ROS units (rad, m) to RRC units (°, mm)."""
+    values = []
+    for value, joint_type in zip(point.joint_values, point.joint_types):
+        if joint_type == Joint.PRISMATIC:
+            values.append(value * 1000.)
+        else:
+            values.append(math.degrees(value))
+    return values
+
+
+def decimate(configurations, tolerance):
+    """Remove configurations that lie on the straight joint-space segment between their neighbors.
+
+    Iterative Ramer-Douglas-Peucker simplification in joint space.
+
+    Parameters
+    ----------
+    configurations : :obj:`list` of :obj:`list` of :obj:`float`
+        Joint values in RRC units.
+    tolerance : :obj:`float`
+        Maximum deviation (° or mm) allowed from the original trajectory.
+
+    Returns
+    -------
+    :obj:`list` of :obj:`int`
+        Indices of the configurations to keep, always including first and last.
+    """
+    count = len(configurations)
+    if count < 3:
+        return list(range(count))
+
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        a, b = configurations[start], configurations[end]
+        max_deviation, max_index = 0., None
+
+        for i in range(start + 1, end):
+            deviation = _distance_to_segment(configurations[i], a, b)
+            if deviation > max_deviation:
+                max_deviation, max_index = deviation, i
+
+        if max_index is not None and max_deviation > tolerance:
+            keep[max_index] = True
+            stack.append((start, max_index))
+            stack.append((max_index, end))
+
+    return [i for i in range(count) if keep[i]]
+
+
+def select_zones(configurations, zones=None):
+    """Choose a zone for every configuration from the turning angle of the path at that point.
+
+    First and last configurations are always :attr:`rrc.Zone.FINE`, as are
+    turns sharper than the last entry of ``zones``.
+
+    Parameters
+    ----------
+    configurations : :obj:`list` of :obj:`list` of :obj:`float`
+        Joint values in RRC units.
+    zones : :obj:`list` of :obj:`tuple`
+        Pairs of maximum turning angle (°) and zone. Defaults to :data:`DEFAULT_ZONES`.
+
+    Returns
+    -------
+    :obj:`list` of :class:`rrc.Zone`
+    """
+    zones = zones or DEFAULT_ZONES
+    result = [rrc.Zone.FINE] * len(configurations)
+
+    for i in range(1, len(configurations) - 1):
+        incoming = _subtract(configurations[i], configurations[i - 1])
+        outgoing = _subtract(configurations[i + 1], configurations[i])
+        angle = _angle(incoming, outgoing)
+
+        for max_angle, zone in zones:
+            if angle <= max_angle:
+                result[i] = zone
+                break
+
+    return result
+
+
+def trajectory_to_instructions(trajectory, speed, tolerance=0.5, zones=None, external_axes=None):
+    """Convert a joint trajectory into a list of ``MoveToJoints`` instructions.
+
+    Parameters
+    ----------
+    trajectory : :class:`compas_fab.robots.JointTrajectory` or :obj:`list` of :class:`compas_fab.robots.JointTrajectoryPoint`
+        Planned trajectory, e.g. ``Element.trajectory``.
+    speed : :obj:`float`
+        TCP speed in mm/s.
+    tolerance : :obj:`float`
+        Decimation tolerance in joint space (° or mm).
+    zones : :obj:`list` of :obj:`tuple`
+        Turning angle to zone mapping, see :func:`select_zones`.
+    external_axes : :class:`rrc.ExternalAxes`
+        External axes values to send with every instruction. Optional.
+
+    Returns
+    -------
+    :obj:`list` of :class:`rrc.MoveToJoints`
+    """
+    points = getattr(trajectory, 'points', trajectory)
+    configurations = [to_rrc_joints(point) for point in points]
+
+    kept = [configurations[i] for i in decimate(configurations, tolerance)]
+    kept_zones = select_zones(kept, zones)
+    external_axes = external_axes or rrc.ExternalAxes()
+
+    return [rrc.MoveToJoints(joints, external_axes, speed, zone) for joints, zone in zip(kept, kept_zones)]
+
+
+def execute_trajectory(abb, trajectory, speed, tolerance=0.5, zones=None, external_axes=None, wait=True, timeout=None):
+    """Stream a joint trajectory to the robot.
+
+    All instructions are sent without waiting, only the last one (a fine point)
+    requests feedback.
+
+    Parameters
+    ----------
+    abb : ``rrc.AbbClient``
+        Client connected to the robot.
+    wait : :obj:`bool`
+        If ``True``, block until the last point has been reached.
+        Otherwise return the future of the last instruction.
+
+    Other parameters are passed to :func:`trajectory_to_instructions`.
+    """
+    instructions = trajectory_to_instructions(trajectory, speed, tolerance, zones, external_axes)
+    if not instructions:
+        return None
+
+    for instruction in instructions[:-1]:
+        abb.send(instruction)
+
+    last = instructions[-1]
+    last.feedback_level = rrc.FeedbackLevel.DONE
+    future = abb.send(last)
+
+    if wait:
+        return future.result(timeout)
+    return future
+
+
+def _subtract(a, b):
+    return [x - y for x, y in zip(a, b)]
+
+
+def _norm(a):
+    return math.sqrt(sum(x * x for x in a))
+
+
+def _angle(a, b):
+    na, nb = _norm(a), _norm(b)
+    if na == 0 or nb == 0:
+        return 0.
+    cos_angle = sum(x * y for x, y in zip(a, b)) / (na * nb)
+    return math.degrees(math.acos(max(-1., min(1., cos_angle))))
+
+
+def _distance_to_segment(p, a, b):
+    ab = _subtract(b, a)
+    ap = _subtract(p, a)
+    length_squared = sum(x * x for x in ab)
+    if length_squared == 0:
+        return _norm(ap)
+    t = max(0., min(1., sum(x * y for x, y in zip(ap, ab)) / length_squared))
+    return _norm([x - t * y for x, y in zip(ap, ab)])
@@ -16,9 +16,19 @@ from compas_slicer.print_organization import set_linear_velocity_constant
 from compas_slicer.print_organization import set_blend_radius
 from compas_slicer.utilities import save_to_json
 
-from compas.datastructures import Mesh
 from compas.geometry import Point
 
+from parallel_layers import seams_smooth_parallel
+from parallel_layers import create_printpoints_parallel
+from stage_cache import StageCache
+from adaptive_slicing import AdaptivePlanarSlicer
+from adaptive_slicing import set_adaptive_layer_heights
+from print_estimator import estimate_print
+from travel_optimization import optimize_travel
+from batched_rdp import simplify_paths_rdp_batched
+from stage_profiler import StageProfiler
+from obj_loader import mesh_from_obj
+
 # ==============================================================================
 # Logging
 # ==============================================================================
@@ -32,14 +42,24 @@ DATA = os.path.join(os.path.dirname(__file__), 'data')
 OUTPUT_DIR = utils.get_output_directory(DATA)  # creates 'output' folder if it doesn't already exist
 MODEL = 'simple_vase_open_low_res.obj'
 
+# Run the per-layer steps on all cores (same result, faster for large models)
+PARALLEL = True
+# Reuse the slicing results of previous runs (stored in OUTPUT_DIR/cache)
+USE_CACHE = True
+# Record the time and item counts of every stage, saved to OUTPUT_DIR/trace.json to open in
+# chrome://tracing or https://ui.perfetto.dev (memory=True adds the peak memory, but slows down the stages)
+profiler = StageProfiler(memory=False)
 
-def main():
-    start_time = time.time()
+
+def slice_model(slicer_type, layer_height):
+    """Slicing stage: everything that only depends on the mesh and the slicing parameters."""
 
     # ==========================================================================
     # Load mesh
     # ==========================================================================
-    compas_mesh = Mesh.from_obj(os.path.join(DATA, MODEL))
+    # the vertices and faces are parsed in bulk, and cached next to the OBJ for the next runs
+    with profiler.stage('load'):
+        compas_mesh = mesh_from_obj(os.path.join(DATA, MODEL))
 
     # ==========================================================================
     # Move to origin
@@ -52,32 +72,81 @@ def main():
     #          'cgal':    Very fast. Only for closed paths.
     #                     Requires additional installation (compas_cgal).
     # ==========================================================================
-    slicer = PlanarSlicer(compas_mesh, slicer_type="cgal", layer_height=5)
-    slicer.slice_model()
+    slicer = PlanarSlicer(compas_mesh, slicer_type=slicer_type, layer_height=layer_height)
+    # Adaptive layer heights: thin layers where the surface is shallow, thick layers on steep walls
+    # slicer = AdaptivePlanarSlicer(compas_mesh, slicer_type=slicer_type,
+    #                               min_layer_height=1.0, max_layer_height=layer_height, cusp_height=0.5)
+    with profiler.stage('slice') as stage:
+        slicer.slice_model()
+        stage.count(slicer=slicer)
 
     # ==========================================================================
     # Generate brim / raft
     # ==========================================================================
     # NOTE: Typically you would want to use either a brim OR a raft,
     # however, in this example both are used to explain the functionality
-    generate_brim(slicer, layer_width=3.0, number_of_brim_offsets=4)
+    with profiler.stage('brim'):
+        generate_brim(slicer, layer_width=3.0, number_of_brim_offsets=4)
     # generate_raft(slicer,
     #               raft_offset=20,
     #               distance_between_paths=5,
     #               direction="xy_diagonal",
     #               raft_layers=1)
 
+    return slicer
+
+
+def post_process(slicer, rdp_threshold, smooth_distance):
+    """Post-processing stage: simplification, seams and travels of the sliced paths."""
+
     # ==========================================================================
     # Simplify the paths by removing points with a certain threshold
     # change the threshold value to remove more or less points
     # ==========================================================================
-    simplify_paths_rdp(slicer, threshold=0.7)
+    # the batched version simplifies all paths at once, with the same result
+    with profiler.stage('rdp') as stage:
+        if PARALLEL:
+            simplify_paths_rdp_batched(slicer, threshold=rdp_threshold)
+        else:
+            simplify_paths_rdp(slicer, threshold=rdp_threshold)
+        stage.count(slicer=slicer)
 
     # ==========================================================================
     # Smooth the seams between layers
     # change the smooth_distance value to achieve smoother, or more abrupt seams
     # ==========================================================================
-    seams_smooth(slicer, smooth_distance=10)
+    with profiler.stage('seams'):
+        if PARALLEL:
+            seams_smooth_parallel(slicer, smooth_distance=smooth_distance)
+        else:
+            seams_smooth(slicer, smooth_distance=smooth_distance)
+
+    # ==========================================================================
+    # Reorder the paths of the layers with several paths (and move the seams of
+    # their closed paths) to shorten the travels between them
+    # ==========================================================================
+    with profiler.stage('travel'):
+        optimize_travel(slicer)
+
+    return slicer
+
+
+def main():
+    start_time = time.time()
+
+    # ==========================================================================
+    # Slicing and post-processing, cached: each is only recomputed if the mesh,
+    # its parameters, its function or the helper modules change, so tweaking
+    # the post-processing doesn't require slicing again. The fabrication
+    # parameters below are always recomputed.
+    # ==========================================================================
+    cache = StageCache(os.path.join(OUTPUT_DIR, 'cache'), os.path.join(DATA, MODEL), enabled=USE_CACHE)
+    with profiler.stage('slicing') as stage:
+        slicer = cache.run('slicing', slice_model, slicer_type="cgal", layer_height=5)
+        stage.count(slicer=slicer)
+    with profiler.stage('post_processing') as stage:
+        slicer = cache.run('post_processing', post_process, slicer, rdp_threshold=0.7, smooth_distance=10)
+        stage.count(slicer=slicer)
 
     # ==========================================================================
     # Prints out the info of the slicer
@@ -87,36 +156,75 @@ def main():
     # ==========================================================================
     # Save slicer data to JSON
     # ==========================================================================
-    save_to_json(slicer.to_data(), OUTPUT_DIR, 'slicer_data.json')
+    with profiler.stage('save_slicer'):
+        save_to_json(slicer.to_data(), OUTPUT_DIR, 'slicer_data.json')
+    # Compact binary alternative, memory-mappable for random access to single layers:
+    # from columnar_io import save_slicer_columnar
+    # save_slicer_columnar(slicer, OUTPUT_DIR, 'slicer_data.bin')
 
     # ==========================================================================
     # Initializes the PlanarPrintOrganizer and creates PrintPoints
     # ==========================================================================
-    print_organizer = PlanarPrintOrganizer(slicer)
-    print_organizer.create_printpoints()
+    with profiler.stage('printpoints') as stage:
+        print_organizer = PlanarPrintOrganizer(slicer)
+        if PARALLEL:
+            create_printpoints_parallel(print_organizer)
+        else:
+            print_organizer.create_printpoints()
+        if isinstance(slicer, AdaptivePlanarSlicer):
+            set_adaptive_layer_heights(print_organizer)
+        stage.count(print_organizer=print_organizer)
 
     # ==========================================================================
     # Set fabrication-related parameters
     # ==========================================================================
-    set_extruder_toggle(print_organizer, slicer)
-    add_safety_printpoints(print_organizer, z_hop=10.0)
-    set_linear_velocity_constant(print_organizer, v=100.0)
-    set_blend_radius(print_organizer, d_fillet=10.0)
+    with profiler.stage('fabrication_parameters') as stage:
+        set_extruder_toggle(print_organizer, slicer)
+        add_safety_printpoints(print_organizer, z_hop=10.0)
+        # Or only lift the nozzle for travels longer than min_travel:
+        # from travel_optimization import add_safety_printpoints_for_travels
+        # add_safety_printpoints_for_travels(print_organizer, z_hop=10.0, min_travel=5.0)
+        set_linear_velocity_constant(print_organizer, v=100.0)
+        set_blend_radius(print_organizer, d_fillet=10.0)
+        stage.count(print_organizer=print_organizer)
 
     # ==========================================================================
     # Prints out the info of the PrintOrganizer
     # ==========================================================================
     print_organizer.printout_info()
 
+    # ==========================================================================
+    # Estimates the print time and material, per layer, to compare parameter
+    # sets before printing (path_width: width of the extruded bead in mm)
+    # ==========================================================================
+    with profiler.stage('estimate'):
+        estimate = estimate_print(print_organizer, path_width=3.0, acceleration=500.0)
+    estimate.printout_info()
+
     # ==========================================================================
     # Converts the PrintPoints to data and saves to JSON
     # =========================================================================
-    printpoints_data = print_organizer.output_printpoints_dict()
-    utils.save_to_json(printpoints_data, OUTPUT_DIR, 'out_printpoints.json')
+    with profiler.stage('export'):
+        printpoints_data = print_organizer.output_printpoints_dict()
+        utils.save_to_json(printpoints_data, OUTPUT_DIR, 'out_printpoints.json')
+
+    # For large prints, stream the PrintPoints to disk layer by layer instead,
+    # and read them back lazily with printpoints_io.PrintpointsReader:
+    # from printpoints_io import write_printpoints
+    # write_printpoints(print_organizer, OUTPUT_DIR, 'out_printpoints.jsonl')
+    # or save them in the columnar binary format, see columnar_io.PrintpointsColumns:
+    # from columnar_io import save_printpoints_columnar
+    # save_printpoints_columnar(print_organizer, OUTPUT_DIR, 'out_printpoints.bin')
 
     end_time = time.time()
     print("Total elapsed time", round(end_time - start_time, 2), "seconds")
 
+    # ==========================================================================
+    # Prints out the time, peak memory and item counts of every stage
+    # ==========================================================================
+    profiler.printout_info()
+    profiler.save_trace(os.path.join(OUTPUT_DIR, 'trace.json'))
+
 
 if __name__ == "__main__":
     main()
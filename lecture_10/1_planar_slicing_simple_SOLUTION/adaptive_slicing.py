@@ -0,0 +1,194 @@
+"""Adaptive layer height planar slicing.
+
+With a constant layer height, the visible staircase (cusp) on the surface is
+largest where the surface is shallow. The cusp height of a face with unit
+normal n, printed with layer height h, is ``h * |n_z|``. Limiting the cusp
+height gives the largest layer height allowed by every face::
+
+    h = cusp_height / |n_z|,  clamped to [min_layer_height, max_layer_height]
+
+Vertical walls are printed with the maximum layer height, shallow regions
+with thinner layers. The allowed height of all faces is evaluated at once
+with NumPy and collected into a height profile along z, from which the
+planes are placed bottom-up.
+"""
+import logging
+
+import numpy as np
+from compas.geometry import Plane, Point, Vector
+from compas_slicer.slicers import PlanarSlicer
+import compas_slicer
+
+logger = logging.getLogger('logger')
+
+__all__ = ['AdaptivePlanarSlicer',
+           'face_layer_heights',
+           'layer_height_profile',
+           'adaptive_plane_heights',
+           'set_adaptive_layer_heights']
+
+
+def face_layer_heights(mesh, min_layer_height, max_layer_height, cusp_height):
+    """Maximum layer height of every face of a triangle mesh, and its z range.
+
+    Returns
+    ----------
+    tuple of (F,) arrays
+        Layer heights, min z and max z of every face.
+    """
+    key_index = mesh.key_index()
+    vertices = np.array(mesh.vertices_attributes('xyz'), dtype=float)
+    faces = np.array([[key_index[key] for key in mesh.face_vertices(fkey)] for fkey in mesh.faces()], dtype=int)
+
+    a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    normals = np.cross(b - a, c - a)
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1.0
+    nz = np.abs(normals[:, 2]) / lengths
+
+    with np.errstate(divide='ignore'):
+        heights = np.clip(cusp_height / nz, min_layer_height, max_layer_height)
+
+    z = vertices[faces][:, :, 2]
+    return heights, z.min(axis=1), z.max(axis=1)
+
+
+def layer_height_profile(heights, z_min, z_max, start, resolution, max_layer_height):
+    """Smallest allowed layer height in every z-interval of size ``resolution``.
+
+    Every face lowers the profile over all the intervals its z range overlaps.
+    Intervals without faces get ``max_layer_height``.
+    """
+    first = np.floor((z_min - start) / resolution).astype(int)
+    last = np.floor((z_max - start) / resolution).astype(int)
+    size = max(1, int(last.max()) + 1)
+    profile = np.full(size, float(max_layer_height))
+
+    # expand every face into the intervals it spans, and take the minimum per interval
+    counts = last - first + 1
+    face_index = np.repeat(np.arange(len(heights)), counts)
+    interval = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)
+    np.minimum.at(profile, interval, heights[face_index])
+    return profile
+
+
+def adaptive_plane_heights(profile, start, end, resolution):
+    """Places planes bottom-up, so that every layer is at most as thick as the profile allows over its range.
+
+    Returns
+    ----------
+    list of float
+        The z values of the planes.
+    list of float
+        The thickness of every layer (distance to the plane below, the first
+        layer gets the thickness of the layer above it).
+    """
+    z = start
+    planes = [z]
+    while True:
+        i = int((z - start) / resolution)
+        h = profile[min(i, len(profile) - 1)]
+        # the layer must also respect the shallower faces further up within its thickness
+        j = int((z + h - start) / resolution)
+        h = min(h, profile[i:j + 1].min()) if j > i else h
+        if z + h > end + 1e-9:
+            break
+        z += h
+        planes.append(z)
+
+    thicknesses = np.diff(planes).tolist()
+    thicknesses = thicknesses[:1] + thicknesses if thicknesses else [profile[0]]
+    return planes, thicknesses
+
+
+class AdaptivePlanarSlicer(PlanarSlicer):
+    """
+    Generates planar contours whose distance adapts to the slope of the surface.
+
+    Attributes
+    ----------
+    mesh: :class:`compas.datastructures.Mesh`
+        Input mesh, it must be a triangular mesh (i.e. no quads or n-gons allowed).
+    slicer_type: str
+        String representing which slicing method to use.
+        options: 'default', 'cgal'
+    min_layer_height: float
+    max_layer_height: float
+    cusp_height: float
+        Maximum allowed staircase height on the surface.
+    resolution: float (optional)
+        Size of the z-intervals of the height profile. Defaults to min_layer_height / 4.
+    layer_heights: list of float
+        Thickness of every layer, filled in by ``slice_model``.
+    """
+
+    def __init__(self, mesh, slicer_type="default", min_layer_height=1.0, max_layer_height=5.0, cusp_height=0.5,
+                 resolution=None):
+        PlanarSlicer.__init__(self, mesh, slicer_type=slicer_type, layer_height=max_layer_height)
+        self.min_layer_height = min_layer_height
+        self.max_layer_height = max_layer_height
+        self.cusp_height = cusp_height
+        self.resolution = resolution or min_layer_height / 4.0
+        self.layer_heights = []
+
+    def __repr__(self):
+        return "<AdaptivePlanarSlicer with %d layers and layer heights : %.2f - %.2f mm>" % \
+               (len(self.layers), self.min_layer_height, self.max_layer_height)
+
+    def generate_paths(self):
+        """Generates the adaptive planar slicing paths."""
+        heights, z_min, z_max = face_layer_heights(self.mesh, self.min_layer_height, self.max_layer_height,
+                                                   self.cusp_height)
+        start, end = z_min.min(), z_max.max()
+
+        profile = layer_height_profile(heights, z_min, z_max, start, self.resolution, self.max_layer_height)
+        plane_heights, thicknesses = adaptive_plane_heights(profile, start, end, self.resolution)
+
+        logger.info("Adaptive slicing: %d layers, instead of %d with a constant layer height of %.2f mm" %
+                    (len(plane_heights), int((end - start) / self.min_layer_height) + 1, self.min_layer_height))
+
+        normal = Vector(0, 0, 1)
+        planes = [Plane(Point(0, 0, z), normal) for z in plane_heights]
+
+        if self.slicer_type == "default":
+            self.layers = compas_slicer.slicers.create_planar_paths(self.mesh, planes)
+        elif self.slicer_type == "cgal":
+            self.layers = compas_slicer.slicers.create_planar_paths_cgal(self.mesh, planes)
+        else:
+            raise NameError("Invalid slicing type : " + self.slicer_type)
+
+        # planes without a valid intersection don't produce a layer, so the
+        # thickness of every layer is looked up by the height of its plane
+        layer_z = np.array([layer.paths[0].points[0][2] for layer in self.layers])
+        indices = np.abs(layer_z[:, None] - np.array(plane_heights)[None, :]).argmin(axis=1)
+        self.layer_heights = [thicknesses[i] for i in indices]
+        # also stored on the layers, so that it stays with its layer when raft layers are inserted
+        for layer, layer_height in zip(self.layers, self.layer_heights):
+            layer.layer_height = layer_height
+
+        # the average, for the functions that expect a single layer height
+        self.layer_height = float(np.mean(self.layer_heights))
+
+
+def set_adaptive_layer_heights(print_organizer):
+    """Sets the layer height of every printpoint to the thickness of its layer.
+
+    ``create_printpoints`` uses the single ``slicer.layer_height`` for all printpoints,
+    call this afterwards when slicing with the :class:`AdaptivePlanarSlicer`.
+    Raft layers keep the layer height they were created with.
+    """
+    layers = print_organizer.slicer.layers
+    printpoints_dict = print_organizer.printpoints_dict
+    if len(printpoints_dict) != len(layers):
+        raise ValueError("The print organizer has %d layers of printpoints, the slicer %d layers" %
+                         (len(printpoints_dict), len(layers)))
+
+    for layer, layer_key in zip(layers, printpoints_dict):
+        if layer.is_raft:
+            continue
+        if not hasattr(layer, 'layer_height'):
+            raise ValueError("Layer %s has no adaptive layer height, was it sliced by the AdaptivePlanarSlicer?"
+                             % layer_key)
+        for path_key in printpoints_dict[layer_key]:
+            for printpoint in printpoints_dict[layer_key][path_key]:
+                printpoint.layer_height = layer.layer_height
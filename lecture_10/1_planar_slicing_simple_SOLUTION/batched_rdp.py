@@ -0,0 +1,154 @@
+"""Batched Ramer-Douglas-Peucker simplification of all the paths of a slicer.
+
+``simplify_paths_rdp`` calls the recursive ``rdp.rdp`` for every path, with a
+Python function call per point. Here the points of all paths are one
+flattened (N, 3) array with a table of path offsets (see
+:class:`parallel_layers.PathArrays`), and the recursion is replaced by rounds:
+in every round, all open segments of all paths are evaluated together with
+NumPy, and the segments whose farthest point is further than the threshold
+are split at that point. The number of rounds is the depth of the recursion,
+the work per round is one pass over the points::
+
+    statistics = simplify_paths_rdp_batched(slicer, threshold=0.7)
+
+The result is the same as with ``simplify_paths_rdp``.
+"""
+import logging
+
+import numpy as np
+
+from compas.geometry import Point
+
+from parallel_layers import PathArrays
+from parallel_layers import map_layers
+
+logger = logging.getLogger('logger')
+
+__all__ = ['rdp_mask',
+           'simplify_paths_rdp_batched']
+
+
+def rdp_mask(points, path_offsets, epsilon):
+    """Points kept by the Ramer-Douglas-Peucker simplification of every path.
+
+    Parameters
+    ----------
+    points: (N, 3) array
+        The points of all paths, one path after the other.
+    path_offsets: (P + 1,) array
+        Path p consists of ``points[path_offsets[p]:path_offsets[p + 1]]``.
+    epsilon: float
+
+    Returns
+    ----------
+    (N,) array of bool
+        True for the points that are kept.
+    int
+        Number of rounds (the depth of the recursion).
+    """
+    points = np.asarray(points, dtype=float)
+    path_offsets = np.asarray(path_offsets, dtype=np.int64)
+    keep = np.zeros(len(points), dtype=bool)
+
+    # the first and last point of every (non-empty) path are kept
+    starts, ends = path_offsets[:-1], path_offsets[1:] - 1
+    valid = ends >= starts
+    keep[starts[valid]] = True
+    keep[ends[valid]] = True
+
+    # open segments, first and last point index (inclusive)
+    lo, hi = starts[valid], ends[valid]
+    rounds = 0
+    while True:
+        counts = hi - lo - 1
+        lo, hi, counts = lo[counts > 0], hi[counts > 0], counts[counts > 0]
+        if len(lo) == 0:
+            break
+        rounds += 1
+
+        # the points inside every segment, and the segment they belong to
+        segment = np.repeat(np.arange(len(lo)), counts)
+        first = np.cumsum(counts) - counts
+        index = np.arange(counts.sum()) - np.repeat(first, counts) + np.repeat(lo + 1, counts)
+
+        # distance to the line through the segment ends, as rdp.pldist
+        a, b = points[lo][segment], points[hi][segment]
+        chord = b - a
+        chord_length = np.linalg.norm(chord, axis=1)
+        degenerate = chord_length == 0
+        chord_length[degenerate] = 1.0
+        distances = np.linalg.norm(np.cross(chord, a - points[index]), axis=1) / chord_length
+        distances[degenerate] = np.linalg.norm(points[index[degenerate]] - a[degenerate], axis=1)
+
+        # the first farthest point of every segment
+        farthest = np.maximum.reduceat(distances, first)
+        is_max = distances == farthest[segment]
+        segments_with_max, first_max = np.unique(segment[is_max], return_index=True)
+        split = np.flatnonzero(is_max)[first_max]
+        assert len(segments_with_max) == len(lo)
+
+        divide = farthest > epsilon
+        middle = index[split][divide]
+        keep[middle] = True
+        lo, hi = np.concatenate([lo[divide], middle]), np.concatenate([middle, hi[divide]])
+
+    return keep, rounds
+
+
+def _rdp_layer(points, is_closed, layer_index, threshold):
+    # all paths of a layer are simplified together
+    lengths = [len(pts) for pts in points]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    flat = np.vstack(points) if points else np.zeros((0, 3))
+    keep, rounds = rdp_mask(flat, offsets, threshold)
+    return [flat[offsets[p]:offsets[p + 1]][keep[offsets[p]:offsets[p + 1]]] for p in range(len(points))], rounds
+
+
+def simplify_paths_rdp_batched(slicer, threshold, processes=1):
+    """Batched version of ``simplify_paths_rdp``, with the same result.
+
+    Parameters
+    ----------
+    slicer: :class:`compas_slicer.slicers.BaseSlicer`
+    threshold: float
+        Controls the degree of polyline simplification.
+    processes: int, optional
+        Number of worker processes. With 1 (default), all layers are simplified
+        in one batch, otherwise the layers are distributed over the processes.
+
+    Returns
+    ----------
+    dict
+        Statistics: points before and after, removed in total and per layer, and the number of rounds.
+    """
+    logger.info("Paths simplification rdp (batched)")
+    layers = [i for i, layer in enumerate(slicer.layers) if not layer.is_raft]
+    before = [sum(len(path.points) for path in slicer.layers[i].paths) for i in layers]
+
+    if processes == 1:
+        arrays = PathArrays.from_slicer(slicer)
+        keep, rounds = rdp_mask(arrays.points, arrays.path_offsets, threshold)
+        results = []
+        for i in layers:
+            paths = range(arrays.layer_offsets[i], arrays.layer_offsets[i + 1])
+            results.append([arrays.points[arrays.path_offsets[p]:arrays.path_offsets[p + 1]]
+                            [keep[arrays.path_offsets[p]:arrays.path_offsets[p + 1]]] for p in paths])
+    else:
+        layer_results = map_layers(slicer, _rdp_layer, layers, processes, threshold=threshold)
+        results = [points for points, _ in layer_results]
+        rounds = max([r for _, r in layer_results] or [0])
+
+    for i, points in zip(layers, results):
+        for path, pts in zip(slicer.layers[i].paths, points):
+            path.points = [Point(*pt) for pt in pts.tolist()]
+
+    after = [sum(len(pts) for pts in points) for points in results]
+    statistics = dict(points_before=sum(before),
+                      points_after=sum(after),
+                      removed=sum(before) - sum(after),
+                      removed_per_layer={i: b - a for i, b, a in zip(layers, before, after)},
+                      rounds=rounds)
+    logger.info('%d Points remaining after rdp simplification, %d removed (%.0f%%) in %d rounds' %
+                (statistics['points_after'], statistics['removed'],
+                 100.0 * statistics['removed'] / max(statistics['points_before'], 1), rounds))
+    return statistics
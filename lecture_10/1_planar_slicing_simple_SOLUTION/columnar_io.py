@@ -0,0 +1,268 @@
+"""Columnar binary format for slicer and printpoint output.
+
+Instead of one JSON dictionary per point, every attribute is stored as one
+typed array (a column) for all points, plus offset tables that tell where
+every path and layer starts::
+
+    path p  -> rows path_offsets[p]:path_offsets[p + 1]
+    layer i -> paths layer_offsets[i]:layer_offsets[i + 1]
+
+The file is a small JSON header followed by the raw arrays, each aligned to
+64 bytes. The reader memory-maps the file, so opening it is instant and
+reading a single layer only touches the bytes of that layer::
+
+    save_printpoints_columnar(print_organizer, OUTPUT_DIR, 'out_printpoints.bin')
+
+    printpoints = PrintpointsColumns(os.path.join(OUTPUT_DIR, 'out_printpoints.bin'))
+    layer = printpoints.layer(10)
+    layer['point'], layer['velocity']  # (n, 3) and (n,) arrays of layer 10
+
+Missing values (e.g. a velocity that was never set) are stored as NaN, and as
+255 for the boolean ``extruder_toggle``.
+"""
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger('logger')
+
+__all__ = ['write_columns',
+           'ColumnarFile',
+           'save_slicer_columnar',
+           'save_printpoints_columnar',
+           'SlicerColumns',
+           'PrintpointsColumns']
+
+MAGIC = b'CSLCOL01'
+ALIGNMENT = 64
+NONE_BOOL = 255
+
+
+# ==============================================================================
+# File format
+# ==============================================================================
+def write_columns(filename, columns, metadata=None):
+    """Writes a dictionary of arrays to a columnar binary file.
+
+    Parameters
+    ----------
+    filename: str
+    columns: dict
+        Name -> :class:`numpy.ndarray`.
+    metadata: dict, optional
+        JSON serializable values stored in the header.
+    """
+    columns = {name: np.ascontiguousarray(array) for name, array in columns.items()}
+
+    # the offsets are relative to the end of the header, so the header size does not depend on them
+    layout, offset = {}, 0
+    for name, array in columns.items():
+        layout[name] = dict(dtype=array.dtype.str, shape=array.shape, offset=offset)
+        offset += _aligned(array.nbytes)
+
+    header = json.dumps(dict(columns=layout, metadata=metadata or {})).encode('utf-8')
+    start = _aligned(len(MAGIC) + 8 + len(header))
+
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', start))
+        f.write(header)
+        for name, array in columns.items():
+            f.seek(start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+
+
+class ColumnarFile(object):
+    """
+    Memory-mapped reader of a file written by :func:`write_columns`.
+
+    Columns are :class:`numpy.memmap` arrays: nothing is read from disk until they are indexed.
+
+    Attributes
+    ----------
+    filename: str
+    metadata: dict
+    columns: list of str
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('Not a columnar slicer file: %s' % filename)
+            start, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(start - len(MAGIC) - 8).rstrip(b'\0').decode('utf-8'))
+
+        self._start = start
+        self._layout = header['columns']
+        self.metadata = header['metadata']
+        self.columns = list(self._layout)
+        self._cache = {}
+
+    def __contains__(self, name):
+        return name in self._layout
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            column = self._layout[name]
+            shape = tuple(column['shape'])
+            if 0 in shape:
+                self._cache[name] = np.zeros(shape, dtype=column['dtype'])
+            else:
+                self._cache[name] = np.memmap(self.filename, dtype=column['dtype'], mode='r',
+                                              offset=self._start + column['offset'], shape=shape)
+        return self._cache[name]
+
+
+def _aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class _LayeredColumns(ColumnarFile):
+    """Columns of points grouped in paths and layers."""
+
+    point_columns = []
+
+    @property
+    def number_of_layers(self):
+        return len(self['layer_offsets']) - 1
+
+    @property
+    def number_of_points(self):
+        return int(self['path_offsets'][-1])
+
+    def layer_rows(self, i):
+        """Returns the (start, end) rows of layer i."""
+        paths = self['layer_offsets'][i], self['layer_offsets'][i + 1]
+        return int(self['path_offsets'][paths[0]]), int(self['path_offsets'][paths[1]])
+
+    def layer(self, i):
+        """Returns the point columns of layer i, as a dictionary of arrays."""
+        start, end = self.layer_rows(i)
+        return {name: self[name][start:end] for name in self.point_columns}
+
+    def layer_paths(self, i):
+        """Returns the point columns of every path of layer i."""
+        paths = []
+        for p in range(self['layer_offsets'][i], self['layer_offsets'][i + 1]):
+            start, end = int(self['path_offsets'][p]), int(self['path_offsets'][p + 1])
+            paths.append({name: self[name][start:end] for name in self.point_columns})
+        return paths
+
+
+def _offsets(lengths):
+    return np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+
+
+# ==============================================================================
+# Slicer
+# ==============================================================================
+class SlicerColumns(_LayeredColumns):
+    """
+    Reader of a slicer saved with :func:`save_slicer_columnar`.
+
+    Columns: ``point`` (N, 3), ``path_offsets``, ``layer_offsets``, ``is_closed``
+    (per path), ``is_brim`` and ``is_raft`` (per layer).
+    """
+
+    point_columns = ['point']
+
+
+def save_slicer_columnar(slicer, filepath, name):
+    """Saves the layers and paths of a slicer in the columnar binary format.
+
+    Parameters
+    ----------
+    slicer: :class:`compas_slicer.slicers.BaseSlicer`
+    filepath: str
+    name: str
+    """
+    filename = os.path.join(filepath, name)
+    logger.info("Saving to columnar binary: " + filename)
+
+    paths = [path for layer in slicer.layers for path in layer.paths]
+    columns = dict(
+        point=np.array([pt for path in paths for pt in path.points], dtype=np.float64).reshape(-1, 3),
+        path_offsets=_offsets([len(path.points) for path in paths]),
+        layer_offsets=_offsets([len(layer.paths) for layer in slicer.layers]),
+        is_closed=np.array([path.is_closed for path in paths], dtype=np.bool_),
+        is_brim=np.array([getattr(layer, 'is_brim', False) for layer in slicer.layers], dtype=np.bool_),
+        is_raft=np.array([getattr(layer, 'is_raft', False) for layer in slicer.layers], dtype=np.bool_),
+    )
+    metadata = dict(layer_height=getattr(slicer, 'layer_height', None))
+    write_columns(filename, columns, metadata)
+
+
+# ==============================================================================
+# Printpoints
+# ==============================================================================
+class PrintpointsColumns(_LayeredColumns):
+    """
+    Reader of printpoints saved with :func:`save_printpoints_columnar`.
+
+    Point columns: ``point``, ``up_vector``, ``mesh_normal``, ``frame_xaxis``,
+    ``frame_yaxis`` (N, 3), ``layer_height``, ``velocity``, ``wait_time``,
+    ``blend_radius``, ``distance_to_support`` (N,) float, ``extruder_toggle``
+    and ``is_feasible`` (N,) uint8.
+    """
+
+    point_columns = ['point', 'up_vector', 'mesh_normal', 'frame_xaxis', 'frame_yaxis',
+                     'layer_height', 'velocity', 'wait_time', 'blend_radius', 'distance_to_support',
+                     'extruder_toggle', 'is_feasible']
+
+
+def save_printpoints_columnar(print_organizer, filepath, name):
+    """Saves the printpoints of a print organizer in the columnar binary format.
+
+    Duplicate points are removed as in ``output_printpoints_dict``, so the rows
+    are the same printpoints, in the same order, as in ``out_printpoints.json``.
+
+    Parameters
+    ----------
+    print_organizer: :class:`compas_slicer.print_organization.BasePrintOrganizer`
+    filepath: str
+    name: str
+    """
+    filename = os.path.join(filepath, name)
+    logger.info("Saving to columnar binary: " + filename)
+
+    paths = []
+    path_counts = []
+    for layer_key in print_organizer.printpoints_dict:
+        path_counts.append(len(print_organizer.printpoints_dict[layer_key]))
+        for path_key in print_organizer.printpoints_dict[layer_key]:
+            print_organizer.remove_duplicate_points_in_path(layer_key, path_key)
+            paths.append(print_organizer.printpoints_dict[layer_key][path_key])
+    printpoints = [pp for path in paths for pp in path]
+
+    def vectors(values):
+        return np.array(values, dtype=np.float64).reshape(-1, 3)
+
+    def floats(values):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    def bools(values):
+        return np.array([NONE_BOOL if v is None else int(v) for v in values], dtype=np.uint8)
+
+    columns = dict(
+        point=vectors([pp.pt for pp in printpoints]),
+        up_vector=vectors([pp.up_vector for pp in printpoints]),
+        mesh_normal=vectors([pp.mesh_normal for pp in printpoints]),
+        frame_xaxis=vectors([pp.frame.xaxis for pp in printpoints]),
+        frame_yaxis=vectors([pp.frame.yaxis for pp in printpoints]),
+        layer_height=floats([pp.layer_height for pp in printpoints]),
+        velocity=floats([pp.velocity for pp in printpoints]),
+        wait_time=floats([pp.wait_time for pp in printpoints]),
+        blend_radius=floats([pp.blend_radius for pp in printpoints]),
+        distance_to_support=floats([pp.distance_to_support for pp in printpoints]),
+        extruder_toggle=bools([pp.extruder_toggle for pp in printpoints]),
+        is_feasible=bools([pp.is_feasible for pp in printpoints]),
+        path_offsets=_offsets([len(path) for path in paths]),
+        layer_offsets=_offsets(path_counts),
+    )
+    write_columns(filename, columns)
+    logger.info("Generated %d print points" % len(printpoints))
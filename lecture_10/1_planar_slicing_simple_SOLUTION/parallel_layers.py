@@ -0,0 +1,319 @@
+"""Parallel per-layer post-processing for planar slicing.
+
+The layers of a planar slicer are independent of each other, so per-layer
+steps can run on all cores. The points of all paths are flattened into one
+(N, 3) array that lives in shared memory: the worker processes attach to it
+once and read their layer directly, instead of receiving pickled
+:class:`compas.geometry.Point` objects. Results are collected in layer order,
+so the output is the same for any number of processes.
+
+Example::
+
+    simplify_paths_rdp_parallel(slicer, threshold=0.7)
+    seams_smooth_parallel(slicer, smooth_distance=10)
+    create_printpoints_parallel(print_organizer)
+
+"""
+import logging
+import os
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+
+import numpy as np
+import rdp
+from scipy.spatial import cKDTree
+
+from compas.geometry import Point
+from compas.geometry import Vector
+from compas_slicer.geometry import PrintPoint
+
+logger = logging.getLogger('logger')
+
+__all__ = ['PathArrays',
+           'map_layers',
+           'simplify_paths_rdp_parallel',
+           'seams_smooth_parallel',
+           'create_printpoints_parallel']
+
+
+# ==============================================================================
+# Flattened paths
+# ==============================================================================
+class PathArrays(object):
+    """
+    The paths of a slicer as flat arrays.
+
+    Attributes
+    ----------
+    points: (N, 3) array
+        The points of all paths, one path after the other.
+    path_offsets: (P + 1,) array
+        Path p consists of ``points[path_offsets[p]:path_offsets[p + 1]]``.
+    layer_offsets: (L + 1,) array
+        Layer i consists of the paths ``layer_offsets[i]`` to ``layer_offsets[i + 1] - 1``.
+    is_closed: (P,) array of bool
+    """
+
+    def __init__(self, points, path_offsets, layer_offsets, is_closed):
+        self.points = points
+        self.path_offsets = path_offsets
+        self.layer_offsets = layer_offsets
+        self.is_closed = is_closed
+
+    @classmethod
+    def from_slicer(cls, slicer):
+        paths = [path for layer in slicer.layers for path in layer.paths]
+        points = [pt for path in paths for pt in path.points]
+        path_offsets = np.cumsum([0] + [len(path.points) for path in paths])
+        layer_offsets = np.cumsum([0] + [len(layer.paths) for layer in slicer.layers])
+        is_closed = np.array([path.is_closed for path in paths], dtype=bool)
+        return cls(np.array(points, dtype=float).reshape(-1, 3), path_offsets, layer_offsets, is_closed)
+
+    def layer(self, i, points=None):
+        """Returns the point arrays and the is_closed flags of the paths of layer i."""
+        points = self.points if points is None else points
+        paths = range(self.layer_offsets[i], self.layer_offsets[i + 1])
+        return ([points[self.path_offsets[p]:self.path_offsets[p + 1]] for p in paths],
+                [bool(self.is_closed[p]) for p in paths])
+
+
+# ==============================================================================
+# Worker processes
+# ==============================================================================
+_worker = {}
+
+
+def _init_worker(name, shape, path_arrays, extra):
+    # attach to the shared points once per process, they are never copied
+    memory = shared_memory.SharedMemory(name=name)
+    _worker['memory'] = memory
+    _worker['points'] = np.ndarray(shape, dtype=float, buffer=memory.buf)
+    _worker['paths'] = path_arrays
+    _worker.update(extra)
+
+
+def _run_layer(function, kwargs, i):
+    points, is_closed = _worker['paths'].layer(i, _worker['points'])
+    return function(points, is_closed, i, **kwargs)
+
+
+def map_layers(slicer, function, layers=None, processes=None, initializer=None, **kwargs):
+    """Evaluates ``function`` for the given layers of a slicer, in parallel.
+
+    Parameters
+    ----------
+    slicer: :class:`compas_slicer.slicers.BaseSlicer`
+    function: callable
+        Module level function ``function(points, is_closed, layer_index, **kwargs)``
+        that gets the (n, 3) point arrays and closed flags of the paths of one layer.
+        It must not modify the points, as they are shared between processes.
+    layers: list of int, optional
+        Indices of the layers to evaluate. Defaults to all layers.
+    processes: int, optional
+        Number of worker processes, defaults to the number of cores.
+        With 1 process, everything runs in the current process.
+    initializer: callable, optional
+        Returns a dictionary of (read-only) data that ``function`` can access from
+        the module level ``_worker`` dictionary, e.g. a spatial index.
+    kwargs:
+        Passed on to ``function``.
+
+    Returns
+    ----------
+    list
+        The results of ``function``, in the order of ``layers``.
+    """
+    path_arrays = PathArrays.from_slicer(slicer)
+    layers = list(range(len(slicer.layers))) if layers is None else list(layers)
+    processes = processes or os.cpu_count() or 1
+    extra = initializer() if initializer else {}
+    task = partial(_run_layer, function, kwargs)
+
+    if processes == 1 or len(layers) < 2:
+        _worker.update(extra, points=path_arrays.points, paths=path_arrays)
+        try:
+            return [task(i) for i in layers]
+        finally:
+            _worker.clear()
+
+    points = path_arrays.points
+    memory = shared_memory.SharedMemory(create=True, size=max(points.nbytes, 1))
+    try:
+        np.ndarray(points.shape, dtype=float, buffer=memory.buf)[:] = points
+        # the offsets are small, they are copied once to every process
+        path_arrays.points = None
+        initargs = (memory.name, points.shape, path_arrays, extra)
+
+        with Pool(min(processes, len(layers)), initializer=_init_worker, initargs=initargs) as pool:
+            # map keeps the order of the layers, whichever process finishes first
+            return pool.map(task, layers, chunksize=max(1, len(layers) // (4 * processes)))
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+# ==============================================================================
+# Simplification
+# ==============================================================================
+def _rdp_layer(points, is_closed, layer_index, threshold):
+    return [rdp.rdp(pts, epsilon=threshold) for pts in points]
+
+
+def simplify_paths_rdp_parallel(slicer, threshold, processes=None):
+    """Parallel version of ``simplify_paths_rdp``, with the same result.
+
+    Parameters
+    ----------
+    slicer: :class:`compas_slicer.slicers.BaseSlicer`
+    threshold: float
+        Controls the degree of polyline simplification.
+    processes: int, optional
+        Number of worker processes, defaults to the number of cores.
+    """
+    logger.info("Paths simplification rdp (parallel)")
+
+    layers = [i for i, layer in enumerate(slicer.layers) if not layer.is_raft]
+    results = map_layers(slicer, _rdp_layer, layers, processes, threshold=threshold)
+
+    for i, points in zip(layers, results):
+        for path, pts in zip(slicer.layers[i].paths, points):
+            path.points = [Point(*pt) for pt in pts.tolist()]
+
+    remaining_pts_num = sum(len(pts) for points in results for pts in points)
+    logger.info('%d Points remaining after rdp simplification' % remaining_pts_num)
+
+
+# ==============================================================================
+# Seams
+# ==============================================================================
+def _seams_smooth_layer(points, is_closed, layer_index, smooth_distance):
+    pts, closed = points[0], is_closed[0]
+    if not closed:
+        return None
+
+    # only points in the first half of a path are evaluated
+    half = len(pts) // 2
+    pt0 = pts[0]
+    far = np.nonzero(np.linalg.norm(pts[:half] - pt0, axis=1) >= smooth_distance)[0]
+    if len(far) == 0:
+        # all points within smooth_distance are removed
+        return pts[half:]
+
+    # remove the points within smooth_distance and start at a point exactly
+    # smooth_distance away, so that all seams are of equal length
+    k = far[0]
+    direction = pts[k] - pt0
+    new_pt = pt0 + direction / np.linalg.norm(direction) * smooth_distance
+    return np.vstack([new_pt, pts[k:-1]])
+
+
+def seams_smooth_parallel(slicer, smooth_distance, processes=None):
+    """Parallel version of ``seams_smooth`` for planar layers, with the same result.
+
+    Parameters
+    ----------
+    slicer: :class:`compas_slicer.slicers.BaseSlicer`
+    smooth_distance: float
+        Distance (in mm) to perform smoothing
+    processes: int, optional
+        Number of worker processes, defaults to the number of cores.
+    """
+    logger.info("Smoothing seams with a distance of %i mm (parallel)" % smooth_distance)
+
+    layers = []
+    for i, layer in enumerate(slicer.layers):
+        if len(layer.paths) == 1:
+            layers.append(i)
+        else:
+            logger.warning("Smooth seams only works for layers consisting out of a single path."
+                           "\nPaths were not changed, seam smoothing skipped for layer %i" % i)
+
+    results = map_layers(slicer, _seams_smooth_layer, layers, processes, smooth_distance=smooth_distance)
+
+    for i, pts in zip(layers, results):
+        if pts is not None:
+            path = slicer.layers[i].paths[0]
+            path.points = [Point(*pt) for pt in pts.tolist()]
+
+
+# ==============================================================================
+# Printpoints
+# ==============================================================================
+def _face_index(mesh):
+    faces = list(mesh.faces())
+    centroids = np.array([mesh.face_centroid(fkey) for fkey in faces], dtype=float)
+    normals = np.array([mesh.face_normal(fkey) for fkey in faces], dtype=float)
+    return dict(face_tree=cKDTree(centroids), face_normals=normals)
+
+
+def _up_vectors(pts, normals):
+    # same as BasePrintOrganizer.get_printpoint_up_vector, for all points of a path:
+    # the direction to the next point (to the previous one for the last point)
+    if len(pts) < 2:
+        return np.tile([0.0, 0.0, 1.0], (len(pts), 1))
+
+    diff = np.empty_like(pts)
+    diff[:-1] = pts[:-1] - pts[1:]
+    diff[-1] = pts[-2] - pts[-1]  # negated, as the up vector of the last point is flipped
+    diff /= np.linalg.norm(diff, axis=1)[:, None]
+
+    up = np.cross(normals, diff)
+    lengths = np.linalg.norm(up, axis=1)
+    up[lengths == 0] = [0.0, 0.0, 1.0]
+    lengths[lengths == 0] = 1.0
+    return up / lengths[:, None]
+
+
+def _printpoints_layer(points, is_closed, layer_index, generate_mesh_normals, flat_layers):
+    result = []
+    for pts in points:
+        if generate_mesh_normals:
+            # closest face centroid, as utils.pull_pts_to_mesh_faces
+            _, faces = _worker['face_tree'].query(pts)
+            normals = _worker['face_normals'][faces]
+        else:
+            normals = np.tile([0.0, 1.0, 0.0], (len(pts), 1))
+
+        if layer_index in flat_layers:
+            up = np.tile([0.0, 0.0, 1.0], (len(pts), 1))
+        else:
+            up = _up_vectors(pts, normals)
+        result.append((normals, up))
+    return result
+
+
+def create_printpoints_parallel(print_organizer, generate_mesh_normals=True, processes=None):
+    """Parallel version of ``PlanarPrintOrganizer.create_printpoints``.
+
+    Mesh normals and up vectors are computed per layer in worker processes,
+    the printpoints are then created in layer order in the main process.
+    The closest mesh faces are found with a KD-tree over the face centroids.
+
+    Parameters
+    ----------
+    print_organizer: :class:`compas_slicer.print_organization.PlanarPrintOrganizer`
+    generate_mesh_normals: bool
+        If False, mesh normals will be set to Vector(0, 1, 0)
+    processes: int, optional
+        Number of worker processes, defaults to the number of cores.
+    """
+    logger.info('Creating print points (parallel) ...')
+    slicer = print_organizer.slicer
+
+    initializer = partial(_face_index, slicer.mesh) if generate_mesh_normals else None
+    # brim and raft layers get a vertical up vector
+    flat_layers = {i for i, layer in enumerate(slicer.layers) if layer.is_brim or layer.is_raft}
+    results = map_layers(slicer, _printpoints_layer, processes=processes, initializer=initializer,
+                         generate_mesh_normals=generate_mesh_normals, flat_layers=flat_layers)
+
+    for i, (layer, layer_result) in enumerate(zip(slicer.layers, results)):
+        layer_dict = print_organizer.printpoints_dict['layer_%d' % i] = {}
+
+        for j, (path, (normals, up)) in enumerate(zip(layer.paths, layer_result)):
+            layer_dict['path_%d' % j] = printpoints = []
+
+            for point, n, u in zip(path.points, normals.tolist(), up.tolist()):
+                printpoint = PrintPoint(pt=point, layer_height=slicer.layer_height, mesh_normal=Vector(*n))
+                printpoint.up_vector = Vector(*u)
+                printpoints.append(printpoint)
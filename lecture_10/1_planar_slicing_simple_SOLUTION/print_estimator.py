@@ -0,0 +1,227 @@
+"""Print time and material estimation from printpoints.
+
+The printpoints are taken as one sequence of moves, including the travels
+between paths and layers. The move from printpoint i to printpoint i + 1:
+
+* runs at the velocity of printpoint i + 1 (as ``total_print_time``),
+* extrudes if the extruder toggle of printpoint i is on,
+* deposits a bead of ``layer height x path width`` over its length.
+
+All moves are evaluated at once with NumPy, and summed per layer, so that
+different slicing parameters can be compared before printing::
+
+    estimate = estimate_print(print_organizer, path_width=3.0, acceleration=500.0)
+    estimate.printout_info()
+
+With an ``acceleration``, the robot stops at the printpoints with a blend
+radius of 0 (the start and end of every path), and the moves to and from them
+take longer. Without it, every move runs at constant velocity.
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger('logger')
+
+__all__ = ['PrintEstimate',
+           'estimate_moves',
+           'estimate_print',
+           'estimate_print_columnar']
+
+
+class PrintEstimate(object):
+    """
+    Print time and material, per layer.
+
+    Attributes
+    ----------
+    print_time, travel_time, wait_time: (L,) array
+        Seconds spent extruding, travelling and waiting on every layer.
+    print_length, travel_length: (L,) array
+        Millimeters extruded and travelled on every layer.
+    volume: (L,) array
+        Cubic millimeters of material deposited on every layer.
+    filament_diameter: float or None
+        If given, the filament lengths are reported as well.
+    """
+
+    def __init__(self, print_time, travel_time, wait_time, print_length, travel_length, volume,
+                 filament_diameter=None):
+        self.print_time = print_time
+        self.travel_time = travel_time
+        self.wait_time = wait_time
+        self.print_length = print_length
+        self.travel_length = travel_length
+        self.volume = volume
+        self.filament_diameter = filament_diameter
+
+    @property
+    def number_of_layers(self):
+        return len(self.print_time)
+
+    @property
+    def layer_time(self):
+        """(L,) array, total seconds of every layer."""
+        return self.print_time + self.travel_time + self.wait_time
+
+    @property
+    def total_time(self):
+        return float(self.layer_time.sum())
+
+    @property
+    def total_volume(self):
+        return float(self.volume.sum())
+
+    @property
+    def filament_length(self):
+        """(L,) array, millimeters of filament of every layer, None without a filament diameter."""
+        if not self.filament_diameter:
+            return None
+        return self.volume / (np.pi * (self.filament_diameter / 2.0) ** 2)
+
+    def printout_info(self, layers=False):
+        """Prints the totals, and the estimate of every layer if layers is True."""
+        hours, rest = divmod(self.total_time, 3600)
+        minutes, seconds = divmod(rest, 60)
+
+        print("\n---- Print estimate ----")
+        print("Print time: %d hours, %d minutes, %d seconds" % (hours, minutes, seconds))
+        print("    extruding: %.0f s, travelling: %.0f s, waiting: %.0f s" %
+              (self.print_time.sum(), self.travel_time.sum(), self.wait_time.sum()))
+        print("Extruded length: %.0f mm, travel length: %.0f mm" % (self.print_length.sum(), self.travel_length.sum()))
+        print("Material volume: %.1f cm3" % (self.total_volume / 1000.0))
+        if self.filament_diameter:
+            print("Filament length: %.2f m" % (self.filament_length.sum() / 1000.0))
+        if layers:
+            for i in range(self.number_of_layers):
+                print("Layer %d: %.1f s (travel %.1f s), %.1f cm3" %
+                      (i, self.layer_time[i], self.travel_time[i], self.volume[i] / 1000.0))
+        print("")
+
+    def to_data(self):
+        data = {'total_time': self.total_time,
+                'total_volume': self.total_volume,
+                'layers': {name: getattr(self, name).tolist() for name in
+                           ('print_time', 'travel_time', 'wait_time', 'print_length', 'travel_length', 'volume')}}
+        if self.filament_diameter:
+            data['layers']['filament_length'] = self.filament_length.tolist()
+        return data
+
+
+def estimate_moves(points, velocities, layer_heights, extruder_toggles, blend_radii, wait_times, layers,
+                   path_width=None, width_factor=1.2, acceleration=None, filament_diameter=None):
+    """Estimate of a sequence of printpoints, given as arrays.
+
+    Parameters
+    ----------
+    points: (N, 3) array
+    velocities: (N,) array
+        In mm/s.
+    layer_heights: (N,) array
+    extruder_toggles: (N,) array of bool
+    blend_radii: (N,) array
+        NaN if not set.
+    wait_times: (N,) array
+        NaN if not set.
+    layers: (N,) array of int
+        Layer index of every printpoint.
+    path_width: float, optional
+        Width of the extruded bead. Defaults to width_factor times the layer height.
+    width_factor: float
+    acceleration: float, optional
+        In mm/s2, to account for the stops at the printpoints with a blend radius of 0.
+    filament_diameter: float, optional
+
+    Returns
+    ----------
+    :class:`PrintEstimate`
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    velocities = np.asarray(velocities, dtype=float)
+    if np.isnan(velocities).any() or (velocities <= 0).any():
+        raise ValueError('All printpoints need a positive velocity to estimate the print time')
+    layers = np.asarray(layers, dtype=int)
+    number_of_layers = int(layers.max()) + 1 if len(layers) else 0
+
+    lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    speeds = velocities[1:]
+    extruding = np.asarray(extruder_toggles, dtype=bool)[:-1]
+    times = lengths / speeds
+
+    if acceleration:
+        # trapezoidal velocity profile, starting and ending at rest at the stops
+        stops = np.nan_to_num(np.asarray(blend_radii, dtype=float), nan=1.0) <= 0
+        stops[[0, -1]] = True
+        v_in = np.where(stops[:-1], 0.0, speeds)
+        v_out = np.where(stops[1:], 0.0, speeds)
+        d_acc = (speeds ** 2 - v_in ** 2) / (2 * acceleration)
+        d_dec = (speeds ** 2 - v_out ** 2) / (2 * acceleration)
+        trapezoid = (speeds - v_in) / acceleration + (speeds - v_out) / acceleration + \
+            (lengths - d_acc - d_dec) / speeds
+        v_peak = np.sqrt(acceleration * lengths + (v_in ** 2 + v_out ** 2) / 2.0)
+        v_peak = np.maximum(v_peak, np.maximum(v_in, v_out))
+        triangle = (2 * v_peak - v_in - v_out) / acceleration
+        times = np.where(d_acc + d_dec <= lengths, trapezoid, triangle)
+
+    heights = np.asarray(layer_heights, dtype=float)[1:]
+    widths = path_width if path_width is not None else width_factor * heights
+    volumes = np.where(extruding, lengths * heights * widths, 0.0)
+
+    # every move belongs to the layer of the printpoint it goes to
+    move_layers = layers[1:]
+
+    def per_layer(values, mask=None):
+        values = values if mask is None else np.where(mask, values, 0.0)
+        return np.bincount(move_layers, values, minlength=number_of_layers)
+
+    waits = np.nan_to_num(np.asarray(wait_times, dtype=float), nan=0.0)
+    return PrintEstimate(print_time=per_layer(times, extruding),
+                         travel_time=per_layer(times, ~extruding),
+                         wait_time=np.bincount(layers, waits, minlength=number_of_layers),
+                         print_length=per_layer(lengths, extruding),
+                         travel_length=per_layer(lengths, ~extruding),
+                         volume=per_layer(volumes),
+                         filament_diameter=filament_diameter)
+
+
+def estimate_print(print_organizer, path_width=None, width_factor=1.2, acceleration=None, filament_diameter=None):
+    """Estimate of the printpoints of a print organizer, see :func:`estimate_moves`.
+
+    Printpoints without an extruder toggle are counted as extruding.
+    """
+    printpoints, layers = [], []
+    for ppt, i, _j, _k in print_organizer.printpoints_indices_iterator():
+        printpoints.append(ppt)
+        layers.append(i)
+
+    def floats(values):
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+    return estimate_moves(points=np.array([ppt.pt for ppt in printpoints], dtype=float),
+                          velocities=floats([ppt.velocity for ppt in printpoints]),
+                          layer_heights=floats([ppt.layer_height for ppt in printpoints]),
+                          extruder_toggles=np.array([ppt.extruder_toggle is not False for ppt in printpoints]),
+                          blend_radii=floats([ppt.blend_radius for ppt in printpoints]),
+                          wait_times=floats([ppt.wait_time for ppt in printpoints]),
+                          layers=np.array(layers, dtype=int),
+                          path_width=path_width, width_factor=width_factor, acceleration=acceleration,
+                          filament_diameter=filament_diameter)
+
+
+def estimate_print_columnar(printpoints_columns, path_width=None, width_factor=1.2, acceleration=None,
+                            filament_diameter=None):
+    """Estimate of printpoints saved in the columnar format, see :class:`columnar_io.PrintpointsColumns`."""
+    columns = printpoints_columns
+    paths_per_layer = np.diff(columns['layer_offsets'])
+    points_per_path = np.diff(columns['path_offsets'])
+    layers = np.repeat(np.repeat(np.arange(len(paths_per_layer)), paths_per_layer), points_per_path)
+
+    return estimate_moves(points=columns['point'],
+                          velocities=columns['velocity'],
+                          layer_heights=columns['layer_height'],
+                          extruder_toggles=np.asarray(columns['extruder_toggle']) != 0,
+                          blend_radii=columns['blend_radius'],
+                          wait_times=columns['wait_time'],
+                          layers=layers,
+                          path_width=path_width, width_factor=width_factor, acceleration=acceleration,
+                          filament_diameter=filament_diameter)
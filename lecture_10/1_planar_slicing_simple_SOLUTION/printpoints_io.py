@@ -0,0 +1,199 @@
+"""Streaming export of printpoints, layer by layer.
+
+``print_organizer.output_printpoints_dict()`` builds the data of every
+printpoint in one dictionary before ``save_to_json`` writes it, so the whole
+print is held in memory twice. Here the printpoints are written as JSON lines
+(one line per path) while iterating over the print organizer, so that only
+the printpoints themselves are in memory (they are needed until all the
+fabrication parameters are set), and read back lazily, one path at a time::
+
+    write_printpoints(print_organizer, OUTPUT_DIR, 'out_printpoints.jsonl')
+
+    reader = PrintpointsReader(os.path.join(OUTPUT_DIR, 'out_printpoints.jsonl'))
+    for data in reader.printpoints():
+        ...
+
+Every line looks like ``{"layer": 0, "path": 0, "printpoints": [...]}``, where
+the printpoints are the same dictionaries as in ``out_printpoints.json``.
+The reader only uses the standard library, so it also runs in Grasshopper.
+"""
+from __future__ import print_function
+
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger('logger')
+
+__all__ = ['PrintpointsWriter', 'PrintpointsReader', 'write_printpoints']
+
+# The indices come first on every line, so the reader can index a file without decoding the printpoints
+_LINE_PREFIX = re.compile(r'^\{"layer": (\d+), "path": (\d+),')
+
+
+class PrintpointsWriter(object):
+    """
+    Writes printpoints to a JSON lines file, one path per line.
+
+    Use it as a context manager::
+
+        with PrintpointsWriter(filename) as writer:
+            writer.write_path(0, 0, printpoints)
+
+    Attributes
+    ----------
+    filename: str
+    count: int
+        Number of printpoints written so far.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.filename, 'w')
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def write_path(self, layer_index, path_index, printpoints):
+        """Writes one path.
+
+        Parameters
+        ----------
+        layer_index: int
+        path_index: int
+        printpoints: list of :class:`compas_slicer.geometry.PrintPoint` or dict
+            Printpoints, or their data.
+        """
+        data = [pp if isinstance(pp, dict) else pp.to_data() for pp in printpoints]
+        self._file.write('{"layer": %d, "path": %d, "printpoints": ' % (layer_index, path_index))
+        self._file.write(json.dumps(data))
+        self._file.write('}\n')
+        self.count += len(data)
+
+    def write_layer(self, layer_index, paths):
+        """Writes all paths of a layer and flushes them to disk.
+
+        Parameters
+        ----------
+        layer_index: int
+        paths: list of lists of printpoints
+        """
+        for path_index, printpoints in enumerate(paths):
+            self.write_path(layer_index, path_index, printpoints)
+        self._file.flush()
+
+
+def write_printpoints(print_organizer, filepath, name):
+    """Streams the printpoints of a print organizer to disk, layer by layer.
+
+    Replaces ``output_printpoints_dict`` followed by ``save_to_json``: duplicate
+    points are removed in the same way, but instead of a dictionary with the data
+    of all printpoints, only the data of one path is built at a time. The
+    printpoints of the print organizer stay in memory.
+
+    Parameters
+    ----------
+    print_organizer: :class:`compas_slicer.print_organization.BasePrintOrganizer`
+    filepath: str
+    name: str
+
+    Returns
+    ----------
+    int
+        Number of printpoints written.
+    """
+    filename = os.path.join(filepath, name)
+    logger.info("Streaming printpoints to: " + filename)
+
+    with PrintpointsWriter(filename) as writer:
+        for i, layer_key in enumerate(print_organizer.printpoints_dict):
+            paths = []
+            for path_key in print_organizer.printpoints_dict[layer_key]:
+                print_organizer.remove_duplicate_points_in_path(layer_key, path_key)
+                paths.append(print_organizer.printpoints_dict[layer_key][path_key])
+            writer.write_layer(i, paths)
+
+    logger.info("Generated %d print points" % writer.count)
+    return writer.count
+
+
+class PrintpointsReader(object):
+    """
+    Lazy reader of a file written by :class:`PrintpointsWriter`.
+
+    Nothing is loaded when the reader is created. Iterating reads one line
+    (path) at a time, and single layers are read with random access through
+    an index of line offsets that is built on first use.
+
+    Attributes
+    ----------
+    filename: str
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._index = None
+
+    def __iter__(self):
+        """Yields ``(layer_index, path_index, printpoints_data)`` for every path, in print order."""
+        with open(self.filename, 'r') as f:
+            for line in f:
+                if line.strip():
+                    data = json.loads(line)
+                    yield data['layer'], data['path'], data['printpoints']
+
+    def printpoints(self):
+        """Yields the data of every printpoint, in the order of ``out_printpoints.json``."""
+        for _, _, printpoints in self:
+            for data in printpoints:
+                yield data
+
+    def layers(self):
+        """Yields the paths of every layer, as lists of printpoint data."""
+        current, paths = None, []
+        for layer_index, _, printpoints in self:
+            if layer_index != current and paths:
+                yield paths
+                paths = []
+            current = layer_index
+            paths.append(printpoints)
+        if paths:
+            yield paths
+
+    @property
+    def number_of_layers(self):
+        return len(self.index)
+
+    @property
+    def index(self):
+        """dict: Byte offsets of the lines of every layer, by layer index."""
+        if self._index is None:
+            self._index = {}
+            offset = 0
+            with open(self.filename, 'rb') as f:
+                for line in f:
+                    match = _LINE_PREFIX.match(line[:64].decode('ascii', 'ignore'))
+                    if match:
+                        self._index.setdefault(int(match.group(1)), []).append(offset)
+                    offset += len(line)
+        return self._index
+
+    def read_layer(self, layer_index):
+        """Reads the paths of one layer only, as lists of printpoint data."""
+        paths = []
+        with open(self.filename, 'rb') as f:
+            for offset in self.index[layer_index]:
+                f.seek(offset)
+                paths.append(json.loads(f.readline().decode('utf-8'))['printpoints'])
+        return paths
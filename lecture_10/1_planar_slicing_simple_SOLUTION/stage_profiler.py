@@ -0,0 +1,236 @@
+"""Stage-level profiling for slicing scripts.
+
+The total elapsed time of a script doesn't show which step of the slicing is
+slow. The :class:`StageProfiler` records, for every stage of a script:
+
+* the wall time,
+* the peak memory allocated by Python during the stage (with ``tracemalloc``),
+* item counts, e.g. the number of layers, paths and points of a slicer.
+
+Stages are marked with a context manager or a decorator, and can be nested::
+
+    profiler = StageProfiler()
+
+    with profiler.stage('slicing') as stage:
+        slicer.slice_model()
+        stage.count(slicer=slicer)
+
+    @profiler.profile('printpoints')
+    def create_printpoints(print_organizer):
+        ...
+
+    profiler.printout_info()
+    profiler.save_trace(os.path.join(OUTPUT_DIR, 'trace.json'))
+
+The trace file is in the Chrome trace format: open it in ``chrome://tracing``
+or on https://ui.perfetto.dev to see the stages on a timeline.
+
+The peak memory is only traced with ``StageProfiler(memory=True)``: tracing
+every allocation makes code that allocates many small objects (e.g. the
+slicers) several times slower, and distorts the measured times.
+"""
+import functools
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+logger = logging.getLogger('logger')
+
+__all__ = ['StageProfiler',
+           'StageRecord',
+           'item_counts']
+
+
+def item_counts(slicer=None, print_organizer=None):
+    """Number of layers, paths and points of a slicer, and number of printpoints of a print organizer."""
+    counts = {}
+    if slicer is not None:
+        counts['layers'] = len(slicer.layers)
+        counts['paths'] = sum(len(layer.paths) for layer in slicer.layers)
+        counts['points'] = sum(len(path.points) for layer in slicer.layers for path in layer.paths)
+    if print_organizer is not None:
+        counts['printpoints'] = print_organizer.number_of_printpoints
+    return counts
+
+
+class StageRecord(object):
+    """
+    Measurements of one stage.
+
+    Attributes
+    ----------
+    name: str
+    depth: int
+        0 for the outermost stages, 1 for the stages within them, etc.
+    start: float
+        Seconds since the profiler was created.
+    duration: float
+        Wall time in seconds.
+    peak_memory: int or None
+        Most bytes allocated at the same time during the stage, on top of the memory at its start.
+        None if the memory was not traced.
+    counts: dict
+        Item counts, e.g. layers, paths, points.
+    """
+
+    def __init__(self, name, depth, start):
+        self.name = name
+        self.depth = depth
+        self.start = start
+        self.duration = 0.0
+        self.peak_memory = None
+        self.counts = {}
+
+    def count(self, slicer=None, print_organizer=None, **counts):
+        """Adds the item counts of a slicer and/or print organizer, and any other counts."""
+        self.counts.update(item_counts(slicer, print_organizer))
+        self.counts.update(counts)
+
+    def to_data(self):
+        return {'name': self.name, 'depth': self.depth, 'start': self.start, 'duration': self.duration,
+                'peak_memory': self.peak_memory, 'counts': self.counts}
+
+
+class StageProfiler(object):
+    """
+    Records the stages of a script.
+
+    Attributes
+    ----------
+    memory: bool
+        Trace the peak memory of every stage, off by default as it slows down the stages.
+    enabled: bool
+        If False, stages are not recorded (and cost nothing).
+    records: list of :class:`StageRecord`
+        The stages, in the order they started.
+    """
+
+    def __init__(self, memory=False, enabled=True):
+        self.memory = memory
+        self.enabled = enabled
+        self.records = []
+        self._origin = time.perf_counter()
+        self._stack = []  # open stages, with the peak memory of their finished segments
+        self._segment_start = 0
+        self._started_tracing = False
+
+    # --- recording
+    def stage(self, name):
+        """Context manager that records a stage, yields its :class:`StageRecord`."""
+        return _Stage(self, name)
+
+    def profile(self, name=None):
+        """Decorator that records every call of a function as a stage.
+
+        Item counts are added if the function returns a slicer or a print organizer.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or function.__name__) as record:
+                    result = function(*args, **kwargs)
+                    if hasattr(result, 'layers'):
+                        record.count(slicer=result)
+                    elif hasattr(result, 'printpoints_dict'):
+                        record.count(print_organizer=result)
+                return result
+            return wrapper
+        return decorator
+
+    def _enter(self, name):
+        record = StageRecord(name, len(self._stack), time.perf_counter() - self._origin)
+        self.records.append(record)
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if self._stack:
+                # the peak of the enclosing stage so far
+                self._stack[-1][1] = max(self._stack[-1][1], self._segment_peak())
+            self._reset_peak()
+        self._stack.append([record, 0, time.perf_counter()])
+        return record
+
+    def _exit(self, record):
+        _, peak, start = self._stack.pop()
+        record.duration = time.perf_counter() - start
+        if self.memory:
+            record.peak_memory = max(peak, self._segment_peak())
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], record.peak_memory)
+                self._reset_peak()
+            elif self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+        logger.info("Stage '%s': %.2f seconds%s%s" % (
+            record.name, record.duration,
+            ', peak memory %.1f MB' % (record.peak_memory / 1e6) if record.peak_memory is not None else '',
+            ''.join(', %d %s' % (v, k) for k, v in record.counts.items())))
+
+    def _reset_peak(self):
+        if hasattr(tracemalloc, 'reset_peak'):  # python >= 3.9
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.clear_traces()
+        self._segment_start = tracemalloc.get_traced_memory()[0]
+
+    def _segment_peak(self):
+        return max(0, tracemalloc.get_traced_memory()[1] - self._segment_start)
+
+    # --- output
+    def printout_info(self):
+        """Prints the stages as a tree, with their share of the total time."""
+        total = sum(record.duration for record in self.records if record.depth == 0)
+        print("\n---- Stages info ----")
+        for record in self.records:
+            line = "%-32s %8.2f s %5.1f%%" % ('  ' * record.depth + record.name, record.duration,
+                                              100.0 * record.duration / total if total else 0.0)
+            if record.peak_memory is not None:
+                line += "  %8.1f MB" % (record.peak_memory / 1e6)
+            if record.counts:
+                line += "  " + ', '.join('%d %s' % (v, k) for k, v in record.counts.items())
+            print(line)
+        print("Total: %.2f s" % total)
+        print("")
+
+    def to_data(self):
+        return {'stages': [record.to_data() for record in self.records]}
+
+    def trace_events(self):
+        """The stages as Chrome trace events (complete events, in microseconds)."""
+        pid = os.getpid()
+        events = []
+        for record in self.records:
+            args = dict(record.counts)
+            if record.peak_memory is not None:
+                args['peak_memory_MB'] = round(record.peak_memory / 1e6, 3)
+            events.append({'name': record.name, 'cat': 'stage', 'ph': 'X', 'pid': pid, 'tid': 0,
+                           'ts': record.start * 1e6, 'dur': record.duration * 1e6, 'args': args})
+        return events
+
+    def save_trace(self, filename):
+        """Saves the stages in the Chrome trace format."""
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
+        logger.info("Saved trace of %d stages to %s" % (len(self.records), filename))
+
+
+class _Stage(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.record = None
+
+    def __enter__(self):
+        if not self.profiler.enabled:
+            return StageRecord(self.name, 0, 0.0)
+        self.record = self.profiler._enter(self.name)
+        return self.record
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.record is not None:
+            self.profiler._exit(self.record)
+        return False
@@ -0,0 +1,266 @@
+"""Travel path optimization between the paths of a layer.
+
+The slicer returns the paths of a layer in the order it found them, and every
+closed path starts wherever the contour happened to start. On layers with
+several paths (e.g. a model with several islands), the nozzle then travels
+back and forth across the layer, with a z-hop for every travel.
+
+:func:`optimize_travel` reorders the paths of every layer, reverses open paths
+and moves the seam of closed paths, to shorten the travels:
+
+1. nearest neighbor: from the end of the previous path, go to the closest
+   point of any unvisited path (a KD-tree over the points of the layer),
+2. 2-opt: reverse sub-sequences of paths as long as it shortens the travels,
+3. re-seam: start every closed path at its point closest to the end of the previous path.
+
+It runs on the slicer, before the printpoints are created::
+
+    optimize_travel(slicer)
+    ...
+    add_safety_printpoints_for_travels(print_organizer, z_hop=10.0, min_travel=5.0)
+
+Brim layers are left as they are, as the order of their paths defines where
+the extruder is switched off.
+"""
+import copy
+import logging
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from compas.geometry import Vector
+from compas_slicer.geometry import VerticalLayer
+from compas_slicer.print_organization.print_organization_utilities.extruder_toggle import \
+    check_assigned_extruder_toggle
+from compas_slicer.utilities import find_next_printpoint
+
+logger = logging.getLogger('logger')
+
+__all__ = ['order_paths',
+           'optimize_travel',
+           'travel_length',
+           'add_safety_printpoints_for_travels']
+
+
+def _path_arrays(path):
+    points = np.array(path.points, dtype=float).reshape(-1, 3)
+    # closed paths may repeat their first point at the end
+    if path.is_closed and len(points) > 1 and np.allclose(points[0], points[-1]):
+        return points[:-1], True
+    return points, False
+
+
+def order_paths(paths, start=None, two_opt=True, reseam=True):
+    """Order of a list of paths that shortens the travels between them.
+
+    Parameters
+    ----------
+    paths: list of :class:`compas_slicer.geometry.Path`
+    start: point, optional
+        Position of the nozzle before the first path. Defaults to the start of the first path.
+    two_opt: bool
+        Improve the nearest neighbor order with 2-opt.
+    reseam: bool
+        Move the seams of the closed paths.
+
+    Returns
+    ----------
+    list of tuple
+        (path index, reversed, seam index) in printing order. Open paths are
+        reversed if printed end to start, closed paths start at the seam index.
+    """
+    arrays = [_path_arrays(path)[0] for path in paths]
+    is_closed = [path.is_closed and reseam for path in paths]
+    n = len(paths)
+    if n == 0:
+        return []
+    start = np.asarray(start if start is not None else arrays[0][0], dtype=float)
+
+    # candidate entry points: every point of a closed path, both ends of an open path
+    candidates, owners, indices = [], [], []
+    for p, points in enumerate(arrays):
+        entry = range(len(points)) if is_closed[p] else sorted({0, len(points) - 1})
+        for k in entry:
+            candidates.append(points[k])
+            owners.append(p)
+            indices.append(k)
+    candidates = np.array(candidates)
+    owners = np.array(owners)
+    indices = np.array(indices)
+    tree = cKDTree(candidates)
+
+    # --- nearest neighbor
+    visited = np.zeros(n, dtype=bool)
+    order, entries, exits = [], [], []
+    position = start
+    while len(order) < n:
+        k = min(8, len(candidates))
+        while True:
+            _, nearest = tree.query(position, k=k)
+            nearest = np.atleast_1d(nearest)
+            free = nearest[~visited[owners[nearest]]]
+            if len(free) or k == len(candidates):
+                break
+            k = min(4 * k, len(candidates))
+        c = free[0]
+        p, i = owners[c], indices[c]
+        visited[p] = True
+
+        points = arrays[p]
+        if is_closed[p]:
+            entry = exit = points[i]
+        else:
+            entry, exit = (points[0], points[-1]) if i == 0 else (points[-1], points[0])
+        order.append(p)
+        entries.append(entry)
+        exits.append(exit)
+        position = exit
+
+    order, entries, exits = np.array(order), np.array(entries), np.array(exits)
+
+    # --- 2-opt: reverse the paths i..j, open paths within are printed the other way around
+    if two_opt and n > 2:
+        improved = True
+        while improved:
+            improved = False
+            for i in range(n - 1):
+                before = exits[i - 1] if i > 0 else start
+                j = np.arange(i + 1, n)
+                after = np.vstack([entries[i + 1:], [np.full(3, np.nan)]])[j - i]  # entry after j
+                # travels into the reversed paths and out of them (none after the last path)
+                old_in = np.linalg.norm(before - entries[i])
+                old_out = np.nan_to_num(np.linalg.norm(exits[j] - after, axis=1))
+                new_in = np.linalg.norm(before - exits[j], axis=1)
+                new_out = np.nan_to_num(np.linalg.norm(entries[i] - after, axis=1))
+                old = old_in + old_out
+                new = new_in + new_out
+                gain = old - new
+                best = int(np.argmax(gain))
+                if gain[best] > 1e-9:
+                    j = j[best]
+                    order[i:j + 1] = order[i:j + 1][::-1].copy()
+                    entries[i:j + 1], exits[i:j + 1] = exits[i:j + 1][::-1].copy(), entries[i:j + 1][::-1].copy()
+                    improved = True
+
+    # --- re-seam the closed paths, and orient the open paths
+    result = []
+    position = start
+    for p, entry, exit in zip(order, entries, exits):
+        points = arrays[p]
+        if is_closed[p]:
+            seam = int(np.argmin(np.linalg.norm(points - position, axis=1)))
+            result.append((int(p), False, seam))
+            position = points[seam]
+        else:
+            reverse = not np.allclose(entry, points[0])
+            result.append((int(p), reverse, 0))
+            position = exit
+    return result
+
+
+def _reordered_path(path, reverse, seam):
+    points, repeated = _path_arrays(path)
+    new_path = copy.copy(path)
+    new_points = list(path.points[:len(points)])
+    if reverse:
+        new_points = new_points[::-1]
+    if seam:
+        new_points = new_points[seam:] + new_points[:seam]
+    if repeated:
+        new_points.append(new_points[0])
+    new_path.points = new_points
+    return new_path
+
+
+def travel_length(slicer):
+    """Total length of the travels between consecutive paths of the slicer."""
+    ends = []
+    for layer in slicer.layers:
+        for path in layer.paths:
+            ends.append((path.points[0], path.points[-1]))
+    if len(ends) < 2:
+        return 0.0
+    starts = np.array([e[0] for e in ends[1:]], dtype=float)
+    stops = np.array([e[1] for e in ends[:-1]], dtype=float)
+    return float(np.linalg.norm(starts - stops, axis=1).sum())
+
+
+def optimize_travel(slicer, two_opt=True, reseam=True):
+    """Reorders the paths of every layer with several paths to shorten the travels.
+
+    Brim and vertical layers are not changed.
+
+    Parameters
+    ----------
+    slicer: :class:`compas_slicer.slicers.BaseSlicer`
+    two_opt: bool
+        Improve the nearest neighbor order with 2-opt.
+    reseam: bool
+        Move the seams of the closed paths.
+    """
+    before = travel_length(slicer)
+    position = None
+    for layer in slicer.layers:
+        if len(layer.paths) > 1 and not layer.is_brim and not isinstance(layer, VerticalLayer):
+            order = order_paths(layer.paths, start=position, two_opt=two_opt, reseam=reseam)
+            layer.paths = [_reordered_path(layer.paths[p], reverse, seam) for p, reverse, seam in order]
+        if layer.paths:
+            position = layer.paths[-1].points[-1]
+
+    after = travel_length(slicer)
+    logger.info("Optimized travel: %.0f mm instead of %.0f mm" % (after, before))
+
+
+def add_safety_printpoints_for_travels(print_organizer, z_hop=10.0, min_travel=0.0):
+    """Like ``add_safety_printpoints``, but only lifts the nozzle for travels longer than min_travel.
+
+    Parameters
+    ----------
+    print_organizer: :class:`compas_slicer.print_organization.BasePrintOrganizer`
+    z_hop: float
+        Vertical distance (in millimeters) of the safety points above the printpoints.
+    min_travel: float
+        Shorter travels between an interruption and the next printpoint are done without a z-hop.
+    """
+    assert check_assigned_extruder_toggle(print_organizer), \
+        'You need to set the extruder toggles first, before you can create safety points'
+
+    pp_dict = print_organizer.printpoints_dict
+    pp_copy_dict = {}
+    hops, skipped = 0, 0
+
+    for i, layer_key in enumerate(pp_dict):
+        pp_copy_dict[layer_key] = {}
+        for j, path_key in enumerate(pp_dict[layer_key]):
+            pp_copy_dict[layer_key][path_key] = []
+
+            for k, printpoint in enumerate(pp_dict[layer_key][path_key]):
+                pp_copy_dict[layer_key][path_key].append(printpoint)
+                if printpoint.extruder_toggle is not False:
+                    continue
+
+                next_ppt = find_next_printpoint(pp_dict, i, j, k)
+                if next_ppt and printpoint.pt.distance_to_point(next_ppt.pt) < min_travel:
+                    skipped += 1
+                    continue
+
+                hops += 1
+                pp_copy_dict[layer_key][path_key].append(_safety_printpoint(printpoint, z_hop))
+                if next_ppt and next_ppt.extruder_toggle is True:
+                    pp_copy_dict[layer_key][path_key].append(_safety_printpoint(next_ppt, z_hop))
+
+    try:
+        pp_copy_dict['layer_0']['path_0'].insert(0, _safety_printpoint(pp_dict['layer_0']['path_0'][0], z_hop))
+    except KeyError as e:
+        logger.exception(e)
+
+    logger.info("Generated safety print points for %d travels, %d short travels without z-hop" % (hops, skipped))
+    print_organizer.printpoints_dict = pp_copy_dict
+
+
+def _safety_printpoint(printpoint, z_hop):
+    safety_printpoint = copy.deepcopy(printpoint)
+    safety_printpoint.pt = printpoint.pt + Vector(0, 0, z_hop)
+    safety_printpoint.frame.point = safety_printpoint.pt
+    safety_printpoint.extruder_toggle = False
+    return safety_printpoint
@@ -0,0 +1,106 @@
+"""Bulk closest-point queries for mesh-to-mesh scalar fields.
+
+Calling ``slicer_utils.get_closest_pt`` once per vertex is a brute-force
+O(N·M) search. These classes build a spatial index once over the reference
+geometry and answer all N queries in one call (O(N·log M)):
+
+* :class:`ClosestPointCloud`: closest reference *vertex*, using a KD-tree.
+* :class:`ClosestPointMesh`: true closest point *on the mesh surface*, using
+  the AABB tree (BVH) of ``libigl``.
+
+Example, distance from every vertex of a mesh to an attractor mesh::
+
+    cloud = ClosestPointCloud.from_mesh(sunpath_mesh)
+    u = cloud.distances(vertex_array(tube_mesh))
+
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+__all__ = ['ClosestPointCloud', 'ClosestPointMesh']
+
+
+class ClosestPointCloud(object):
+    """KD-tree over a set of reference points.
+
+    Parameters
+    ----------
+    points : list or :class:`numpy.ndarray`
+        (M, 3) reference points.
+    """
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.tree = cKDTree(self.points)
+
+    @classmethod
+    def from_mesh(cls, mesh):
+        """Build the index over the vertices of a mesh."""
+        return cls(mesh.vertices_attributes('xyz'))
+
+    def query(self, points, k=1):
+        """Distances and indices of the ``k`` closest reference points of every query point.
+
+        Returns
+        -------
+        tuple of :class:`numpy.ndarray`
+            Distances and indices, of shape (N,) if ``k == 1`` else (N, k).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        return self.tree.query(points, k=k, workers=-1)
+
+    def distances(self, points):
+        """Distance from every query point to its closest reference point."""
+        return self.query(points)[0]
+
+    def closest(self, points):
+        """(N, 3) array of the closest reference point of every query point."""
+        return self.points[self.query(points)[1]]
+
+
+class ClosestPointMesh(object):
+    """Closest points on the surface of a triangle mesh, using ``igl``'s AABB tree.
+
+    The tree is built once, when the object is created, and reused by every query.
+
+    Parameters
+    ----------
+    mesh : :class:`compas.datastructures.Mesh`
+        Reference mesh. Non-triangular faces are split into triangle fans.
+    """
+
+    def __init__(self, mesh):
+        import igl
+
+        vertices, faces = mesh.to_vertices_and_faces()
+        triangles = []
+        for face in faces:
+            for i in range(1, len(face) - 1):
+                triangles.append([face[0], face[i], face[i + 1]])
+
+        self.vertices = np.array(vertices, dtype=float)
+        self.faces = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+        self.face_keys = [fkey for fkey in mesh.faces() for _ in range(len(mesh.face_vertices(fkey)) - 2)]
+        self.tree = igl.AABB()
+        self.tree.init(self.vertices, self.faces)
+
+    def query(self, points):
+        """Closest points on the mesh.
+
+        Returns
+        -------
+        tuple
+            Distances (N,), closest face keys (list of N) and closest points (N, 3).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        squared_distances, triangles, closest = self.tree.squared_distance(self.vertices, self.faces, points)
+        face_keys = [self.face_keys[t] for t in triangles]
+        return np.sqrt(squared_distances), face_keys, closest
+
+    def distances(self, points):
+        """Distance from every query point to the mesh surface."""
+        return self.query(points)[0]
+
+    def closest(self, points):
+        """(N, 3) array of the closest point on the mesh of every query point."""
+        return self.query(points)[2]
@@ -1,5 +1,5 @@
 import logging
-from compas.geometry import Plane, Point, Vector, distance_point_plane
+from compas.geometry import Plane, Point, Vector
 from compas.datastructures import Mesh
 import os
 import compas_slicer.utilities as slicer_utils
@@ -8,6 +8,7 @@ from compas_slicer.slicers import ScalarFieldSlicer
 import compas_slicer.utilities as utils
 from compas_slicer.print_organization import ScalarFieldPrintOrganizer
 from compas_slicer.print_organization import set_extruder_toggle, add_safety_printpoints
+from scalar_fields import vertex_array, plane_distance_field
 
 logger = logging.getLogger('logger')
 logging.basicConfig(format='%(levelname)s-%(message)s', level=logging.INFO)
@@ -22,8 +23,8 @@ if __name__ == '__main__':
 
     # Create scalar field
     plane = Plane(Point(0, 0, -30), Vector(0.0, 0.5, 0.5))
-    v_coords = [mesh.vertex_coordinates(v_key, axes='xyz') for v_key in mesh.vertices()]
-    u = [distance_point_plane(v, plane) for v in v_coords]
+    v_coords = vertex_array(mesh)
+    u = plane_distance_field(v_coords, plane).tolist()
 
     # generate contours of scalar field
     slicer = ScalarFieldSlicer(mesh, u, no_of_isocurves=30)
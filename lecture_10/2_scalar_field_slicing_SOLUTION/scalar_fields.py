@@ -0,0 +1,174 @@
+"""Vectorized scalar fields for the ``ScalarFieldSlicer``.
+
+All vertex coordinates are pulled into one (N, 3) NumPy array once, and the
+fields are evaluated on the whole array instead of calling
+``mesh.vertex_coordinates`` and ``distance_point_plane`` per vertex.
+Every function returns a NumPy array of N values in vertex order, use
+``field.tolist()`` (or pass it directly) as the ``scalar_field`` of the slicer.
+"""
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from closest_points import ClosestPointCloud
+from closest_points import ClosestPointMesh
+
+__all__ = [
+    'vertex_array',
+    'plane_distance_field',
+    'points_distance_field',
+    'polyline_distance_field',
+    'mesh_distance_field',
+    'boundary_geodesic_field',
+    'remap_field',
+    'blend_fields',
+]
+
+# Maximum number of pairwise distances evaluated at once (~80MB of float64)
+CHUNK_SIZE = 10 ** 7
+
+
+def vertex_array(mesh):
+    """Coordinates of all mesh vertices as an (N, 3) array, in ``mesh.vertices()`` order."""
+    return np.array(mesh.vertices_attributes('xyz'), dtype=float)
+
+
+def plane_distance_field(vertices, plane, signed=False):
+    """Distance of every vertex to a plane.
+
+    Parameters
+    ----------
+    vertices : :class:`numpy.ndarray`
+        (N, 3) vertex coordinates.
+    plane : :class:`compas.geometry.Plane`
+        The plane.
+    signed : bool, optional
+        If True, vertices below the plane get negative values.
+        Otherwise the absolute distance is returned, as ``distance_point_plane`` does.
+    """
+    normal = np.array(plane.normal, dtype=float)
+    normal /= np.linalg.norm(normal)
+    distances = (vertices - np.array(plane.point, dtype=float)).dot(normal)
+    return distances if signed else np.abs(distances)
+
+
+def points_distance_field(vertices, points):
+    """Distance of every vertex to the closest of a set of points.
+
+    Parameters
+    ----------
+    vertices : :class:`numpy.ndarray`
+        (N, 3) vertex coordinates.
+    points : list or :class:`numpy.ndarray`
+        (M, 3) attractor points.
+    """
+    return ClosestPointCloud(points).distances(vertices)
+
+
+def mesh_distance_field(vertices, mesh, on_surface=False):
+    """Distance of every vertex to an attractor mesh.
+
+    Parameters
+    ----------
+    vertices : :class:`numpy.ndarray`
+        (N, 3) vertex coordinates.
+    mesh : :class:`compas.datastructures.Mesh`
+        Attractor mesh.
+    on_surface : bool, optional
+        If True, measure to the closest point on the mesh faces.
+        Otherwise measure to the closest mesh vertex, which is faster.
+    """
+    if on_surface:
+        return ClosestPointMesh(mesh).distances(vertices)
+    return ClosestPointCloud.from_mesh(mesh).distances(vertices)
+
+
+def polyline_distance_field(vertices, polyline):
+    """Distance of every vertex to a polyline (e.g. a guide curve).
+
+    Parameters
+    ----------
+    vertices : :class:`numpy.ndarray`
+        (N, 3) vertex coordinates.
+    polyline : :class:`compas.geometry.Polyline` or list
+        Polyline or list of its points.
+    """
+    points = np.asarray(getattr(polyline, 'points', polyline), dtype=float).reshape(-1, 3)
+    if len(points) == 1:
+        return points_distance_field(vertices, points)
+
+    a = points[:-1]
+    ab = points[1:] - a
+    ab_squared = (ab ** 2).sum(axis=1)
+    ab_squared[ab_squared == 0] = 1.0
+
+    distances = np.empty(len(vertices))
+    step = max(1, CHUNK_SIZE // len(a))
+
+    for start in range(0, len(vertices), step):
+        chunk = vertices[start:start + step]
+        ap = chunk[:, None, :] - a[None, :, :]
+        t = np.clip((ap * ab[None, :, :]).sum(axis=2) / ab_squared[None, :], 0.0, 1.0)
+        closest = ap - t[:, :, None] * ab[None, :, :]
+        distances[start:start + step] = np.sqrt((closest ** 2).sum(axis=2).min(axis=1))
+
+    return distances
+
+
+def boundary_geodesic_field(mesh, vertices=None, sources=None):
+    """Approximate geodesic distance from the mesh boundary, or from a set of source vertices.
+
+    Distances are shortest paths along mesh edges, computed for all sources at once
+    with a sparse graph Dijkstra.
+
+    Parameters
+    ----------
+    mesh : :class:`compas.datastructures.Mesh`
+        The mesh.
+    vertices : :class:`numpy.ndarray`, optional
+        (N, 3) vertex coordinates, as returned by :func:`vertex_array`.
+    sources : list, optional
+        Vertex keys to measure the distance from. Defaults to all boundary vertices.
+    """
+    if vertices is None:
+        vertices = vertex_array(mesh)
+
+    key_index = mesh.key_index()
+    edges = np.array([(key_index[u], key_index[v]) for u, v in mesh.edges()], dtype=int)
+    lengths = np.linalg.norm(vertices[edges[:, 0]] - vertices[edges[:, 1]], axis=1)
+
+    n = len(vertices)
+    graph = coo_matrix((lengths, (edges[:, 0], edges[:, 1])), shape=(n, n)).tocsr()
+
+    if sources is None:
+        sources = mesh.vertices_on_boundary()
+    sources = [key_index[key] for key in sources]
+
+    return dijkstra(graph, directed=False, indices=sources, min_only=True)
+
+
+def remap_field(field, out_from=0.0, out_to=1.0):
+    """Linearly remap a field to the range [out_from, out_to]."""
+    field = np.asarray(field, dtype=float)
+    lower, upper = field.min(), field.max()
+    if upper - lower == 0:
+        return np.full(field.shape, out_from)
+    return out_from + (field - lower) / (upper - lower) * (out_to - out_from)
+
+
+def blend_fields(fields, weights=None, normalize=True):
+    """Weighted blend of several fields.
+
+    Parameters
+    ----------
+    fields : list of :class:`numpy.ndarray`
+        Fields of equal length.
+    weights : list of float, optional
+        One weight per field. Defaults to equal weights.
+    normalize : bool, optional
+        If True, every field is remapped to [0, 1] before blending,
+        so that fields in different units can be combined.
+    """
+    fields = np.array([remap_field(f) if normalize else f for f in fields], dtype=float)
+    weights = np.ones(len(fields)) if weights is None else np.asarray(weights, dtype=float)
+    return weights.dot(fields) / weights.sum()
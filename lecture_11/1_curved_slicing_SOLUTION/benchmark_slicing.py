@@ -0,0 +1,336 @@
+"""Benchmark of the slicing pipelines of lecture 10 and 11, stage by stage.
+
+The meshes are generated (no data files needed), at increasing resolutions:
+
+* a vase, a surface of revolution with a wavy profile, for planar and scalar field slicing,
+* a bent tube, open at both ends, for interpolation (curved) slicing between its two boundaries.
+
+Every pipeline runs the same stages as the slicing scripts, and every stage
+is timed separately, so that a regression in one stage is not hidden by the
+total. The results are written to ``benchmark_slicing.json`` in the output
+folder, together with the versions of the libraries::
+
+    python benchmark_slicing.py
+
+Copy the json file to ``BASELINE`` (e.g. before changing a stage), and the
+next run prints the relative time of every stage compared to it.
+"""
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import logging
+
+import numpy as np
+
+import compas
+import compas_slicer
+import compas_slicer.utilities as utils
+from compas.datastructures import Mesh
+from compas.geometry import Plane, Point, Vector
+from compas_slicer.slicers import PlanarSlicer
+from compas_slicer.slicers import ScalarFieldSlicer
+from compas_slicer.slicers import InterpolationSlicer
+from compas_slicer.pre_processing import create_mesh_boundary_attributes
+from compas_slicer.post_processing import generate_brim
+from compas_slicer.post_processing import simplify_paths_rdp
+from compas_slicer.post_processing import seams_smooth
+from compas_slicer.print_organization import PlanarPrintOrganizer
+from compas_slicer.print_organization import ScalarFieldPrintOrganizer
+from compas_slicer.print_organization import InterpolationPrintOrganizer
+from compas_slicer.print_organization import set_extruder_toggle
+from compas_slicer.print_organization import add_safety_printpoints
+from compas_slicer.print_organization import set_linear_velocity_constant
+from compas_slicer.print_organization import set_blend_radius
+
+from heat_geodesics import HeatInterpolationSlicingPreprocessor
+from mesh_attributes import MeshAttributes, PrintpointsMapping
+
+logger = logging.getLogger('logger')
+logging.basicConfig(format='%(levelname)s - %(message)s', level=logging.WARNING)
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+OUTPUT_PATH = utils.get_output_directory(DATA_PATH)
+RESULTS_FILE = os.path.join(OUTPUT_PATH, 'benchmark_slicing.json')
+BASELINE = None  # e.g. os.path.join(OUTPUT_PATH, 'benchmark_slicing_baseline.json')
+
+# Resolutions of the generated meshes: (segments around, segments along)
+RESOLUTIONS = [(32, 24), (64, 48), (128, 96)]
+REPEAT = 1  # the fastest of REPEAT runs is reported for every stage
+PIPELINES = ['planar', 'scalar_field', 'interpolation']
+
+HEIGHT = 100.0
+RADIUS = 30.0
+
+
+# ==============================================================================
+# Synthetic meshes
+# ==============================================================================
+def revolution_mesh(radii, centers, height, n_around):
+    """Vertices and faces of an open, triangulated tube.
+
+    Parameters
+    ----------
+    radii: (R,) array
+        Radius of every ring, from bottom to top.
+    centers: (R, 2) array
+        xy position of the center of every ring.
+    height: float
+    n_around: int
+        Number of vertices per ring.
+
+    Returns
+    ----------
+    (R * n_around, 3) array
+        Vertices, ring after ring.
+    (2 * (R - 1) * n_around, 3) array of int
+        Faces, counter-clockwise seen from outside.
+    """
+    rings = len(radii)
+    angles = np.linspace(0.0, 2 * np.pi, n_around, endpoint=False)
+    z = np.linspace(0.0, height, rings)
+    x = centers[:, 0, None] + radii[:, None] * np.cos(angles)
+    y = centers[:, 1, None] + radii[:, None] * np.sin(angles)
+    vertices = np.stack([x, y, np.repeat(z[:, None], n_around, axis=1)], axis=-1).reshape(-1, 3)
+
+    i, j = np.meshgrid(np.arange(rings - 1), np.arange(n_around), indexing='ij')
+    a = i * n_around + j
+    b = i * n_around + (j + 1) % n_around
+    c, d = a + n_around, b + n_around
+    faces = np.concatenate([np.stack([a, b, d], axis=-1).reshape(-1, 3),
+                            np.stack([a, d, c], axis=-1).reshape(-1, 3)])
+    return vertices, faces
+
+
+def vase(n_around, n_along):
+    """A vase with a wavy profile, open at the top and at the bottom."""
+    t = np.linspace(0.0, 1.0, n_along + 1)
+    radii = RADIUS * (0.8 + 0.25 * np.sin(1.5 * np.pi * t) + 0.03 * np.sin(12 * np.pi * t))
+    return revolution_mesh(radii, np.zeros((len(t), 2)), HEIGHT, n_around)
+
+
+def bent_tube(n_around, n_along):
+    """A tube with a constant radius, bent sideways, open at both ends."""
+    t = np.linspace(0.0, 1.0, n_along + 1)
+    centers = np.stack([0.3 * HEIGHT * np.sin(np.pi * t) ** 2, np.zeros_like(t)], axis=-1)
+    return revolution_mesh(np.full(len(t), 0.6 * RADIUS), centers, HEIGHT, n_around)
+
+
+def write_obj(filename, vertices, faces):
+    with open(filename, 'w') as f:
+        f.write(''.join('v %.6f %.6f %.6f\n' % tuple(v) for v in vertices))
+        f.write(''.join('f %d %d %d\n' % tuple(face) for face in faces + 1))
+
+
+# ==============================================================================
+# Timing
+# ==============================================================================
+class StageTimes(object):
+    """Wall time of the stages of one pipeline run, in seconds, in the order they ran."""
+
+    def __init__(self):
+        self.times = {}
+
+    def stage(self, name, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.times[name] = time.perf_counter() - start
+        return result
+
+
+def _counts(slicer=None, print_organizer=None):
+    counts = {}
+    if slicer is not None:
+        counts['layers'] = len(slicer.layers)
+        counts['paths'] = sum(len(layer.paths) for layer in slicer.layers)
+        counts['points'] = sum(len(path.points) for layer in slicer.layers for path in layer.paths)
+    if print_organizer is not None:
+        counts['printpoints'] = print_organizer.number_of_printpoints
+    return counts
+
+
+def _export(print_organizer, folder):
+    utils.save_to_json(print_organizer.output_printpoints_dict(), folder, 'out_printpoints.json')
+
+
+# ==============================================================================
+# Pipelines
+# ==============================================================================
+def planar_pipeline(obj_file, folder, times, slicer_type='default'):
+    mesh = times.stage('load', Mesh.from_obj, obj_file)
+    slicer = PlanarSlicer(mesh, slicer_type=slicer_type, layer_height=1.5)
+    times.stage('slice', slicer.slice_model)
+    times.stage('brim', generate_brim, slicer, layer_width=3.0, number_of_brim_offsets=4)
+    times.stage('rdp', simplify_paths_rdp, slicer, threshold=0.7)
+    times.stage('seams', seams_smooth, slicer, smooth_distance=10)
+
+    print_organizer = PlanarPrintOrganizer(slicer)
+    times.stage('printpoints', print_organizer.create_printpoints)
+
+    def organize():
+        set_extruder_toggle(print_organizer, slicer)
+        add_safety_printpoints(print_organizer, z_hop=10.0)
+        set_linear_velocity_constant(print_organizer, v=100.0)
+        set_blend_radius(print_organizer, d_fillet=10.0)
+
+    times.stage('print_organization', organize)
+    times.stage('export', _export, print_organizer, folder)
+    return _counts(slicer, print_organizer)
+
+
+def scalar_field_pipeline(obj_file, folder, times):
+    mesh = times.stage('load', Mesh.from_obj, obj_file)
+
+    def field():
+        plane = Plane(Point(0, 0, -30), Vector(0.0, 0.5, 0.5))
+        normal = np.array(plane.normal) / np.linalg.norm(plane.normal)
+        vertices = np.array(mesh.vertices_attributes('xyz'), dtype=float)
+        return np.abs((vertices - np.array(plane.point)).dot(normal)).tolist()
+
+    u = times.stage('scalar_field', field)
+    slicer = ScalarFieldSlicer(mesh, u, no_of_isocurves=30)
+    times.stage('slice', slicer.slice_model)
+    times.stage('rdp', simplify_paths_rdp, slicer, threshold=0.8)
+
+    print_organizer = ScalarFieldPrintOrganizer(slicer, parameters={}, DATA_PATH=folder)
+    times.stage('printpoints', print_organizer.create_printpoints)
+
+    def organize():
+        set_extruder_toggle(print_organizer, slicer)
+        add_safety_printpoints(print_organizer, z_hop=10.0)
+
+    times.stage('print_organization', organize)
+    times.stage('export', _export, print_organizer, folder)
+    return _counts(slicer, print_organizer)
+
+
+def interpolation_pipeline(obj_file, folder, times, n_around):
+    mesh = times.stage('load', Mesh.from_obj, obj_file)
+
+    # the first and the last ring of the tube are the boundaries
+    keys = list(mesh.vertices())
+    create_mesh_boundary_attributes(mesh, keys[:n_around], keys[-n_around:])
+    parameters = {'avg_layer_height': 5.0, 'min_layer_height': 0.3, 'max_layer_height': 10.0,
+                  'target_LOW_geodesics_method': 'heat_sparse', 'target_HIGH_geodesics_method': 'heat_sparse'}
+
+    def targets():
+        preprocessor = HeatInterpolationSlicingPreprocessor(mesh, parameters, folder)
+        preprocessor.create_compound_targets()
+        return preprocessor
+
+    preprocessor = times.stage('targets', targets)
+    slicer = InterpolationSlicer(mesh, preprocessor, parameters)
+    times.stage('slice', slicer.slice_model)
+    times.stage('seams', seams_smooth, slicer, smooth_distance=10)
+    times.stage('rdp', simplify_paths_rdp, slicer, threshold=0.4)
+
+    print_organizer = InterpolationPrintOrganizer(slicer, parameters, folder)
+    times.stage('printpoints', print_organizer.create_printpoints)
+
+    def organize():
+        set_extruder_toggle(print_organizer, slicer)
+        add_safety_printpoints(print_organizer, z_hop=10.0)
+
+    times.stage('print_organization', organize)
+
+    def transfer():
+        attributes = MeshAttributes(mesh)
+        mapping = PrintpointsMapping(attributes, print_organizer.printpoints_dict)
+        mapping.transfer_face_attribute('overhang', attributes.overhang(up=(0.0, 0.0, 1.0)))
+        mapping.transfer_vertex_attribute('v_normal', attributes.vertex_normals())
+
+    times.stage('attribute_transfer', transfer)
+    times.stage('export', _export, print_organizer, folder)
+    return _counts(slicer, print_organizer)
+
+
+def run_benchmark(pipelines=PIPELINES, resolutions=RESOLUTIONS, repeat=REPEAT):
+    """Runs every pipeline on every resolution.
+
+    Returns
+    ----------
+    dict
+        The environment, and for every run: pipeline, resolution, mesh size, item counts and stage times.
+    """
+    try:
+        import compas_cgal  # noqa: F401
+        planar_slicer_type = 'cgal'
+    except ImportError:
+        planar_slicer_type = 'default'
+
+    results = {'environment': {'python': platform.python_version(),
+                               'platform': platform.platform(),
+                               'numpy': np.__version__,
+                               'compas': compas.__version__,
+                               'compas_slicer': compas_slicer.__version__,
+                               'planar_slicer_type': planar_slicer_type},
+               'runs': []}
+
+    folder = tempfile.mkdtemp()
+    try:
+        for pipeline in pipelines:
+            for n_around, n_along in resolutions:
+                vertices, faces = bent_tube(n_around, n_along) if pipeline == 'interpolation' else \
+                    vase(n_around, n_along)
+                obj_file = os.path.join(folder, 'mesh.obj')
+                write_obj(obj_file, vertices, faces)
+
+                best = {}
+                for _ in range(repeat):
+                    times = StageTimes()
+                    if pipeline == 'planar':
+                        counts = planar_pipeline(obj_file, folder, times, planar_slicer_type)
+                    elif pipeline == 'scalar_field':
+                        counts = scalar_field_pipeline(obj_file, folder, times)
+                    else:
+                        counts = interpolation_pipeline(obj_file, folder, times, n_around)
+                    for name, seconds in times.times.items():
+                        best[name] = min(best.get(name, seconds), seconds)
+
+                run = {'pipeline': pipeline, 'resolution': [n_around, n_along],
+                       'vertices': len(vertices), 'faces': len(faces), 'counts': counts,
+                       'stages': best, 'total': sum(best.values())}
+                results['runs'].append(run)
+                print("%-14s %4d x %-4d %7d faces  %7.2f s" % (pipeline, n_around, n_along, len(faces), run['total']))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def printout_results(results, baseline=None):
+    """Prints the stage times of every run, relative to the matching run of a baseline if given."""
+    previous = {}
+    if baseline:
+        previous = {(run['pipeline'], tuple(run['resolution'])): run for run in baseline['runs']}
+
+    print("\n---- Slicing benchmark ----")
+    for run in results['runs']:
+        reference = previous.get((run['pipeline'], tuple(run['resolution'])))
+        print("%s, %d x %d (%d faces, %s)" % (run['pipeline'], run['resolution'][0], run['resolution'][1],
+                                              run['faces'], ', '.join('%d %s' % (v, k)
+                                                                      for k, v in run['counts'].items())))
+        for name, seconds in list(run['stages'].items()) + [('total', run['total'])]:
+            line = "    %-20s %8.3f s" % (name, seconds)
+            if reference:
+                before = reference['total'] if name == 'total' else reference['stages'].get(name)
+                if before:
+                    line += "  %+6.0f%%" % (100.0 * (seconds - before) / before)
+            print(line)
+    print("")
+
+
+def main():
+    results = run_benchmark()
+    utils.save_to_json(results, OUTPUT_PATH, os.path.basename(RESULTS_FILE))
+
+    baseline = None
+    if BASELINE and os.path.exists(BASELINE):
+        with open(BASELINE, 'r') as f:
+            baseline = json.load(f)
+    printout_results(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,24 @@
 import os
 import numpy as np
-from compas.datastructures import Mesh
+from compas.geometry import Frame
 import logging
 import compas_slicer.utilities as utils
 from compas_slicer.slicers import InterpolationSlicer
 from compas_slicer.post_processing import simplify_paths_rdp
-from compas_slicer.pre_processing import InterpolationSlicingPreprocessor
 from compas_slicer.print_organization import set_extruder_toggle, set_linear_velocity_by_range
 from compas_slicer.print_organization import add_safety_printpoints
 from compas_slicer.pre_processing import create_mesh_boundary_attributes
 from compas_slicer.print_organization import InterpolationPrintOrganizer
 from compas_slicer.post_processing import seams_smooth
-from compas_slicer.print_organization import smooth_printpoints_up_vectors, smooth_printpoints_layer_heights
 from compas_slicer.post_processing import generate_brim
-from compas.geometry import Vector, Point, normalize_vector
-from compas_slicer.utilities.attributes_transfer import transfer_mesh_attributes_to_printpoints
+
+from stage_cache import StageCache
+from heat_geodesics import HeatInterpolationSlicingPreprocessor
+from mesh_attributes import MeshAttributes, PrintpointsMapping
+from printpoints_smoothing import PrintpointsSmoothing, smooth_printpoints_up_vectors, smooth_printpoints_layer_heights
+from reachability import check_reachability, UR5_PARAMS
+from stage_profiler import StageProfiler
+from obj_loader import mesh_from_obj
 
 
 logger = logging.getLogger('logger')
@@ -24,65 +28,112 @@ DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
 OUTPUT_PATH = utils.get_output_directory(DATA_PATH)
 OBJ_INPUT_NAME = os.path.join(DATA_PATH, '_mesh.obj')
 
+# --- Robot cell, in millimeters: the print in robot base coordinates, and the nozzle (TCP) in tool0 coordinates
+PRINT_FRAME = Frame((450, 0, 0), (1, 0, 0), (0, 1, 0))
+TOOL_FRAME = Frame((0, 0, 150), (1, 0, 0), (0, 1, 0))
 
-def main():
+# --- Time and item counts of every stage, saved to OUTPUT_PATH/trace.json, to open in chrome://tracing
+# or https://ui.perfetto.dev (memory=True adds the peak memory, but slows down the stages)
+profiler = StageProfiler(memory=False)
+
+
+def slice_model(avg_layer_height, min_layer_height, max_layer_height):
+    """ Slicing stage: everything that only depends on the mesh, the boundaries and the slicing parameters. """
     # --- Load initial_mesh
-    mesh = Mesh.from_obj(os.path.join(DATA_PATH, OBJ_INPUT_NAME))
+    # the vertices and faces are parsed in bulk, and cached next to the OBJ for the next runs
+    with profiler.stage('load'):
+        mesh = mesh_from_obj(os.path.join(DATA_PATH, OBJ_INPUT_NAME))
 
     # --- Load targets (boundaries)
     low_boundary_vs = utils.load_from_json(DATA_PATH, 'boundaryLOW.json')
     high_boundary_vs = utils.load_from_json(DATA_PATH, 'boundaryHIGH.json')
     create_mesh_boundary_attributes(mesh, low_boundary_vs, high_boundary_vs)
 
-    avg_layer_height = 10.0
-
     parameters = {
         'avg_layer_height': avg_layer_height,  # controls number of curves that will be generated
-        'min_layer_height': 0.3,
-        'max_layer_height': 5.0  # 2.0,
+        'min_layer_height': min_layer_height,
+        'max_layer_height': max_layer_height,
+        # sparse heat method with pre-factorized matrices, much faster than 'exact_igl' on large meshes
+        'target_LOW_geodesics_method': 'heat_sparse',
+        'target_HIGH_geodesics_method': 'heat_sparse',
     }
 
     # --- Create pre-processor
-    preprocessor = InterpolationSlicingPreprocessor(mesh, parameters, DATA_PATH)
-    preprocessor.create_compound_targets()
+    with profiler.stage('targets'):
+        preprocessor = HeatInterpolationSlicingPreprocessor(mesh, parameters, DATA_PATH)
+        preprocessor.create_compound_targets()
 
     # --- slicing
-    slicer = InterpolationSlicer(mesh, preprocessor, parameters)
-    slicer.slice_model()  # compute_norm_of_gradient contours
-    seams_smooth(slicer, smooth_distance=10)
+    with profiler.stage('slice') as stage:
+        slicer = InterpolationSlicer(mesh, preprocessor, parameters)
+        slicer.slice_model()  # compute_norm_of_gradient contours
+        stage.count(slicer=slicer)
+    return slicer
+
+
+def post_process(slicer, rdp_threshold, smooth_distance):
+    """ Post-processing stage: seams and simplification of the sliced paths. """
+    with profiler.stage('seams'):
+        seams_smooth(slicer, smooth_distance=smooth_distance)
+
+    with profiler.stage('rdp') as stage:
+        simplify_paths_rdp(slicer, threshold=rdp_threshold)
+        stage.count(slicer=slicer)
+    return slicer
+
+
+def main():
+    avg_layer_height = 10.0
+
+    # --- Slicing and post-processing, cached: each is only recomputed if the mesh, the boundaries, its parameters,
+    # its function or the helper modules change, so tweaking the post-processing doesn't require slicing again
+    cache = StageCache(os.path.join(OUTPUT_PATH, 'cache'), OBJ_INPUT_NAME,
+                       os.path.join(DATA_PATH, 'boundaryLOW.json'), os.path.join(DATA_PATH, 'boundaryHIGH.json'))
+    with profiler.stage('slicing') as stage:
+        slicer = cache.run('slicing', slice_model, avg_layer_height=avg_layer_height, min_layer_height=0.3,
+                           max_layer_height=5.0)
+        stage.count(slicer=slicer)
+    with profiler.stage('post_processing') as stage:
+        slicer = cache.run('post_processing', post_process, slicer, rdp_threshold=0.4, smooth_distance=10)
+        stage.count(slicer=slicer)
+    mesh, parameters = slicer.mesh, slicer.parameters
 
-    simplify_paths_rdp(slicer, threshold=0.4)
     slicer.printout_info()
     utils.save_to_json(slicer.to_data(), OUTPUT_PATH, 'curved_slicer.json')
 
     # --- Print organizer
-    print_organizer = InterpolationPrintOrganizer(slicer, parameters, DATA_PATH)
-    print_organizer.create_printpoints()
-
-    set_linear_velocity_by_range(print_organizer, param_func=lambda ppt: ppt.layer_height,
-                                 parameter_range=[avg_layer_height*0.5, avg_layer_height*2.0],
-                                 velocity_range=[150, 70], bound_remapping=False)
-    set_extruder_toggle(print_organizer, slicer)
-    add_safety_printpoints(print_organizer, z_hop=10.0)
-    smooth_printpoints_up_vectors(print_organizer, strength=0.5, iterations=10)
-    smooth_printpoints_layer_heights(print_organizer, strength=0.5, iterations=5)
-
-
-    # --- Add attributes to mesh
-    # overhand attribute - Scalar value (per face)
-    mesh.update_default_face_attributes({'overhang': 0.0})
-    for f_key, data in mesh.faces(data=True):
-        face_normal = mesh.face_normal(f_key, unitized=True)
-        data['overhang'] = Vector(0.0, 0.0, 1.0).dot(face_normal)
-
-    # vertex laplacian - Vector value (per vertex)
-    mesh.update_default_vertex_attributes({'v_normal': 0.0})
-    for v_key, data in mesh.vertices(data=True):
-        n = mesh.vertex_normal(v_key)
-        data['v_normal'] = Vector(*n)
-
-    # --- Transfer mesh attributes to printpoints
-    transfer_mesh_attributes_to_printpoints(mesh, print_organizer.printpoints_dict)
+    with profiler.stage('printpoints') as stage:
+        print_organizer = InterpolationPrintOrganizer(slicer, parameters, DATA_PATH)
+        print_organizer.create_printpoints()
+        stage.count(print_organizer=print_organizer)
+
+    with profiler.stage('fabrication_parameters') as stage:
+        set_linear_velocity_by_range(print_organizer, param_func=lambda ppt: ppt.layer_height,
+                                     parameter_range=[avg_layer_height*0.5, avg_layer_height*2.0],
+                                     velocity_range=[150, 70], bound_remapping=False)
+        set_extruder_toggle(print_organizer, slicer)
+        add_safety_printpoints(print_organizer, z_hop=10.0)
+        stage.count(print_organizer=print_organizer)
+
+    # --- Smoothing, with a sparse Laplacian over the printpoints that is built once for both attributes.
+    # For strong smoothing of dense prints use method='implicit', a single solve for any number of iterations
+    with profiler.stage('smoothing'):
+        smoothing = PrintpointsSmoothing(print_organizer)
+        smooth_printpoints_up_vectors(print_organizer, strength=0.5, iterations=10, smoothing=smoothing)
+        smooth_printpoints_layer_heights(print_organizer, strength=0.5, iterations=5, smoothing=smoothing)
+
+
+    # --- Add attributes to mesh, computed for all faces / vertices at once
+    with profiler.stage('attribute_transfer'):
+        attributes = MeshAttributes(mesh)
+        overhang = attributes.overhang(up=(0.0, 0.0, 1.0))  # overhang attribute - Scalar value (per face)
+        v_normal = attributes.vertex_normals()  # vertex normal - Vector value (per vertex)
+
+        # --- Transfer mesh attributes to printpoints
+        # the closest faces and barycentric coordinates are computed once, and reused for every attribute
+        mapping = PrintpointsMapping(attributes, print_organizer.printpoints_dict)
+        mapping.transfer_face_attribute('overhang', overhang)
+        mapping.transfer_vertex_attribute('v_normal', v_normal)
 
     # --- Save printpoints attributes for visualization
     overhangs_list = print_organizer.get_printpoints_attribute(attr_name='overhang')
@@ -91,9 +142,23 @@ def main():
     utils.save_to_json(utils.point_list_to_dict(v_normal_list), OUTPUT_PATH, 'v_normal_list.json')
 
     
+    # --- Check that the robot can reach all printpoints, before exporting them
+    # the extruder is axially symmetric, so 8 rotations around the nozzle axis are tried for every printpoint
+    with profiler.stage('reachability'):
+        report = check_reachability(print_organizer, UR5_PARAMS, print_frame=PRINT_FRAME, tool_frame=TOOL_FRAME,
+                                    rotations=8)
+    report.printout_info()
+    report.set_feasibility(print_organizer)
+    utils.save_to_json(report.to_data(), OUTPUT_PATH, 'reachability.json')
+
     # --- Save printpoints dictionary to json file
-    printpoints_data = print_organizer.output_printpoints_dict()
-    utils.save_to_json(printpoints_data, OUTPUT_PATH, 'out_printpoints.json')
+    with profiler.stage('export'):
+        printpoints_data = print_organizer.output_printpoints_dict()
+        utils.save_to_json(printpoints_data, OUTPUT_PATH, 'out_printpoints.json')
+
+    # --- Time, peak memory and item counts of every stage
+    profiler.printout_info()
+    profiler.save_trace(os.path.join(OUTPUT_PATH, 'trace.json'))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+"""Vectorized mesh attributes and their transfer to printpoints.
+
+Mesh attributes (face normals, vertex normals, overhang, ...) are computed as
+NumPy arrays for all faces/vertices at once, instead of calling
+``mesh.face_normal`` and ``mesh.vertex_normal`` in a loop.
+
+The transfer to printpoints works like ``transfer_mesh_attributes_to_printpoints``
+(closest face by centroid, face values taken directly, vertex values
+interpolated with barycentric coordinates), but the closest faces and the
+barycentric coordinates are computed once, in a :class:`PrintpointsMapping`,
+and reused for every attribute::
+
+    attributes = MeshAttributes(mesh)
+    mapping = PrintpointsMapping(attributes, print_organizer.printpoints_dict)
+    mapping.transfer_face_attribute('overhang', attributes.overhang())
+    mapping.transfer_vertex_attribute('v_normal', attributes.vertex_normals())
+
+"""
+import logging
+
+import numpy as np
+from scipy.spatial import cKDTree
+from compas.geometry import Vector
+
+logger = logging.getLogger('logger')
+
+__all__ = ['MeshAttributes', 'PrintpointsMapping']
+
+
+class MeshAttributes(object):
+    """
+    Vertex and face arrays of a triangle mesh, and attributes computed from them.
+
+    Attributes
+    ----------
+    vertices: (V, 3) array
+        Vertex coordinates, in ``mesh.vertices()`` order.
+    faces: (F, 3) array
+        Vertex indices of every face, in ``mesh.faces()`` order.
+    """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.vertex_keys = list(mesh.vertices())
+        self.face_keys = list(mesh.faces())
+        key_index = mesh.key_index()
+
+        self.vertices = np.array([mesh.vertex_coordinates(vkey) for vkey in self.vertex_keys], dtype=float)
+        self.faces = np.array([[key_index[vkey] for vkey in mesh.face_vertices(fkey)] for fkey in self.face_keys],
+                              dtype=int)
+        self._face_normals = None
+        self._area_normals = None
+
+    def face_centroids(self):
+        """(F, 3) array of face centroids."""
+        return self.vertices[self.faces].mean(axis=1)
+
+    def area_normals(self):
+        """(F, 3) array of face normals, with the length of the face area."""
+        if self._area_normals is None:
+            a, b, c = (self.vertices[self.faces[:, i]] for i in range(3))
+            self._area_normals = 0.5 * np.cross(b - a, c - a)
+        return self._area_normals
+
+    def face_areas(self):
+        """(F,) array of face areas."""
+        return np.linalg.norm(self.area_normals(), axis=1)
+
+    def face_normals(self):
+        """(F, 3) array of unit face normals."""
+        if self._face_normals is None:
+            self._face_normals = _unitized(self.area_normals())
+        return self._face_normals
+
+    def vertex_normals(self):
+        """(V, 3) array of unit vertex normals, the area weighted average of the normals of the adjacent faces
+        (as ``mesh.vertex_normal``)."""
+        normals = np.zeros_like(self.vertices)
+        area_normals = self.area_normals()
+        for corner in range(3):
+            np.add.at(normals, self.faces[:, corner], area_normals)
+        return _unitized(normals)
+
+    def overhang(self, up=(0.0, 0.0, 1.0)):
+        """(F,) array, dot product of every face normal with the up direction."""
+        return self.face_normals().dot(np.asarray(up, dtype=float))
+
+    def set_face_attribute(self, name, values):
+        """Writes an array of per-face values back to the mesh face attributes."""
+        for fkey, value in zip(self.face_keys, _to_python(values)):
+            self.mesh.face_attribute(fkey, name, value)
+
+    def set_vertex_attribute(self, name, values):
+        """Writes an array of per-vertex values back to the mesh vertex attributes."""
+        for vkey, value in zip(self.vertex_keys, _to_python(values)):
+            self.mesh.vertex_attribute(vkey, name, value)
+
+
+class PrintpointsMapping(object):
+    """
+    The closest face and barycentric coordinates of every printpoint, computed once.
+
+    Attributes
+    ----------
+    closest_faces: (N,) array
+        Index of the closest face (by centroid, as ``pull_pts_to_mesh_faces``) of every printpoint.
+    barycentric: (N, 3) array
+        Barycentric coordinates of every printpoint, projected on the plane of its closest face.
+    """
+
+    def __init__(self, mesh_attributes, printpoints_dict):
+        self.mesh_attributes = mesh_attributes
+        self.printpoints = [ppt for layer_key in printpoints_dict
+                            for path_key in printpoints_dict[layer_key]
+                            for ppt in printpoints_dict[layer_key][path_key]]
+        points = np.array([ppt.pt for ppt in self.printpoints], dtype=float).reshape(-1, 3)
+
+        logger.info('Mapping %d printpoints to the mesh faces' % len(points))
+        tree = cKDTree(mesh_attributes.face_centroids())
+        _, self.closest_faces = tree.query(points)
+        self.barycentric = self._barycentric_coordinates(points)
+
+    def _barycentric_coordinates(self, points):
+        triangles = self.mesh_attributes.vertices[self.mesh_attributes.faces[self.closest_faces]]  # (N, 3, 3)
+        a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        v0, v1, v2 = b - a, c - a, points - a
+
+        # the coordinates of the projection on the plane of the face
+        d00 = (v0 * v0).sum(axis=1)
+        d01 = (v0 * v1).sum(axis=1)
+        d11 = (v1 * v1).sum(axis=1)
+        d20 = (v2 * v0).sum(axis=1)
+        d21 = (v2 * v1).sum(axis=1)
+        denominator = d00 * d11 - d01 * d01
+        denominator[denominator == 0] = 1.0
+
+        v = (d11 * d20 - d01 * d21) / denominator
+        w = (d00 * d21 - d01 * d20) / denominator
+        return np.stack([1.0 - v - w, v, w], axis=1)
+
+    def face_values(self, values):
+        """Values of a per-face array at every printpoint."""
+        return np.asarray(values)[self.closest_faces]
+
+    def vertex_values(self, values):
+        """Values of a per-vertex array at every printpoint, interpolated with barycentric coordinates."""
+        values = np.asarray(values, dtype=float)
+        corners = values[self.mesh_attributes.faces[self.closest_faces]]  # (N, 3, ...)
+        weights = self.barycentric.reshape(self.barycentric.shape + (1,) * (values.ndim - 1))
+        return (corners * weights).sum(axis=1)
+
+    def assign(self, name, values):
+        """Sets ``printpoint.attributes[name]``. Rows of (N, 3) arrays become :class:`compas.geometry.Vector`."""
+        values = np.asarray(values)
+        if values.ndim == 2 and values.shape[1] == 3:
+            values = [Vector(*row) for row in values.tolist()]
+        else:
+            values = _to_python(values)
+        for ppt, value in zip(self.printpoints, values):
+            ppt.attributes[name] = value
+
+    def transfer_face_attribute(self, name, values):
+        """Transfers a per-face array to the printpoints."""
+        self.assign(name, self.face_values(values))
+
+    def transfer_vertex_attribute(self, name, values):
+        """Transfers a per-vertex array to the printpoints, with barycentric interpolation."""
+        self.assign(name, self.vertex_values(values))
+
+
+def _unitized(vectors):
+    lengths = np.linalg.norm(vectors, axis=1)
+    lengths[lengths == 0] = 1.0
+    return vectors / lengths[:, None]
+
+
+def _to_python(values):
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
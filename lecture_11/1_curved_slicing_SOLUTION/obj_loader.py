@@ -0,0 +1,223 @@
+"""Fast loading of OBJ meshes into NumPy arrays.
+
+``Mesh.from_obj`` reads the file line by line, with a Python call for every
+vertex and face. Here the vertex and face lines are found with one regular
+expression each, and parsed in bulk by NumPy. The result is the same mesh
+(the vertices are merged by geometric key, as ``Mesh.from_obj`` does).
+
+The parsed arrays are cached in a binary sidecar file next to the OBJ
+(``<name>.obj.npz``), so that the next runs only read the arrays. The sidecar
+is used while the size and modification time of the OBJ are the ones it was
+made from, or if its content still has the same hash (e.g. after a checkout)::
+
+    mesh = mesh_from_obj(os.path.join(DATA, MODEL))  # instead of Mesh.from_obj
+
+    arrays = load_obj(os.path.join(DATA, MODEL))  # vertices and faces only
+    mesh = arrays.to_mesh()  # the half-edge mesh, only if it is needed
+"""
+import hashlib
+import logging
+import os
+import re
+
+import numpy as np
+
+import compas
+from compas.datastructures import Mesh
+
+logger = logging.getLogger('logger')
+
+__all__ = ['ObjArrays',
+           'read_obj',
+           'load_obj',
+           'mesh_from_obj']
+
+SIDECAR_VERSION = 2
+
+_VERTEX = re.compile(rb'^v[ \t]+([^\n]*)', re.MULTILINE)
+_FACE = re.compile(rb'^f[ \t]+([^\n]*)', re.MULTILINE)
+_TEXTURE_AND_NORMAL = re.compile(rb'/[^\s]*')
+
+
+class ObjArrays(object):
+    """
+    Vertices and faces of a polygon mesh, as arrays.
+
+    Attributes
+    ----------
+    vertices: (V, 3) array
+    face_vertices: (sum of the face sizes,) array of int
+        The vertex indices of all faces, one face after the other.
+    face_offsets: (F + 1,) array of int
+        Face f consists of ``face_vertices[face_offsets[f]:face_offsets[f + 1]]``.
+    """
+
+    def __init__(self, vertices, face_vertices, face_offsets):
+        self.vertices = vertices
+        self.face_vertices = face_vertices
+        self.face_offsets = face_offsets
+
+    @property
+    def number_of_vertices(self):
+        return len(self.vertices)
+
+    @property
+    def number_of_faces(self):
+        return len(self.face_offsets) - 1
+
+    @property
+    def faces(self):
+        """(F, k) array if all faces have k vertices, otherwise a list of F arrays."""
+        sizes = np.diff(self.face_offsets)
+        if len(sizes) and (sizes == sizes[0]).all():
+            return self.face_vertices.reshape(-1, sizes[0])
+        return np.split(self.face_vertices, self.face_offsets[1:-1])
+
+    def to_mesh(self, cls=Mesh):
+        """The :class:`compas.datastructures.Mesh` of the arrays."""
+        faces = self.faces
+        return cls.from_vertices_and_faces(self.vertices.tolist(),
+                                           faces.tolist() if isinstance(faces, np.ndarray) else
+                                           [face.tolist() for face in faces])
+
+
+def _parse_numbers(lines, dtype):
+    # all numbers of a list of lines, and the number of numbers of every line
+    numbers = np.fromstring(b'\n'.join(lines), dtype=dtype, sep=' ')
+    sizes = np.array([len(line.split()) for line in lines], dtype=np.int64)
+    if sizes.sum() != len(numbers):
+        raise ValueError('Could not parse all numbers of the lines, %d instead of %d' % (len(numbers), sizes.sum()))
+    return numbers, sizes
+
+
+def _geometric_keys(vertices, precision):
+    # integer version of compas.utilities.geometric_key, e.g. 1.2345 -> 1235 for '3f'
+    if precision == 'd':
+        return np.trunc(vertices).astype(np.int64)
+    decimals = int(precision[:-1])
+    scaled = vertices * 10 ** decimals
+    keys = np.round(scaled)
+    # values close to a rounding tie are formatted as compas does
+    ties = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    for index in zip(*np.nonzero(ties)):
+        keys[index] = int(('%.*f' % (decimals, vertices[index])).replace('.', ''))
+    return keys.astype(np.int64)
+
+
+def read_obj(filename, precision=None):
+    """Parses the vertices and faces of an OBJ file.
+
+    Parameters
+    ----------
+    filename: str
+    precision: str, optional
+        Precision of the geometric keys used to merge the vertices, defaults to ``compas.PRECISION``.
+
+    Returns
+    ----------
+    :class:`ObjArrays`
+    """
+    with open(filename, 'rb') as f:
+        content = f.read()
+
+    # --- vertices, lines with 3 coordinates or 3 coordinates and a weight, as compas
+    lines = _VERTEX.findall(content)
+    numbers, sizes = _parse_numbers(lines, float)
+    if (sizes == 3).all():
+        vertices = numbers.reshape(-1, 3)
+    else:
+        starts = np.cumsum(sizes) - sizes
+        valid = (sizes == 3) | (sizes == 4)
+        vertices = numbers[starts[valid][:, None] + np.arange(3)]
+
+    # --- faces, without the texture and normal indices, and with at least 3 vertices
+    lines = _FACE.findall(content)
+    if any(b'/' in line for line in lines):
+        lines = [_TEXTURE_AND_NORMAL.sub(b'', line) for line in lines]
+    indices, sizes = _parse_numbers(lines, np.int64)
+    if not (sizes >= 3).all():
+        keep = np.repeat(sizes >= 3, sizes)
+        indices, sizes = indices[keep], sizes[sizes >= 3]
+    face_offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    face_vertices = indices - 1
+
+    # --- merge the vertices with the same geometric key, in the order of their first
+    # occurrence and with the coordinates of their last occurrence, as Mesh.from_obj
+    keys = _geometric_keys(vertices, precision or compas.PRECISION)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    if len(first) < len(vertices):
+        rank = np.empty(len(first), dtype=np.int64)
+        rank[np.argsort(first)] = np.arange(len(first))
+        last = np.zeros(len(first), dtype=np.int64)
+        np.maximum.at(last, inverse, np.arange(len(vertices)))
+        merged = np.empty((len(first), 3))
+        merged[rank] = vertices[last]
+        vertices, face_vertices = merged, rank[inverse][face_vertices]
+
+    return ObjArrays(vertices, face_vertices, face_offsets)
+
+
+def _sha1(filename):
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_obj(filename, precision=None, cache=True):
+    """Vertices and faces of an OBJ file, from its sidecar file if it is up to date.
+
+    Parameters
+    ----------
+    filename: str
+    precision: str, optional
+        Precision of the geometric keys used to merge the vertices, defaults to ``compas.PRECISION``.
+    cache: bool
+        Read and write the sidecar file ``<filename>.npz``.
+
+    Returns
+    ----------
+    :class:`ObjArrays`
+    """
+    precision = precision or compas.PRECISION
+    if not cache:
+        return read_obj(filename, precision)
+
+    sidecar = filename + '.npz'
+    stat = os.stat(filename)
+    sha1 = None
+
+    arrays = None
+    if os.path.exists(sidecar):
+        with np.load(sidecar) as data:
+            if int(data['version']) == SIDECAR_VERSION and str(data['precision']) == precision and \
+                    int(data['size']) == stat.st_size:
+                if int(data['mtime_ns']) == stat.st_mtime_ns:
+                    logger.info("Loaded %s from its sidecar file" % os.path.basename(filename))
+                    return ObjArrays(data['vertices'], data['face_vertices'], data['face_offsets'])
+                # touched, but maybe not changed: the sidecar is rewritten with the new modification time
+                sha1 = _sha1(filename)
+                if sha1 == str(data['sha1']):
+                    arrays = ObjArrays(data['vertices'], data['face_vertices'], data['face_offsets'])
+
+    if arrays is None:
+        arrays = read_obj(filename, precision)
+    else:
+        logger.info("Loaded %s from its sidecar file, same content" % os.path.basename(filename))
+
+    try:
+        temporary = sidecar + '.tmp.npz'
+        np.savez(temporary, vertices=arrays.vertices, face_vertices=arrays.face_vertices,
+                 face_offsets=arrays.face_offsets, version=SIDECAR_VERSION, precision=precision,
+                 size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha1=sha1 or _sha1(filename))
+        os.replace(temporary, sidecar)
+    except OSError as e:
+        logger.warning("Could not write the sidecar file of %s: %s" % (os.path.basename(filename), e))
+    return arrays
+
+
+def mesh_from_obj(filename, precision=None, cache=True, cls=Mesh):
+    """Drop-in replacement of ``Mesh.from_obj`` for polygon meshes, see :func:`load_obj`."""
+    return load_obj(filename, precision, cache).to_mesh(cls)
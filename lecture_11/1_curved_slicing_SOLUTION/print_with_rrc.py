@@ -0,0 +1,41 @@
+import os
+import logging
+import compas_rrc as rrc
+
+from rrc_printer import read_printpoints, PrintStreamer
+
+logger = logging.getLogger('logger')
+logging.basicConfig(format='%(levelname)s - %(message)s', level=logging.INFO)
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+PRINTPOINTS_FILE = os.path.join(DATA_PATH, 'output', 'out_printpoints.json')  # generated by curved_slicing.py
+
+if __name__ == '__main__':
+
+    # Create Ros Client
+    ros = rrc.RosClient()
+    ros.run()
+
+    # Create ABB Client
+    abb = rrc.AbbClient(ros, '/rob1')
+    print('Connected.')
+
+    # Set the extruder as tool, and the print bed as work object (the printpoints are in its coordinates)
+    abb.send(rrc.SetTool('tool_extruder'))
+    abb.send(rrc.SetWorkObject('wobj_print_bed'))
+
+    # Stream the printpoints, read lazily from the file, with at most 50 moves in flight
+    streamer = PrintStreamer(abb, window=50, extruder_signal='doExtruder')
+    # Refuse to start if some printpoints are not feasible (see reachability.py), instead of faulting mid-print
+    streamer.check(read_printpoints(PRINTPOINTS_FILE))
+    report = streamer.run(read_printpoints(PRINTPOINTS_FILE))
+
+    # Print feed continuity
+    report.printout_info()
+
+    # End of Code
+    print('Finished')
+
+    # Close client
+    ros.close()
+    ros.terminate()
@@ -0,0 +1,173 @@
+"""Vectorized smoothing of printpoint attributes.
+
+``smooth_printpoint_attribute`` of compas_slicer averages every value with
+its two neighbors, one printpoint at a time, for a number of iterations::
+
+    new_value = (1 - strength) * value + strength * 0.5 * (previous + next)
+
+which is a step of diffusion with the sparse chain Laplacian ``L = I - A``
+over the printpoint adjacency (the first and last printpoints are fixed).
+Here L is assembled once as a sparse matrix and applied to the values of all
+printpoints together, either:
+
+* 'explicit': the same smoothing as compas_slicer. Its first iteration is the
+  explicit step ``x <- x - strength * L x``, a sparse matrix product. From the
+  second iteration on, compas_slicer updates the values in place, so every
+  value is averaged with the already updated previous one (a Gauss-Seidel
+  step). That is a linear recurrence along the printpoints, computed with
+  ``scipy.signal.lfilter``;
+* 'implicit': a single sparse solve of ``(I + strength * iterations * L) x = x0``.
+  Its cost does not depend on the amount of smoothing, and it is stable
+  for any strength, so use it for strong smoothing of dense prints.
+
+::
+
+    smoothing = PrintpointsSmoothing(print_organizer)
+    smooth_printpoints_up_vectors(print_organizer, strength=0.5, iterations=10, smoothing=smoothing)
+    smooth_printpoints_layer_heights(print_organizer, strength=0.5, iterations=200, method='implicit',
+                                     smoothing=smoothing)
+"""
+import logging
+
+import numpy as np
+import scipy.signal
+import scipy.sparse
+import scipy.sparse.linalg
+from compas.geometry import Vector
+
+logger = logging.getLogger('logger')
+
+__all__ = ['PrintpointsSmoothing',
+           'smooth_printpoints_up_vectors',
+           'smooth_printpoints_layer_heights']
+
+
+class PrintpointsSmoothing(object):
+    """
+    Sparse Laplacian over the sequence of printpoints of a print organizer.
+
+    Attributes
+    ----------
+    printpoints: list of :class:`compas_slicer.geometry.PrintPoint`
+        In the order of ``print_organizer.printpoints_iterator()``.
+    per_path: bool
+        If False (default, as compas_slicer), all printpoints are smoothed as one
+        uninterrupted path. If True, every path is smoothed on its own and the
+        first and last printpoints of every path are fixed.
+    laplacian: :class:`scipy.sparse.csr_matrix`
+        (N, N), the rows of the fixed printpoints are zero.
+    """
+
+    def __init__(self, print_organizer, per_path=False):
+        self.per_path = per_path
+        self.printpoints = []
+        path_starts = []
+        for layer_key in print_organizer.printpoints_dict:
+            for path_key in print_organizer.printpoints_dict[layer_key]:
+                path_starts.append(len(self.printpoints))
+                self.printpoints.extend(print_organizer.printpoints_dict[layer_key][path_key])
+
+        n = len(self.printpoints)
+        fixed = np.zeros(n, dtype=bool)
+        if n:
+            fixed[[0, -1]] = True
+        if per_path and n:
+            starts = np.array(path_starts, dtype=int)
+            fixed[starts[starts < n]] = True
+            fixed[starts[starts > 0] - 1] = True
+        self.fixed = fixed
+
+        free = np.flatnonzero(~fixed)
+        rows = np.concatenate([free, free, free])
+        cols = np.concatenate([free, free - 1, free + 1])
+        weights = np.concatenate([np.ones(len(free)), np.full(2 * len(free), -0.5)])
+        self.laplacian = scipy.sparse.csr_matrix((weights, (rows, cols)), shape=(n, n))
+        self._upper = scipy.sparse.triu(self.laplacian, format='csr')
+        # the fixed printpoints split the recurrence of the in-place iterations into segments
+        self._segments = np.split(np.arange(n), np.flatnonzero(fixed)[1:])
+        self._solvers = {}
+
+    def smooth(self, values, strength, iterations, method='explicit'):
+        """Smoothed copy of an (N,) or (N, k) array of printpoint values.
+
+        Parameters
+        ----------
+        values: array
+        strength: float
+            In the range [0.0 - 1.0] for the 'explicit' method, any positive value for the 'implicit' method.
+        iterations: int
+        method: str
+            'explicit' or 'implicit'.
+        """
+        values = np.array(values, dtype=float)
+        if method == 'explicit':
+            for iteration in range(iterations):
+                if iteration == 0:
+                    values -= strength * (self.laplacian @ values)
+                else:
+                    values = self._in_place_iteration(values, strength)
+            return values
+        elif method == 'implicit':
+            return self._solver(strength * iterations).solve(values)
+        else:
+            raise ValueError("Invalid smoothing method : " + str(method))
+
+    def _in_place_iteration(self, values, strength):
+        # x_i <- (1 - s) x_i + s/2 (x_i-1 + x_i+1), with x_i-1 already updated: the part from the current values,
+        # then y_i = rhs_i + s/2 y_i-1 along every segment, which starts at a fixed printpoint (y = rhs there)
+        rhs = values - strength * (self._upper @ values)
+        result = np.empty_like(rhs)
+        for segment in self._segments:
+            result[segment] = scipy.signal.lfilter([1.0], [1.0, -0.5 * strength], rhs[segment], axis=0)
+        return result
+
+    def _solver(self, t):
+        # the factorization is reused by all attributes smoothed with the same amount
+        if t not in self._solvers:
+            n = len(self.printpoints)
+            system = scipy.sparse.identity(n, format='csc') + t * self.laplacian.tocsc()
+            self._solvers[t] = scipy.sparse.linalg.splu(system.tocsc())
+        return self._solvers[t]
+
+
+def smooth_printpoints_up_vectors(print_organizer, strength, iterations, method='explicit', smoothing=None):
+    """Smooths the up vectors of all printpoints and updates their frames.
+
+    Parameters
+    ----------
+    print_organizer: :class:`compas_slicer.print_organization.BasePrintOrganizer`
+    strength: float
+    iterations: int
+    method: str
+        'explicit' or 'implicit', see :meth:`PrintpointsSmoothing.smooth`.
+    smoothing: :class:`PrintpointsSmoothing`, optional
+        Reuse the Laplacian of a previous call, if the printpoints did not change since.
+    """
+    smoothing = smoothing or PrintpointsSmoothing(print_organizer)
+    up_vectors = np.array([ppt.up_vector for ppt in smoothing.printpoints], dtype=float).reshape(-1, 3)
+    up_vectors = smoothing.smooth(up_vectors, strength, iterations, method)
+
+    for ppt, v in zip(smoothing.printpoints, up_vectors.tolist()):
+        ppt.up_vector = Vector(*v)
+        ppt.frame = ppt.get_frame()
+
+
+def smooth_printpoints_layer_heights(print_organizer, strength, iterations, method='explicit', smoothing=None):
+    """Smooths the layer heights of all printpoints.
+
+    Parameters
+    ----------
+    print_organizer: :class:`compas_slicer.print_organization.BasePrintOrganizer`
+    strength: float
+    iterations: int
+    method: str
+        'explicit' or 'implicit', see :meth:`PrintpointsSmoothing.smooth`.
+    smoothing: :class:`PrintpointsSmoothing`, optional
+        Reuse the Laplacian of a previous call, if the printpoints did not change since.
+    """
+    smoothing = smoothing or PrintpointsSmoothing(print_organizer)
+    layer_heights = np.array([ppt.layer_height for ppt in smoothing.printpoints], dtype=float)
+    layer_heights = smoothing.smooth(layer_heights, strength, iterations, method)
+
+    for ppt, h in zip(smoothing.printpoints, layer_heights.tolist()):
+        ppt.layer_height = h
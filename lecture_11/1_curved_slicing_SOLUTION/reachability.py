@@ -0,0 +1,335 @@
+"""Reachability validation of printpoints with batched UR inverse kinematics.
+
+Every printpoint is turned into a robot target: the nozzle (TCP) is placed
+on the printpoint, pointing against its up vector, and the tool0 frame is
+found by removing the tool offset. The analytic inverse kinematics of the UR
+robots (``inverse_ros`` of ``lecture_03/ur_kinematics.py``) is evaluated with
+NumPy for all targets of the print at once, and the printpoints without a
+solution, or whose solutions are all close to a singularity, are reported
+per layer before the printpoints are exported::
+
+    report = check_reachability(print_organizer, UR5_PARAMS, print_frame=Frame((450, 0, 0), (1, 0, 0), (0, 1, 0)),
+                                tool_frame=Frame((0, 0, 150), (1, 0, 0), (0, 1, 0)))
+    report.printout_info()
+    report.set_feasibility(print_organizer)
+
+Lengths are in millimeters, as the printpoints and the UR parameters of lecture 03.
+"""
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger('logger')
+
+__all__ = ['UR3_PARAMS',
+           'UR5_PARAMS',
+           'UR10_PARAMS',
+           'inverse_ros_batch',
+           'tool0_matrices',
+           'check_reachability',
+           'ReachabilityReport']
+
+# d1, a2, a3, d4, d5, d6 in millimeters
+UR3_PARAMS = [151.9, -243.65, -213.25, 112.35, 85.35, 81.9]
+UR5_PARAMS = [89.159, -425.0, -392.25, 109.15, 94.65, 82.3]
+UR10_PARAMS = [127.3, -612.0, -572.3, 163.941, 115.7, 92.2]
+
+ZERO_THRESH = 0.00000001
+
+
+# ==============================================================================
+# Batched inverse kinematics
+# ==============================================================================
+def inverse_ros_batch(T, params, q6_des=0.0):
+    """Vectorized ``inverse_ros`` for N end effector poses.
+
+    Parameters
+    ----------
+    T: (N, 4, 4) array
+        End effector poses, in the convention of ``inverse_ros`` (see :func:`tool0_matrices`).
+    params: list of float
+        d1, a2, a3, d4, d5, d6 of the UR model.
+    q6_des: float
+        Value of q6 in case of an infinite solution on that joint.
+
+    Returns
+    ----------
+    (N, 8, 6) array
+        The 8 joint solutions of every pose, in the order of ``inverse_ros``,
+        all angles in [0, 2 * pi]. The rows of the solutions that don't exist are NaN.
+    """
+    d1, a2, a3, d4, d5, d6 = params
+    T = np.asarray(T, dtype=float).reshape(-1, 16)
+    n = len(T)
+
+    T02, T00, T01, T03 = -T[:, 0], T[:, 1], T[:, 2], -T[:, 3]
+    T12, T10, T11, T13 = -T[:, 4], T[:, 5], T[:, 6], -T[:, 7]
+    T22, T20, T21, T23 = T[:, 8], -T[:, 9], -T[:, 10], T[:, 11]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # shoulder rotate joint (q1), (N, 2)
+        A = d6 * T12 - T13
+        B = d6 * T02 - T03
+        R = A * A + B * B
+        valid = np.broadcast_to((d4 * d4 <= R)[:, None, None, None], (n, 2, 2, 2)).copy()
+        arccos = np.arccos(np.clip(d4 / np.sqrt(R), -1.0, 1.0))
+        arctan = np.arctan2(-B, A)
+        q1 = _wrapped(np.stack([arccos + arctan, -arccos + arctan], axis=1))
+
+        # wrist 2 joint (q5), (N, 2, 2)
+        s1, c1 = np.sin(q1), np.cos(q1)
+        numer = T03[:, None] * s1 - T13[:, None] * c1 - d4
+        div = numer / d6
+        near = np.abs(np.abs(numer) - abs(d6)) < ZERO_THRESH
+        div = np.where(near, np.sign(numer) * np.sign(d6), div)
+        valid &= (np.abs(div) <= 1.0)[:, :, None, None]
+        arccos = np.arccos(np.clip(div, -1.0, 1.0))
+        q5 = np.stack([arccos, 2.0 * math.pi - arccos], axis=2)
+
+        # wrist 3 joint (q6), (N, 2, 2)
+        s1, c1 = s1[:, :, None], c1[:, :, None]
+        s5, c5 = np.sin(q5), np.cos(q5)
+        q6 = np.arctan2(np.sign(s5) * -(T01[:, None, None] * s1 - T11[:, None, None] * c1),
+                        np.sign(s5) * (T00[:, None, None] * s1 - T10[:, None, None] * c1))
+        q6 = np.where(np.abs(s5) < ZERO_THRESH, q6_des, q6)
+        q6 = _wrapped(q6)
+
+        # RRR joints (q2, q3, q4), (N, 2, 2, 2)
+        def _(a):
+            return a[:, None, None] if a.ndim == 1 else a
+        T00, T01, T02, T03, T10, T11, T12, T13, T20, T21, T22, T23 = \
+            (_(a) for a in (T00, T01, T02, T03, T10, T11, T12, T13, T20, T21, T22, T23))
+        c6, s6 = np.cos(q6), np.sin(q6)
+        x04x = -s5 * (T02 * c1 + T12 * s1) - c5 * (s6 * (T01 * c1 + T11 * s1) - c6 * (T00 * c1 + T10 * s1))
+        x04y = c5 * (T20 * c6 - T21 * s6) - T22 * s5
+        p13x = d5 * (s6 * (T00 * c1 + T10 * s1) + c6 * (T01 * c1 + T11 * s1)) - d6 * (T02 * c1 + T12 * s1) + \
+            T03 * c1 + T13 * s1
+        p13y = T23 - d1 - d6 * T22 + d5 * (T21 * c6 + T20 * s6)
+
+        c3 = (p13x * p13x + p13y * p13y - a2 * a2 - a3 * a3) / (2.0 * a2 * a3)
+        c3 = np.where(np.abs(np.abs(c3) - 1.0) < ZERO_THRESH, np.sign(c3), c3)
+        valid &= (np.abs(c3) <= 1.0)[..., None]
+        arccos = np.arccos(np.clip(c3, -1.0, 1.0))
+        q3 = np.stack([arccos, 2.0 * math.pi - arccos], axis=-1)
+        denom = a2 * a2 + a3 * a3 + 2 * a2 * a3 * c3
+        s3 = np.sin(arccos)
+        A = a2 + a3 * c3
+        B = a3 * s3
+        q2 = np.stack([np.arctan2((A * p13y - B * p13x) / denom, (A * p13x + B * p13y) / denom),
+                       np.arctan2((A * p13y + B * p13x) / denom, (A * p13x - B * p13y) / denom)], axis=-1)
+        q23 = q2 + q3
+        x04x, x04y = x04x[..., None], x04y[..., None]
+        q4 = np.arctan2(np.cos(q23) * x04y - np.sin(q23) * x04x, x04x * np.cos(q23) + x04y * np.sin(q23))
+        q2, q4 = _wrapped(q2), _wrapped(q4)
+
+    shape = (n, 2, 2, 2)
+    solutions = np.stack([np.broadcast_to(q1[:, :, None, None], shape),
+                          q2, q3, q4,
+                          np.broadcast_to(q5[..., None], shape),
+                          np.broadcast_to(q6[..., None], shape)], axis=-1)
+    solutions[~valid] = np.nan
+    return solutions.reshape(n, 8, 6)
+
+
+def _wrapped(angles):
+    angles = np.where(np.abs(angles) < ZERO_THRESH, 0.0, angles)
+    return np.where(angles < 0.0, angles + 2.0 * math.pi, angles)
+
+
+# ==============================================================================
+# Targets
+# ==============================================================================
+def _frame_matrix(frame):
+    M = np.identity(4)
+    if frame is not None:
+        M[:3, 0], M[:3, 1], M[:3, 2], M[:3, 3] = frame.xaxis, frame.yaxis, frame.zaxis, frame.point
+    return M
+
+
+def _unitized(vectors):
+    lengths = np.linalg.norm(vectors, axis=-1)
+    lengths[lengths == 0] = 1.0
+    return vectors / lengths[..., None]
+
+
+def tool0_matrices(points, up_vectors, reference_axes, print_frame=None, tool_frame=None, rotations=1):
+    """The tool0 poses that place the TCP on every point, pointing against its up vector.
+
+    Parameters
+    ----------
+    points: (N, 3) array
+    up_vectors: (N, 3) array
+        The TCP z-axis points in the opposite direction.
+    reference_axes: (N, 3) array
+        Direction of the TCP x-axis, projected perpendicular to the z-axis.
+    print_frame: :class:`compas.geometry.Frame`, optional
+        Frame of the print (the coordinate system of the points) in robot base coordinates.
+    tool_frame: :class:`compas.geometry.Frame`, optional
+        Frame of the TCP in tool0 coordinates.
+    rotations: int
+        Number of rotations of the tool around the nozzle axis to try, evenly
+        spread over 360 degrees (the extruder is axially symmetric).
+
+    Returns
+    ----------
+    (N, rotations, 4, 4) array
+        The poses in the convention of ``inverse_ros``: columns z, x, y axes and point of tool0.
+    """
+    z = -_unitized(np.asarray(up_vectors, dtype=float))
+    x = np.asarray(reference_axes, dtype=float)
+    x = x - (x * z).sum(axis=1)[:, None] * z
+    degenerate = np.linalg.norm(x, axis=1) < 1e-6
+    x[degenerate] = np.cross(z[degenerate], [0.0, 1.0, 0.0])
+    x = _unitized(x)
+    y = np.cross(z, x)
+
+    angles = np.arange(rotations) * 2.0 * math.pi / rotations
+    ca, sa = np.cos(angles)[None, :, None], np.sin(angles)[None, :, None]
+    xr = ca * x[:, None] + sa * y[:, None]
+    yr = -sa * x[:, None] + ca * y[:, None]
+
+    n = len(z)
+    tcp = np.zeros((n, rotations, 4, 4))
+    tcp[..., :3, 0], tcp[..., :3, 1], tcp[..., :3, 2] = xr, yr, np.repeat(z[:, None], rotations, axis=1)
+    tcp[..., :3, 3] = np.asarray(points, dtype=float)[:, None]
+    tcp[..., 3, 3] = 1.0
+
+    # base <- print <- tcp <- tool0
+    tool0 = _frame_matrix(print_frame) @ tcp @ np.linalg.inv(_frame_matrix(tool_frame))
+    return tool0[..., [2, 0, 1, 3]]
+
+
+# ==============================================================================
+# Validation
+# ==============================================================================
+class ReachabilityReport(object):
+    """
+    Reachability of the printpoints of a print organizer.
+
+    Attributes
+    ----------
+    keys: list of tuple
+        (layer index, path index, printpoint index) of every printpoint.
+    reachable: (N,) array of bool
+        True if the printpoint has at least one IK solution.
+    singular: (N,) array of bool
+        True if the printpoint is reachable, but only close to a singularity.
+    configurations: (N, 6) array
+        A regular solution of every printpoint (a singular one if there is none, NaN if unreachable).
+    """
+
+    def __init__(self, keys, reachable, singular, configurations):
+        self.keys = keys
+        self.reachable = reachable
+        self.singular = singular
+        self.configurations = configurations
+
+    @property
+    def is_valid(self):
+        return bool(self.reachable.all() and not self.singular.any())
+
+    def segments(self, mask):
+        """Consecutive printpoints of the same path where mask is True.
+
+        Returns
+        ----------
+        list of tuple
+            (layer index, path index, first printpoint index, last printpoint index)
+        """
+        segments = []
+        for n, (key, flag) in enumerate(zip(self.keys, mask)):
+            if not flag:
+                continue
+            i, j, k = key
+            if n > 0 and mask[n - 1] and segments and segments[-1][:2] == (i, j) and segments[-1][3] == k - 1:
+                segments[-1] = (i, j, segments[-1][2], k)
+            else:
+                segments.append((i, j, k, k))
+        return segments
+
+    def layers_summary(self):
+        """Dictionary layer index -> dict(printpoints, unreachable, singular) of the layers with problems."""
+        layers = np.array([key[0] for key in self.keys], dtype=int)
+        summary = {}
+        count = np.bincount(layers)
+        unreachable = np.bincount(layers, ~self.reachable, minlength=len(count))
+        singular = np.bincount(layers, self.singular, minlength=len(count))
+        for i in np.flatnonzero(unreachable + singular):
+            summary[int(i)] = dict(printpoints=int(count[i]), unreachable=int(unreachable[i]),
+                                   singular=int(singular[i]))
+        return summary
+
+    def printout_info(self):
+        """Prints the unreachable and singular segments of every layer."""
+        print("\n---- Reachability info ----")
+        print("Printpoints: %d, unreachable: %d, singular: %d" %
+              (len(self.keys), int((~self.reachable).sum()), int(self.singular.sum())))
+        for name, mask in (('Unreachable', ~self.reachable), ('Singular', self.singular)):
+            for i, j, start, end in self.segments(mask):
+                print("%s : layer %d, path %d, printpoints %d - %d" % (name, i, j, start, end))
+        print("")
+
+    def set_feasibility(self, print_organizer):
+        """Sets ``printpoint.is_feasible`` to False for the unreachable and singular printpoints."""
+        feasible = self.reachable & ~self.singular
+        for (i, j, k), flag in zip(self.keys, feasible.tolist()):
+            print_organizer.printpoints_dict['layer_%d' % i]['path_%d' % j][k].is_feasible = flag
+
+    def to_data(self):
+        return {'layers': self.layers_summary(),
+                'unreachable': self.segments(~self.reachable),
+                'singular': self.segments(self.singular)}
+
+
+def check_reachability(print_organizer, ur_params=UR5_PARAMS, print_frame=None, tool_frame=None, rotations=1,
+                       singularity_tolerance=0.02):
+    """Solves the inverse kinematics of all printpoints at once.
+
+    Parameters
+    ----------
+    print_organizer: :class:`compas_slicer.print_organization.BasePrintOrganizer`
+    ur_params: list of float
+        d1, a2, a3, d4, d5, d6 of the UR model, e.g. UR5_PARAMS.
+    print_frame: :class:`compas.geometry.Frame`, optional
+        Frame of the print in robot base coordinates. Defaults to the world XY frame.
+    tool_frame: :class:`compas.geometry.Frame`, optional
+        Frame of the TCP in tool0 coordinates. Defaults to tool0.
+    rotations: int
+        Number of rotations of the tool around the nozzle axis to try.
+    singularity_tolerance: float
+        A solution is singular if the sine of q3 (elbow) or q5 (wrist) is smaller,
+        or if the wrist center is closer to the axis of q1 (shoulder) than this
+        fraction of the arm length.
+
+    Returns
+    ----------
+    :class:`ReachabilityReport`
+    """
+    keys, points, up_vectors, reference_axes = [], [], [], []
+    for ppt, i, j, k in print_organizer.printpoints_indices_iterator():
+        keys.append((i, j, k))
+        points.append(ppt.pt)
+        up_vectors.append(ppt.up_vector)
+        reference_axes.append(ppt.frame.xaxis if ppt.frame else (1.0, 0.0, 0.0))
+
+    logger.info('Solving the inverse kinematics of %d printpoints' % len(keys))
+    T = tool0_matrices(np.array(points, dtype=float).reshape(-1, 3), np.array(up_vectors, dtype=float).reshape(-1, 3),
+                       np.array(reference_axes, dtype=float).reshape(-1, 3), print_frame, tool_frame, rotations)
+    n = len(keys)
+    solutions = inverse_ros_batch(T.reshape(-1, 4, 4), ur_params).reshape(n, rotations * 8, 6)
+
+    exists = ~np.isnan(solutions).any(axis=2)
+    d1, a2, a3, d4, d5, d6 = ur_params
+    wrist_center = T[..., :3, 3] - d6 * T[..., :3, 0]  # along the flange axis
+    shoulder = np.linalg.norm(wrist_center[..., :2], axis=-1) - abs(d4) < singularity_tolerance * (abs(a2) + abs(a3))
+    with np.errstate(invalid='ignore'):
+        singular = (np.abs(np.sin(solutions[..., 2])) < singularity_tolerance) | \
+                   (np.abs(np.sin(solutions[..., 4])) < singularity_tolerance) | \
+                   np.repeat(shoulder, 8, axis=1)
+    regular = exists & ~singular
+
+    reachable = exists.any(axis=1)
+    choice = np.where(regular.any(axis=1), regular.argmax(axis=1), exists.argmax(axis=1))
+    configurations = solutions[np.arange(n), choice]
+    return ReachabilityReport(keys, reachable, reachable & ~regular.any(axis=1), configurations)
@@ -0,0 +1,401 @@
+"""Streaming of printpoints to an ABB robot with COMPAS RRC.
+
+A print has thousands of printpoints, and sending them all at once floods the
+controller, while waiting for every move starves it: the robot stops at every
+point until the next instruction arrives. The :class:`PrintStreamer` keeps a
+bounded window of moves in flight, and only sends the next instruction once
+the oldest one of a full window is done::
+
+    filename = os.path.join(OUTPUT_PATH, 'out_printpoints.json')
+    streamer = PrintStreamer(abb, window=50, extruder_signal='doExtruder')
+    streamer.check(read_printpoints(filename))  # refuses a print with infeasible printpoints
+    report = streamer.run(read_printpoints(filename))
+    report.printout_info()
+
+Every printpoint becomes a linear ``MoveToFrame`` with its own velocity and
+blend zone, followed by its extruder toggle as ``SetDigital`` when it changes
+(it applies to the move to the next printpoint) and its wait time as ``WaitTime``. The printpoints are read lazily from the json
+file, so the memory does not grow with the length of the print.
+
+Printpoints marked as not feasible (``is_feasible`` False, see
+``reachability.py``) would stop the robot with an error in the middle of the
+print. By default the streamer refuses them: :meth:`PrintStreamer.check`
+reads the printpoints once before streaming and reports their ranges.
+
+The streamer works with any client that has the ``send`` method of
+``rrc.AbbClient``, e.g. the ``OfflineAbbClient`` of lecture 08.
+"""
+import collections
+import json
+import logging
+import time
+
+import compas_rrc as rrc
+from compas.geometry import Frame, Vector
+
+logger = logging.getLogger('logger')
+
+__all__ = ['read_printpoints',
+           'printpoint_frame',
+           'printpoint_instructions',
+           'infeasible_ranges',
+           'PrintStreamer',
+           'FeedReport']
+
+# zone radii available in RAPID, in mm
+ZONES = [rrc.Zone.Z0, rrc.Zone.Z1, rrc.Zone.Z5, rrc.Zone.Z10, rrc.Zone.Z15, rrc.Zone.Z20, rrc.Zone.Z30,
+         rrc.Zone.Z40, rrc.Zone.Z50, rrc.Zone.Z60, rrc.Zone.Z80, rrc.Zone.Z100, rrc.Zone.Z150, rrc.Zone.Z200]
+
+
+# ==============================================================================
+# Reading
+# ==============================================================================
+def read_printpoints(filename, chunk_size=2 ** 16):
+    """Yields the printpoint dictionaries of an ``out_printpoints.json`` file, one at a time.
+
+    The file is decoded incrementally, chunk by chunk, instead of loading the whole dictionary.
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, 'r') as f:
+        buffer, eof = '', False
+
+        def decode(position):
+            # decodes the next json value, reading more of the file until it is complete
+            nonlocal buffer, eof
+            while True:
+                position = _skip(buffer, position, ' \t\r\n')
+                try:
+                    return decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer = buffer[position:] + chunk
+                    position = 0
+
+        def next_token(position):
+            nonlocal buffer, eof
+            while True:
+                position = _skip(buffer, position, ' \t\r\n')
+                if position < len(buffer) or eof:
+                    return position
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, position = chunk, 0
+
+        position = next_token(0)
+        if buffer[position:position + 1] != '{':
+            raise ValueError('Not a printpoints dictionary: %s' % filename)
+        position = next_token(position + 1)
+
+        while buffer[position:position + 1] not in ('}', ''):
+            _key, position = decode(position)
+            position = next_token(position)
+            position = next_token(position + 1)  # ':'
+            printpoint, position = decode(position)
+            yield printpoint
+
+            position = next_token(position)
+            if buffer[position:position + 1] == ',':
+                position = next_token(position + 1)
+            # drop what was decoded already
+            buffer, position = buffer[position:], 0
+
+
+def _skip(text, position, characters):
+    while position < len(text) and text[position] in characters:
+        position += 1
+    return position
+
+
+# ==============================================================================
+# Instructions
+# ==============================================================================
+def printpoint_frame(data):
+    """TCP frame of a printpoint dictionary: on the point, with the z-axis against the up vector.
+
+    The x-axis follows the x-axis of the printpoint frame, so that the tool does not spin along the path.
+    """
+    z = Vector(*data['up_vector']).scaled(-1)
+    z.unitize()
+    x = Vector(*data['frame']['xaxis']) if data.get('frame') else Vector(1, 0, 0)
+    x = x - z.scaled(x.dot(z))
+    if x.length < 1e-6:
+        x = z.cross(Vector(0, 1, 0))
+    return Frame(data['point'], x, z.cross(x))
+
+
+def _zone(blend_radius, default_zone):
+    if blend_radius is None:
+        return default_zone
+    if blend_radius <= 0:
+        return rrc.Zone.FINE
+    return max(zone for zone in ZONES if zone <= blend_radius)
+
+
+def printpoint_instructions(data, extruder_state, extruder_signal, default_speed=50.0, default_zone=rrc.Zone.Z1):
+    """The RRC instructions of a printpoint dictionary.
+
+    Parameters
+    ----------
+    data: dict
+        A printpoint, as in ``out_printpoints.json``.
+    extruder_state: bool or None
+        State of the extruder before this printpoint, None if unknown.
+    extruder_signal: str
+        Name of the digital output of the extruder.
+    default_speed: float
+        Speed in mm/s of the printpoints without velocity.
+    default_zone: float
+        Zone of the printpoints without blend radius.
+
+    Returns
+    ----------
+    list
+        The instructions.
+    bool or None
+        State of the extruder after this printpoint.
+    """
+    speed = data.get('velocity') or default_speed
+    zone = _zone(data.get('blend_radius'), default_zone)
+    instructions = [rrc.MoveToFrame(printpoint_frame(data), speed, zone, rrc.Motion.LINEAR)]
+
+    # the extruder toggle of a printpoint applies to the move from it to the next printpoint
+    toggle = data.get('extruder_toggle')
+    if toggle is not None and toggle != extruder_state:
+        instructions.append(rrc.SetDigital(extruder_signal, 1 if toggle else 0))
+        extruder_state = toggle
+
+    if data.get('wait_time'):
+        instructions.append(rrc.WaitTime(data['wait_time']))
+    return instructions, extruder_state
+
+
+def infeasible_ranges(printpoints):
+    """Index ranges of the consecutive printpoints marked as not feasible.
+
+    Parameters
+    ----------
+    printpoints: iterable of dict
+        Printpoint dictionaries, e.g. from :func:`read_printpoints`.
+
+    Returns
+    ----------
+    list of tuple
+        (first, last) index of every range, both included.
+    """
+    ranges = []
+    for i, data in enumerate(printpoints):
+        if data.get('is_feasible') is False:
+            if ranges and ranges[-1][1] == i - 1:
+                ranges[-1] = (ranges[-1][0], i)
+            else:
+                ranges.append((i, i))
+    return ranges
+
+
+# ==============================================================================
+# Streaming
+# ==============================================================================
+class FeedReport(object):
+    """
+    Continuity of the instruction feed of a print.
+
+    Attributes
+    ----------
+    printpoints, moves, instructions: int
+        Number of printpoints, of moves and of all instructions sent.
+    duration: float
+        Wall time of the print in seconds.
+    min_depth, max_depth: int
+        Least and most moves in flight after a move was sent, the least once the window was first filled.
+    starvations: int
+        Number of times all moves in flight were done before the next one was sent,
+        i.e. the robot was waiting for instructions.
+    longest_gap: float
+        Longest time in seconds between two consecutive moves being done.
+    """
+
+    def __init__(self):
+        self.printpoints = 0
+        self.moves = 0
+        self.instructions = 0
+        self.duration = 0.0
+        self.min_depth = None
+        self.max_depth = 0
+        self._depth_sum = 0
+        self.starvations = 0
+        self.longest_gap = 0.0
+
+    @property
+    def mean_depth(self):
+        return self._depth_sum / float(self.moves) if self.moves else 0.0
+
+    def add_depth(self, depth, filled):
+        self.max_depth = max(self.max_depth, depth)
+        self._depth_sum += depth
+        if filled:
+            self.min_depth = depth if self.min_depth is None else min(self.min_depth, depth)
+
+    @property
+    def continuous(self):
+        return self.starvations == 0
+
+    def printout_info(self):
+        print("\n---- Feed info ----")
+        print("Printpoints: %d, moves: %d, instructions: %d, duration: %.1f s" %
+              (self.printpoints, self.moves, self.instructions, self.duration))
+        if self.moves:
+            print("Moves in flight: min %d, mean %.1f, max %d" %
+                  (self.min_depth or 0, self.mean_depth, self.max_depth))
+        print("Starvations: %d, longest gap between moves: %.3f s" % (self.starvations, self.longest_gap))
+        print("")
+
+    def to_data(self):
+        return {'printpoints': self.printpoints, 'moves': self.moves, 'instructions': self.instructions,
+                'duration': self.duration, 'starvations': self.starvations, 'longest_gap': self.longest_gap,
+                'min_depth': self.min_depth, 'mean_depth': self.mean_depth, 'max_depth': self.max_depth}
+
+
+class PrintStreamer(object):
+    """
+    Streams printpoints to the robot, with a bounded number of moves in flight.
+
+    Attributes
+    ----------
+    abb: :class:`compas_rrc.AbbClient`
+    window: int
+        Maximum number of moves sent, but not yet done.
+    extruder_signal: str
+        Name of the digital output of the extruder.
+    default_speed: float
+        Speed in mm/s of the printpoints without velocity.
+    default_zone: float
+        Zone of the printpoints without blend radius.
+    timeout: float, optional
+        Seconds to wait for a move before giving up.
+    strict: bool
+        If True (default), printpoints marked as not feasible are refused: :meth:`check` raises,
+        and :meth:`run` stops before sending one. If False, they are logged and streamed anyway.
+    """
+
+    def __init__(self, abb, window=50, extruder_signal='doExtruder', default_speed=50.0, default_zone=rrc.Zone.Z1,
+                 timeout=None, strict=True):
+        self.abb = abb
+        self.window = window
+        self.extruder_signal = extruder_signal
+        self.default_speed = default_speed
+        self.default_zone = default_zone
+        self.timeout = timeout
+        self.strict = strict
+
+        self._in_flight = collections.deque()
+        self._last_done = None
+
+    def check(self, printpoints):
+        """Logs the ranges of the printpoints marked as not feasible, before streaming them.
+
+        Parameters
+        ----------
+        printpoints: iterable of dict
+            Printpoint dictionaries, e.g. from :func:`read_printpoints`.
+
+        Returns
+        ----------
+        list of tuple
+            See :func:`infeasible_ranges`.
+
+        Raises
+        ----------
+        ValueError
+            If some printpoints are not feasible and the streamer is strict.
+        """
+        ranges = infeasible_ranges(printpoints)
+        if ranges:
+            count = sum(last - first + 1 for first, last in ranges)
+            message = '%d printpoints are not feasible: %s' % (count, ', '.join('%d-%d' % r for r in ranges))
+            if self.strict:
+                raise ValueError(message + '. The print was not started.')
+            logger.warning(message)
+        return ranges
+
+    def run(self, printpoints):
+        """Sends the instructions of all printpoints, and waits until the robot is done.
+
+        A list of printpoints is checked with :meth:`check` before anything is sent. Printpoints
+        read lazily can only be checked as they come, check them with :meth:`check` first.
+
+        Parameters
+        ----------
+        printpoints: iterable of dict
+            Printpoint dictionaries, e.g. from :func:`read_printpoints`.
+
+        Returns
+        ----------
+        :class:`FeedReport`
+        """
+        if isinstance(printpoints, (list, tuple)):
+            self.check(printpoints)
+
+        report = FeedReport()
+        start = time.time()
+        extruder_state = None
+        self._in_flight.clear()
+        self._last_done = None
+
+        try:
+            for data in printpoints:
+                if self.strict and data.get('is_feasible') is False:
+                    raise ValueError('Printpoint %d is not feasible, the print was stopped before it' %
+                                     report.printpoints)
+                instructions, extruder_state = printpoint_instructions(data, extruder_state, self.extruder_signal,
+                                                                       self.default_speed, self.default_zone)
+                report.printpoints += 1
+                for instruction in instructions:
+                    self._send(instruction, report)
+        finally:
+            # the extruder is always switched off in the end
+            if extruder_state:
+                self._send(rrc.SetDigital(self.extruder_signal, 0), report)
+            while self._in_flight:
+                self._wait_oldest(report)
+            self.abb.send_and_wait(rrc.Noop(), self.timeout)
+
+        report.duration = time.time() - start
+        logger.info('Streamed %d printpoints in %.1f seconds' % (report.printpoints, report.duration))
+        return report
+
+    def _send(self, instruction, report):
+        report.instructions += 1
+        if not isinstance(instruction, rrc.MoveToFrame):
+            self.abb.send(instruction)
+            return
+
+        self._retire_done(report)
+        while len(self._in_flight) >= self.window:
+            self._wait_oldest(report)
+
+        # nothing left in flight: the robot finished its last move and waits for this one
+        if report.moves > 0 and not self._in_flight:
+            report.starvations += 1
+
+        instruction.feedback_level = rrc.FeedbackLevel.DONE
+        self._in_flight.append(self.abb.send(instruction))
+        report.moves += 1
+        report.add_depth(len(self._in_flight), filled=report.moves > self.window)
+
+    def _retire_done(self, report):
+        while self._in_flight and self._in_flight[0].done:
+            self._in_flight.popleft()
+            self._done(report)
+
+    def _wait_oldest(self, report):
+        self._in_flight.popleft().result(self.timeout)
+        self._done(report)
+
+    def _done(self, report):
+        now = time.time()
+        if self._last_done is not None:
+            report.longest_gap = max(report.longest_gap, now - self._last_done)
+        self._last_done = now
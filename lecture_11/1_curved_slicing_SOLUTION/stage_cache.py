@@ -0,0 +1,158 @@
+"""Stage-level cache for slicing scripts.
+
+A script is split into stages (e.g. slicing, then print organization). The
+result of every stage is pickled to disk under a key made of:
+
+* the hash of the input files (e.g. the mesh),
+* the versions of the packages the stages use (e.g. compas_slicer),
+* the key of the previous stage,
+* the name, code and parameters of the stage function,
+* the source of the local modules (next to the script) the stage function
+  uses, and of the local modules these import.
+
+Changing a parameter of a late stage therefore reuses the cached results of
+the stages before it, and only recomputes that stage and the ones after it.
+Changing the mesh, an early parameter or a helper module invalidates
+everything downstream::
+
+    cache = StageCache(os.path.join(OUTPUT_DIR, 'cache'), os.path.join(DATA, MODEL))
+    slicer = cache.run('slicing', slice_model, layer_height=5)
+    slicer = cache.run('post_processing', post_process, slicer, rdp_threshold=0.7)
+
+Only cache stages that take longer to compute than to (un)pickle their result.
+"""
+import hashlib
+import importlib
+import inspect
+import logging
+import os
+import pickle
+import sys
+import time
+
+logger = logging.getLogger('logger')
+
+__all__ = ['StageCache', 'file_hash']
+
+
+def file_hash(filename):
+    """sha1 of the content of a file."""
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _code_names(code):
+    # global names used by a code object and the functions defined in it
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, 'co_names'):
+            names |= _code_names(const)
+    return names
+
+
+def _local_modules(function):
+    """Source files of the modules in the folder of a function that it uses, directly or through each other."""
+    own_file = os.path.abspath(function.__code__.co_filename)
+    folder = os.path.dirname(own_file)
+
+    def local_module(obj):
+        module = obj if inspect.ismodule(obj) else sys.modules.get(getattr(obj, '__module__', None))
+        filename = getattr(module, '__file__', None)
+        if filename and filename.endswith('.py') and os.path.dirname(os.path.abspath(filename)) == folder \
+                and os.path.abspath(filename) != own_file:
+            return module
+        return None
+
+    globals_ = function.__globals__
+    modules = {local_module(globals_[name]) for name in _code_names(function.__code__) if name in globals_}
+    modules.discard(None)
+    pending = list(modules)
+    while pending:
+        for obj in list(vars(pending.pop()).values()):
+            module = local_module(obj)
+            if module is not None and module not in modules:
+                modules.add(module)
+                pending.append(module)
+    return sorted(os.path.abspath(module.__file__) for module in modules)
+
+
+class StageCache(object):
+    """
+    Caches the results of a sequence of stages.
+
+    Attributes
+    ----------
+    cache_dir: str
+        Folder to store the results in, created if it doesn't exist.
+    sources: str
+        Input files of the first stage, their content is part of every key.
+    packages: list of str
+        Packages used by the stages, their versions are part of every key.
+    enabled: bool
+        If False, every stage is computed (and the cache is not written).
+    """
+
+    def __init__(self, cache_dir, *sources, packages=('compas', 'compas_slicer'), enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        versions = ['%s==%s' % (name, getattr(importlib.import_module(name), '__version__', '')) for name in packages]
+        sha = hashlib.sha1(''.join(file_hash(source) for source in sources).encode())
+        sha.update(repr(versions).encode())
+        self.key = sha.hexdigest()
+        self._module_hashes = {}
+
+        if self.enabled and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def stage_key(self, name, function, parameters):
+        """Key of a stage that follows the current one."""
+        sha = hashlib.sha1(self.key.encode())
+        sha.update(name.encode())
+        # editing the stage function invalidates its results as well
+        sha.update(function.__code__.co_code)
+        sha.update(repr(function.__code__.co_consts).encode())
+        sha.update(repr(sorted(parameters.items())).encode())
+        # and so does editing a helper module next to it that the stage uses
+        for filename in _local_modules(function):
+            sha.update(self._module_hash(filename).encode())
+        return sha.hexdigest()
+
+    def _module_hash(self, filename):
+        if filename not in self._module_hashes:
+            self._module_hashes[filename] = file_hash(filename)
+        return self._module_hashes[filename]
+
+    def run(self, name, function, *args, **parameters):
+        """Returns the cached result of a stage, or computes and caches it.
+
+        Parameters
+        ----------
+        name: str
+            Name of the stage.
+        function: callable
+            Computes the stage, called as ``function(*args, **parameters)``.
+        args:
+            Results of previous stages. They are not hashed, as they are
+            determined by the keys of the stages that produced them.
+        parameters:
+            Parameters of the stage, they are part of the key.
+        """
+        self.key = self.stage_key(name, function, parameters)
+        filename = os.path.join(self.cache_dir, '%s_%s.pickle' % (name, self.key[:16]))
+
+        if self.enabled and os.path.exists(filename):
+            logger.info("Stage '%s': loading cached result" % name)
+            with open(filename, 'rb') as f:
+                return pickle.load(f)
+
+        start = time.time()
+        result = function(*args, **parameters)
+        logger.info("Stage '%s': computed in %.2f seconds" % (name, time.time() - start))
+
+        if self.enabled:
+            with open(filename, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return result
@@ -20,7 +20,7 @@ from compas.datastructures import Mesh
 from compas.geometry import Point
 
 # own function
-from my_slicing_texture import create_overhang_texture
+from texture_pipeline import ModifierPipeline, Displace, every_mth_layer
 
 # ==============================================================================
 # Logging
@@ -79,7 +79,13 @@ def main():
     ############################################################################
     # INSERT OWN TEXTURE HERE
     ############################################################################
-    create_overhang_texture(slicer, overhang_distance=15)
+    # same result as create_overhang_texture(slicer, overhang_distance=15),
+    # add more modifiers to stack textures, they are applied in one pass
+    # and the result is cached in the output folder
+    pipeline = ModifierPipeline(cache_dir=OUTPUT_DIR)
+    pipeline.add(Displace('every_kth_point', k=2, distance=-15, layers=every_mth_layer(5, skip_first=True)))
+    # pipeline.add(Displace('sinusoidal', wavelength=20, amplitude=2, layer_phase_shift=0.3))
+    pipeline.run(slicer)
 
     # ==========================================================================
     # Smooth the seams between layers
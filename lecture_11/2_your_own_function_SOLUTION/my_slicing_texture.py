@@ -1,35 +1,136 @@
+import numpy as np
 from compas_slicer.geometry import Path
-from compas_slicer.utilities.utils import get_normal_of_path_on_xy_plane
 from compas.geometry import Point
-from compas.geometry import scale_vector, add_vectors
+
 
 def create_overhang_texture(slicer, overhang_distance):
     """Creates a cool overhang texture"""
 
     print("Creating cool texture")
 
+    # for every 5th layer, except for the first layer, move every second point
+    # inwards (against the normal of the path) by the overhang distance
+    pattern = every_kth_point(k=2, distance=-overhang_distance)
+    apply_texture(slicer, pattern, every_mth_layer=5, skip_first_layer=True)
+
+
+# ==============================================================================
+# Array-based path texturing
+# ==============================================================================
+def path_to_array(path):
+    """Returns the points of a path as an (N, 3) array."""
+    return np.array(path.points, dtype=float)
+
+
+def path_from_array(points, is_closed):
+    """Creates a path from an (N, 3) array."""
+    return Path([Point(x, y, z) for x, y, z in points.tolist()], is_closed=is_closed)
+
+
+def path_normals_xy(points, is_closed):
+    """Computes the normals of all points of a path on the xy plane at once.
+
+    Same convention as ``get_normal_of_path_on_xy_plane``: the average of the
+    incoming and outgoing directions, rotated 90 degrees counter-clockwise.
+
+    Parameters
+    ----------
+    points: (N, 3) array
+    is_closed: bool
+
+    Returns
+    ----------
+    (N, 3) array of unit normals
+    """
+    if len(points) < 2:
+        return np.zeros_like(points)
+
+    segments = _unitized(np.diff(points, axis=0))  # (N-1, 3)
+
+    incoming = np.empty_like(points)
+    outgoing = np.empty_like(points)
+    incoming[1:] = segments
+    outgoing[:-1] = segments
+
+    if is_closed:
+        # wrap around, the first and the last point are neighbors
+        closing = _unitized(points[0:1] - points[-1:])
+        incoming[0] = closing[0]
+        outgoing[-1] = closing[0]
+    else:
+        incoming[0] = segments[0]
+        outgoing[-1] = segments[-1]
+
+    v = (incoming + outgoing) * 0.5
+    normals = np.stack([-v[:, 1], v[:, 0], v[:, 2]], axis=1)
+    return _unitized(normals)
+
+
+def displace_points(points, normals, amounts):
+    """Moves every point along its normal by the corresponding amount."""
+    return points + normals * np.asarray(amounts, dtype=float)[:, None]
+
+
+def apply_texture(slicer, pattern, every_mth_layer=1, skip_first_layer=False):
+    """Applies a displacement pattern to the paths of a slicer in one pass.
+
+    Parameters
+    ----------
+    slicer: :class:`compas_slicer.slicers.BaseSlicer`
+    pattern: callable
+        Function ``pattern(points, layer_index)`` returning the displacement of
+        every point of a path (N,), see ``every_kth_point``, ``sinusoidal``, ``noise``.
+    every_mth_layer: int
+        Only layers whose index is a multiple of m are textured.
+    skip_first_layer: bool
+        If True, the first layer is never textured.
+    """
     for i, layer in enumerate(slicer.layers):
-        if i % 5 == 0 and i > 0:
-            # for every 5th layer, except for the first layer
-            # print(layer)
-            for j, path in enumerate(layer.paths):
-                # print(path)
-                # create an empty layer in which we can store our modified points
-                new_path = []
-                for k, pt in enumerate(path.points):
-                    # for every second point (only even points)
-                    if k % 2 == 0:
-                        # get the normal of the point in relation to the mesh
-                        normal = get_normal_of_path_on_xy_plane(k, pt, path, mesh=None)
-                        # scale the vector by a number to move the point
-                        normal_scaled = scale_vector(normal, -overhang_distance)
-                        # create a new point by adding the point and the normal vector
-                        new_pt = add_vectors(pt, normal_scaled)
-                        # recreate the new_pt values as compas_points
-                        pt = Point(new_pt[0], new_pt[1], new_pt[2])
-
-                    # append the points to the new path
-                    new_path.append(pt)
-
-                # replace the current path with the new path that we just created
-                layer.paths[j] = Path(new_path, is_closed=path.is_closed)
+        if i % every_mth_layer != 0 or (skip_first_layer and i == 0):
+            continue
+
+        for j, path in enumerate(layer.paths):
+            points = path_to_array(path)
+            normals = path_normals_xy(points, path.is_closed)
+            new_points = displace_points(points, normals, pattern(points, i))
+            layer.paths[j] = path_from_array(new_points, path.is_closed)
+
+
+# ==============================================================================
+# Displacement patterns
+# ==============================================================================
+def every_kth_point(k, distance, offset=0):
+    """Displaces every k-th point of a path by a constant distance."""
+    def pattern(points, layer_index):
+        amounts = np.zeros(len(points))
+        amounts[offset::k] = distance
+        return amounts
+    return pattern
+
+
+def sinusoidal(wavelength, amplitude, phase=0.0, layer_phase_shift=0.0):
+    """Sinusoidal displacement along the arc length of a path.
+
+    The wave can be shifted from layer to layer with ``layer_phase_shift`` (radians per layer).
+    """
+    def pattern(points, layer_index):
+        lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        arc_length = np.concatenate([[0.0], np.cumsum(lengths)])
+        angle = 2 * np.pi * arc_length / wavelength + phase + layer_index * layer_phase_shift
+        return amplitude * np.sin(angle)
+    return pattern
+
+
+def noise(amplitude, seed=None):
+    """Uniform random displacement in the range [-amplitude, amplitude]."""
+    random = np.random.RandomState(seed)
+
+    def pattern(points, layer_index):
+        return random.uniform(-amplitude, amplitude, len(points))
+    return pattern
+
+
+def _unitized(vectors):
+    lengths = np.linalg.norm(vectors, axis=1)
+    lengths[lengths == 0] = 1.0
+    return vectors / lengths[:, None]
@@ -0,0 +1,257 @@
+"""Pluggable texture pipeline for slicer post-processing.
+
+Textures are written as modifiers that declare which layers and paths they
+touch. The :class:`ModifierPipeline` applies all of them in one pass over the
+slicer, converting every touched path to an array only once, and can cache the
+result on disk so that re-running a script with unchanged geometry and
+parameters skips the texturing.
+
+Example::
+
+    pipeline = ModifierPipeline(cache_dir=OUTPUT_DIR)
+    pipeline.add(Displace('every_kth_point', k=2, distance=-15, layers=every_mth_layer(5, skip_first=True)))
+    pipeline.add(Displace('sinusoidal', wavelength=20, amplitude=2, paths=[0]))
+    pipeline.run(slicer)
+
+"""
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+import my_slicing_texture as texture
+
+logger = logging.getLogger('logger')
+
+__all__ = ['every_mth_layer', 'Modifier', 'Displace', 'FunctionModifier', 'ModifierPipeline']
+
+
+# ==============================================================================
+# Layer / path selection
+# ==============================================================================
+class every_mth_layer(object):
+    """Selects every m-th layer (layer indices that are multiples of m)."""
+
+    def __init__(self, m, skip_first=False):
+        self.m = m
+        self.skip_first = skip_first
+
+    def __call__(self, index):
+        return index % self.m == 0 and not (self.skip_first and index == 0)
+
+    def __repr__(self):
+        return 'every_mth_layer(%d, skip_first=%s)' % (self.m, self.skip_first)
+
+
+def _selected(selection, index):
+    if selection is None:
+        return True
+    if callable(selection):
+        return selection(index)
+    return index in selection
+
+
+# ==============================================================================
+# Modifiers
+# ==============================================================================
+class Modifier(object):
+    """
+    Base class of a path modifier.
+
+    A modifier declares which layers and paths it touches and modifies the
+    points of one path at a time, as an (N, 3) array.
+
+    Attributes
+    ----------
+    layers: None, list of int or callable
+        Layer indices the modifier applies to. None for all layers.
+    paths: None, list of int or callable
+        Path indices (within a layer) the modifier applies to. None for all paths.
+    """
+
+    def __init__(self, layers=None, paths=None):
+        self.layers = layers
+        self.paths = paths
+
+    @property
+    def parameters(self):
+        """dict: The parameters that define the result of the modifier, used for caching."""
+        return {}
+
+    @property
+    def cacheable(self):
+        """bool: False if the modifier gives a different result every time (e.g. random), then nothing is cached."""
+        return True
+
+    @property
+    def cache_key(self):
+        """str: Representation of the modifier that changes when its result changes."""
+        return repr((self.__class__.__name__, sorted(self.parameters.items()), self.layers, self.paths))
+
+    def applies_to(self, layer_index, path_index):
+        return _selected(self.layers, layer_index) and _selected(self.paths, path_index)
+
+    def modify(self, context):
+        """Returns the new (N, 3) points of the path described by ``context``."""
+        raise NotImplementedError
+
+
+class Displace(Modifier):
+    """
+    Displaces points along the in-plane path normals using one of the
+    patterns of ``my_slicing_texture`` ('every_kth_point', 'sinusoidal', 'noise').
+    """
+
+    def __init__(self, pattern, layers=None, paths=None, **pattern_parameters):
+        super(Displace, self).__init__(layers, paths)
+        self.pattern_name = pattern
+        self.pattern_parameters = pattern_parameters
+        self.pattern = getattr(texture, pattern)(**pattern_parameters)
+
+    @property
+    def parameters(self):
+        parameters = dict(self.pattern_parameters)
+        parameters['pattern'] = self.pattern_name
+        return parameters
+
+    @property
+    def cacheable(self):
+        # noise without a seed is different in every run
+        return not (self.pattern_name == 'noise' and self.pattern_parameters.get('seed') is None)
+
+    def modify(self, context):
+        amounts = self.pattern(context.points, context.layer_index)
+        return texture.displace_points(context.points, context.normals, amounts)
+
+
+class FunctionModifier(Modifier):
+    """
+    Wraps a custom function ``function(context) -> (N, 3) points``.
+    Pass the values the function depends on as keyword arguments, so that they
+    take part in the cache key, together with the code of the function.
+    """
+
+    def __init__(self, function, layers=None, paths=None, **parameters):
+        super(FunctionModifier, self).__init__(layers, paths)
+        self.function = function
+        self._parameters = parameters
+
+    @property
+    def parameters(self):
+        parameters = dict(self._parameters)
+        # editing the function invalidates the cached results as well
+        code = self.function.__code__
+        sha = hashlib.sha1(code.co_code)
+        sha.update(repr(code.co_consts).encode())
+        parameters['function'] = '%s_%s' % (self.function.__name__, sha.hexdigest())
+        return parameters
+
+    def modify(self, context):
+        return self.function(context, **self._parameters)
+
+
+class PathContext(object):
+    """The state of one path while it flows through the pipeline."""
+
+    def __init__(self, points, is_closed, layer_index, path_index):
+        self._points = points
+        self._normals = None
+        self.is_closed = is_closed
+        self.layer_index = layer_index
+        self.path_index = path_index
+
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        self._normals = None  # normals are recomputed lazily when the points change
+
+    @property
+    def normals(self):
+        if self._normals is None:
+            self._normals = texture.path_normals_xy(self._points, self.is_closed)
+        return self._normals
+
+
+# ==============================================================================
+# Pipeline
+# ==============================================================================
+class ModifierPipeline(object):
+    """
+    Runs a sequence of modifiers over the paths of a slicer.
+
+    All modifiers touching a path are fused: the path is converted to an array
+    once, every modifier is applied to it and the path is rebuilt once. Paths
+    that no modifier touches are left as they are.
+
+    If a cache directory is given, the modified paths are saved to disk and
+    reused in the next run as long as the incoming paths and the modifier
+    parameters are unchanged.
+
+    Attributes
+    ----------
+    modifiers: list of :class:`Modifier`
+    cache_dir: str, optional
+        Folder to store cached results in.
+    """
+
+    def __init__(self, modifiers=None, cache_dir=None):
+        self.modifiers = list(modifiers or [])
+        self.cache_dir = cache_dir
+
+    def add(self, modifier):
+        self.modifiers.append(modifier)
+        return self
+
+    def run(self, slicer):
+        """Applies the modifiers to ``slicer.layers`` in place."""
+        jobs = []
+        for i, layer in enumerate(slicer.layers):
+            for j, path in enumerate(layer.paths):
+                modifiers = [m for m in self.modifiers if m.applies_to(i, j)]
+                if modifiers:
+                    jobs.append((i, j, modifiers, texture.path_to_array(path)))
+
+        if not jobs:
+            return
+
+        cache_file = self._cache_file(slicer, jobs)
+        if cache_file and os.path.exists(cache_file):
+            logger.info('Texture pipeline: using cached result %s' % os.path.basename(cache_file))
+            with np.load(cache_file) as cached:
+                for i, j, _, _ in jobs:
+                    path = slicer.layers[i].paths[j]
+                    slicer.layers[i].paths[j] = texture.path_from_array(cached['%d_%d' % (i, j)], path.is_closed)
+            return
+
+        results = {}
+        for i, j, modifiers, points in jobs:
+            path = slicer.layers[i].paths[j]
+            context = PathContext(points, path.is_closed, i, j)
+            for modifier in modifiers:
+                context.points = modifier.modify(context)
+
+            results['%d_%d' % (i, j)] = context.points
+            slicer.layers[i].paths[j] = texture.path_from_array(context.points, path.is_closed)
+
+        logger.info('Texture pipeline: modified %d paths' % len(jobs))
+        if cache_file:
+            np.savez(cache_file, **results)
+
+    def _cache_file(self, slicer, jobs):
+        if not self.cache_dir or not all(modifier.cacheable for modifier in self.modifiers):
+            return None
+
+        sha = hashlib.sha1()
+        for modifier in self.modifiers:
+            sha.update(modifier.cache_key.encode())
+        for i, j, _, points in jobs:
+            path = slicer.layers[i].paths[j]
+            sha.update(('%d_%d_%s' % (i, j, path.is_closed)).encode())
+            sha.update(points.tobytes())
+
+        return os.path.join(self.cache_dir, 'texture_%s.npz' % sha.hexdigest()[:16])